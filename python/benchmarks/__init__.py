@@ -0,0 +1,23 @@
+"""Benchmarks of the verification stages.
+
+Each stage (parsing, cleaning, serialization, hashing and verification)
+is timed separately and end to end, over the playbooks in `data/playbooks`
+and over synthetic playbooks of growing size. Verification is timed for
+every crypto strategy, with the real GPG and with a stand-in accepting
+every signature.
+
+    PYTHONPATH=python/ python3 -m benchmarks run --output results.json
+    PYTHONPATH=python/ python3 -m benchmarks compare baseline.json results.json
+
+Larger corpora of signed playbooks, including tampered and revoked plays
+with their expected verdicts, are generated offline by `corpus`:
+
+    PYTHONPATH=python/ python3 -m benchmarks corpus --playbooks 1000 corpus/
+    PYTHONPATH=python/ python3 -m benchmarks run --corpus corpus/
+
+The `load` command runs many verifiers at once over a corpus, reporting
+latency percentiles, failures, peak memory and leftover temporary
+directories and GPG agents:
+
+    PYTHONPATH=python/ python3 -m benchmarks load corpus/ --clients 16 --duration 60
+"""
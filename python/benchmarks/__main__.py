@@ -0,0 +1,394 @@
+import argparse
+import dataclasses
+import json
+import os
+import pathlib
+import sys
+import typing
+
+from benchmarks import corpus, inputs, load, mock_server, signing, suite
+from insights_ansible_playbook_lib import _keygen
+
+
+STAGES: tuple[str, ...] = (
+    "parse",
+    "clean",
+    "serialize",
+    "digest",
+    "canonicalize",
+    "verify",
+    "end-to-end",
+)
+
+
+def _format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+
+def run(args: argparse.Namespace) -> int:
+    playbooks: list[inputs.Input] = []
+    if "fixtures" in args.inputs:
+        playbooks += inputs.fixture_inputs()
+    if "synthetic" in args.inputs:
+        playbooks += inputs.synthetic_inputs(
+            quick=args.quick, algorithm=args.key_algorithm, key_cache=args.key_cache
+        )
+    if args.corpus is not None:
+        playbooks += inputs.corpus_inputs(args.corpus)
+
+    def progress(result: suite.Result) -> None:
+        print(
+            f"{result.name:<60} {_format_time(result.min):>10} "
+            f"{_format_time(result.median):>10}",
+            file=sys.stderr,
+        )
+
+    results: list[suite.Result] = suite.run(
+        playbooks,
+        stages=args.stage or STAGES,
+        strategies=args.strategy or suite.STRATEGIES,
+        gpg=suite.GPG if args.gpg == "both" else (args.gpg,),
+        repeat=args.repeat,
+        progress=progress,
+    )
+    document: dict = {
+        "meta": {
+            **suite.metadata(),
+            "quick": args.quick,
+            "key_algorithm": args.key_algorithm,
+        },
+        "results": [
+            {"name": result.name, **dataclasses.asdict(result)} for result in results
+        ],
+    }
+    if args.output:
+        args.output.write_text(json.dumps(document, indent=2) + "\n")
+    else:
+        print(json.dumps(document, indent=2))
+    return 0
+
+
+def compare(args: argparse.Namespace) -> int:
+    baseline: dict = json.loads(args.baseline.read_text())
+    current: dict = json.loads(args.results.read_text())
+    comparisons, missing, added = suite.compare(
+        baseline["results"],
+        current["results"],
+        threshold=args.threshold,
+        metric=args.metric,
+    )
+
+    for comparison in comparisons:
+        mark: str = "REGRESSION" if comparison.regressed else ""
+        print(
+            f"{comparison.name:<60} {_format_time(comparison.baseline):>10} "
+            f"{_format_time(comparison.current):>10} {comparison.ratio:>6.2f}x {mark}"
+        )
+    for name in missing:
+        print(f"{name:<60} missing from the results")
+    for name in added:
+        print(f"{name:<60} not in the baseline")
+
+    regressions: int = sum(comparison.regressed for comparison in comparisons)
+    if regressions:
+        print(
+            f"{regressions} of {len(comparisons)} benchmarks are more than "
+            f"{args.threshold:.0%} slower than the baseline.",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+def generate(args: argparse.Namespace) -> int:
+    spec = corpus.CorpusSpec(
+        playbooks=args.playbooks,
+        plays=tuple(args.plays),
+        tasks=tuple(args.tasks),
+        scalar_size=tuple(args.scalar_size),
+        unicode_ratio=args.unicode_ratio,
+        alias_ratio=args.alias_ratio,
+        tampered_ratio=args.tampered_ratio,
+        revoked_ratio=args.revoked_ratio,
+        seed=args.seed,
+    )
+    manifest: corpus.Manifest = corpus.generate_corpus(
+        args.directory,
+        spec,
+        jobs=args.jobs,
+        algorithm=args.key_algorithm,
+        key_cache=args.key_cache,
+    )
+    plays: list[corpus.PlayManifest] = [
+        play for playbook in manifest.playbooks for play in playbook.plays
+    ]
+    counts: str = ", ".join(
+        f"{sum(play.verdict == verdict for play in plays)} {verdict}"
+        for verdict in (corpus.OK, corpus.TAMPERED, corpus.REVOKED)
+    )
+    print(
+        f"Generated {len(manifest.playbooks)} playbooks with {len(plays)} plays "
+        f"({counts}) in '{args.directory}'.",
+        file=sys.stderr,
+    )
+    return 0
+
+
+def load_test(args: argparse.Namespace) -> int:
+    workload = load.Workload(
+        manifest=corpus.Manifest.load(args.corpus),
+        clients=args.clients,
+        duration=args.duration,
+        requests=args.requests,
+        command=load.parse_command(args.command)
+        if args.command
+        else load.Workload.command,
+    )
+    report, samples = load.run(workload, args.mode)
+    print(load.format_report(report), file=sys.stderr)
+    if args.output:
+        document: dict = {
+            "meta": suite.metadata(),
+            "report": dataclasses.asdict(report),
+            "samples": [dataclasses.asdict(sample) for sample in samples],
+        }
+        args.output.write_text(json.dumps(document, indent=2) + "\n")
+    return 0 if report.ok else 1
+
+
+def sign(args: argparse.Namespace) -> int:
+    settings = mock_server.MockSettings(
+        latency=args.latency,
+        jitter=args.jitter,
+        concurrency=args.concurrency,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    key_pair: _keygen.KeyPair
+    if args.key_cache is not None:
+        (key_pair,) = _keygen.cached_key_pairs(args.key_cache, 1, args.key_algorithm)
+    else:
+        (key_pair,) = _keygen.generate_key_pairs(1, args.key_algorithm)
+
+    results: list[signing.Result] = signing.run(
+        args.plays, args.jobs or (1, 4, 16), settings, key_pair
+    )
+    print(signing.format_results(results, settings), file=sys.stderr)
+    if args.output:
+        document: dict = {
+            "meta": {**suite.metadata(), "key_algorithm": args.key_algorithm},
+            "server": dataclasses.asdict(settings),
+            "results": [
+                {**dataclasses.asdict(result), "throughput": result.throughput}
+                for result in results
+            ],
+        }
+        args.output.write_text(json.dumps(document, indent=2) + "\n")
+    return 0 if all(result.error is None for result in results) else 1
+
+
+def _add_key_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--key-algorithm",
+        choices=_keygen.ALGORITHMS,
+        default=_keygen.DEFAULT_ALGORITHM,
+        help="algorithm of the signing key (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--key-cache",
+        type=pathlib.Path,
+        metavar="DIR",
+        help="directory to reuse the signing key from across runs",
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="benchmarks", description=__package__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="time the stages")
+    run_parser.add_argument(
+        "--output",
+        type=pathlib.Path,
+        help="file to write the results to, instead of stdout",
+    )
+    run_parser.add_argument(
+        "--repeat", type=int, default=5, help="number of rounds of each benchmark"
+    )
+    run_parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="only time the smallest synthetic playbooks",
+    )
+    run_parser.add_argument(
+        "--inputs",
+        choices=("fixtures", "synthetic"),
+        action="append",
+        help="playbooks to time, both by default",
+    )
+    run_parser.add_argument(
+        "--stage", choices=STAGES, action="append", help="stage to time, all by default"
+    )
+    run_parser.add_argument(
+        "--strategy",
+        choices=suite.STRATEGIES,
+        action="append",
+        help="crypto strategy to time verification with, all by default",
+    )
+    run_parser.add_argument(
+        "--gpg",
+        choices=(*suite.GPG, "both"),
+        default="both",
+        help="run the real GPG, a stand-in accepting every signature, or both",
+    )
+    run_parser.add_argument(
+        "--corpus",
+        type=pathlib.Path,
+        metavar="DIR",
+        help="also time the passing playbooks of a generated corpus",
+    )
+    _add_key_arguments(run_parser)
+    run_parser.set_defaults(handler=run)
+
+    defaults = corpus.CorpusSpec()
+    corpus_parser = commands.add_parser(
+        "corpus", help="generate a corpus of signed playbooks"
+    )
+    corpus_parser.add_argument("directory", type=pathlib.Path)
+    corpus_parser.add_argument("--playbooks", type=int, default=defaults.playbooks)
+    corpus_parser.add_argument(
+        "--plays", type=int, nargs=2, metavar=("MIN", "MAX"), default=defaults.plays
+    )
+    corpus_parser.add_argument(
+        "--tasks", type=int, nargs=2, metavar=("MIN", "MAX"), default=defaults.tasks
+    )
+    corpus_parser.add_argument(
+        "--scalar-size",
+        type=int,
+        nargs=2,
+        metavar=("MIN", "MAX"),
+        default=defaults.scalar_size,
+    )
+    for ratio in ("unicode", "alias", "tampered", "revoked"):
+        corpus_parser.add_argument(
+            f"--{ratio}-ratio", type=float, default=getattr(defaults, f"{ratio}_ratio")
+        )
+    corpus_parser.add_argument("--seed", type=int, default=defaults.seed)
+    corpus_parser.add_argument(
+        "--jobs", type=int, help="number of concurrent signing processes"
+    )
+    _add_key_arguments(corpus_parser)
+    corpus_parser.set_defaults(handler=generate)
+
+    load_parser = commands.add_parser(
+        "load", help="run many verifiers at once over a generated corpus"
+    )
+    load_parser.add_argument("corpus", type=pathlib.Path, help="corpus directory")
+    load_parser.add_argument(
+        "--mode",
+        choices=load.MODES,
+        default="cli",
+        help="run the verifier command, or the library in worker processes "
+        "(default: %(default)s)",
+    )
+    load_parser.add_argument(
+        "--clients",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of concurrent verifiers (default: %(default)s)",
+    )
+    amount = load_parser.add_mutually_exclusive_group(required=True)
+    amount.add_argument(
+        "--duration", type=float, metavar="SECONDS", help="time to run for"
+    )
+    amount.add_argument("--requests", type=int, help="number of verifications")
+    load_parser.add_argument(
+        "--command",
+        help="verifier command of the 'cli' mode, e.g. an installed "
+        "insights-ansible-playbook-verifier (default: the one in this tree)",
+    )
+    load_parser.add_argument(
+        "--output", type=pathlib.Path, help="file to write the report and samples to"
+    )
+    load_parser.set_defaults(handler=load_test)
+
+    defaults_server = mock_server.MockSettings()
+    sign_parser = commands.add_parser(
+        "sign", help="measure the throughput of the signer against a mock server"
+    )
+    sign_parser.add_argument(
+        "--plays",
+        type=int,
+        default=100,
+        help="number of plays to sign (default: %(default)s)",
+    )
+    sign_parser.add_argument(
+        "--jobs",
+        type=int,
+        action="append",
+        help="number of signatures the signer requests at once, 1, 4 and 16 by default",
+    )
+    sign_parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        metavar="SECONDS",
+        help="latency of the server (default: %(default)s)",
+    )
+    sign_parser.add_argument(
+        "--jitter",
+        type=float,
+        default=defaults_server.jitter,
+        metavar="SECONDS",
+        help="largest random addition to the latency (default: %(default)s)",
+    )
+    sign_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="requests the server handles at once (default: %(default)s)",
+    )
+    sign_parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=defaults_server.failure_rate,
+        help="fraction of the requests that fail (default: %(default)s)",
+    )
+    sign_parser.add_argument("--seed", type=int, default=0)
+    sign_parser.add_argument(
+        "--output", type=pathlib.Path, help="file to write the results to"
+    )
+    _add_key_arguments(sign_parser)
+    sign_parser.set_defaults(handler=sign)
+
+    compare_parser = commands.add_parser(
+        "compare", help="compare results with a baseline"
+    )
+    compare_parser.add_argument("baseline", type=pathlib.Path)
+    compare_parser.add_argument("results", type=pathlib.Path)
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="relative slowdown considered a regression (default: %(default)s)",
+    )
+    compare_parser.add_argument(
+        "--metric",
+        choices=("min", "median", "mean"),
+        default="min",
+        help="statistic to compare (default: %(default)s)",
+    )
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    if args.command == "run" and not args.inputs:
+        args.inputs = ["fixtures", "synthetic"]
+    handler: typing.Callable[[argparse.Namespace], int] = args.handler
+    return handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+"""Corpus of signed playbooks of varied shape, with their expected verdicts.
+
+Everything is signed by a throwaway key pair in a single signing session:
+the private key is imported into one GPG home directory, which then signs
+every digest, so that thousands of plays can be signed in minutes without
+a signing server.
+
+The corpus directory contains:
+
+- `keys/key.public.gpg` and `keys/key.private.gpg`
+- `playbooks/*.yml`
+- `revoked_playbooks.yml`, a signed revocation list
+- `manifest.json`, the expected verdict of every play
+"""
+
+import base64
+import concurrent.futures
+import dataclasses
+import json
+import os
+import pathlib
+import random
+import tempfile
+import time
+import typing
+
+import yaml
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import _keygen, crypto
+
+
+MANIFEST: str = "manifest.json"
+
+# Expected verdicts of plays.
+OK: str = "ok"
+TAMPERED: str = "tampered"
+REVOKED: str = "revoked"
+
+WORDS: tuple[str, ...] = ("install", "restart", "configure", "the", "service", "now")
+UNICODE_WORDS: tuple[str, ...] = (
+    "příšerně",
+    "ご飯が熱い",
+    "電脳",
+    "ანბანი",
+    "κάπου",
+    "👨\u200d👩\u200d👦",
+    "zero\u200bwidth",
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class CorpusSpec:
+    """Shape of the generated corpus.
+
+    Ranges are inclusive and sampled uniformly for each playbook or task.
+
+    :param playbooks: Number of playbooks.
+    :param plays: Number of plays in a playbook.
+    :param tasks: Number of tasks in a play.
+    :param scalar_size: Length of the content written by a task.
+    :param unicode_ratio: Fraction of strings containing non-ASCII characters.
+    :param alias_ratio: Fraction of plays whose tasks share their arguments,
+        which the dumper writes as anchors and aliases.
+    :param tampered_ratio: Fraction of plays modified after they were signed.
+    :param revoked_ratio: Fraction of plays listed in the revocation list.
+    :param seed: Seed of the generator; equal specs generate equal playbooks.
+    """
+
+    playbooks: int = 100
+    plays: tuple[int, int] = (1, 3)
+    tasks: tuple[int, int] = (1, 20)
+    scalar_size: tuple[int, int] = (16, 4096)
+    unicode_ratio: float = 0.1
+    alias_ratio: float = 0.1
+    tampered_ratio: float = 0.05
+    revoked_ratio: float = 0.05
+    seed: int = 0
+
+
+@dataclasses.dataclass(frozen=True)
+class PlayManifest:
+    """Expected verdict of a play.
+
+    :param digest: Hex digest of the play as it was signed.
+    :param verdict: One of `OK`, `TAMPERED` or `REVOKED`.
+    """
+
+    name: str
+    digest: str
+    verdict: str
+
+
+@dataclasses.dataclass(frozen=True)
+class PlaybookManifest:
+    """Expected verdicts of a playbook.
+
+    :param path: Path of the playbook relative to the corpus directory.
+    """
+
+    path: str
+    plays: list[PlayManifest]
+
+    @property
+    def ok(self) -> bool:
+        return all(play.verdict == OK for play in self.plays)
+
+
+@dataclasses.dataclass(frozen=True)
+class Manifest:
+    """Description of a generated corpus.
+
+    :param directory: Corpus directory, not stored in the manifest file.
+    """
+
+    directory: pathlib.Path
+    spec: CorpusSpec
+    public_key: str
+    revocation_list: str
+    playbooks: list[PlaybookManifest]
+
+    def save(self) -> None:
+        document: dict = dataclasses.asdict(self)
+        del document["directory"]
+        (self.directory / MANIFEST).write_text(json.dumps(document, indent=2) + "\n")
+
+    @classmethod
+    def load(cls, directory: pathlib.Path) -> "Manifest":
+        document: dict = json.loads((directory / MANIFEST).read_text())
+        spec: dict = document["spec"]
+        for field in ("plays", "tasks", "scalar_size"):
+            spec[field] = tuple(spec[field])
+        return cls(
+            directory=directory,
+            spec=CorpusSpec(**spec),
+            public_key=document["public_key"],
+            revocation_list=document["revocation_list"],
+            playbooks=[
+                PlaybookManifest(
+                    path=playbook["path"],
+                    plays=[PlayManifest(**play) for play in playbook["plays"]],
+                )
+                for playbook in document["playbooks"]
+            ],
+        )
+
+
+class SigningSession:
+    """Throwaway key pair signing many digests.
+
+    The private key is imported once; each signature then only spawns
+    a single GPG process. Digests may be signed concurrently.
+
+    :param directory: Directory to export the key pair to.
+    :param algorithm: Algorithm of the key pair, one of `_keygen.ALGORITHMS`.
+    :param key_cache: Directory to reuse the key pair from, instead of
+        generating a new one.
+    """
+
+    def __init__(
+        self,
+        directory: pathlib.Path,
+        algorithm: str = _keygen.DEFAULT_ALGORITHM,
+        key_cache: typing.Optional[pathlib.Path] = None,
+    ):
+        directory.mkdir(parents=True, exist_ok=True)
+        if key_cache is not None:
+            (key_pair,) = _keygen.cached_key_pairs(key_cache, 1, algorithm)
+        else:
+            (key_pair,) = _keygen.generate_key_pairs(1, algorithm)
+        key_pair.write(directory)
+        self.public_key: pathlib.Path = directory / "key.public.gpg"
+        self.private_key: pathlib.Path = directory / "key.private.gpg"
+
+        self._keyring = crypto.GPGKeyring(self.private_key)
+        result: crypto.GPGCommandResult = self._keyring.open()
+        if not result.ok:
+            self._keyring.close()
+            raise RuntimeError(f"Could not import the private key: {result}")
+
+    def sign(self, digest: bytes) -> bytes:
+        """Get the armored detached signature of a digest."""
+        with tempfile.TemporaryDirectory(prefix="corpus-digest-") as directory:
+            file = pathlib.Path(directory) / "digest"
+            file.write_bytes(digest)
+            result: crypto.GPGCommandResult = self._keyring.sign(file)
+            if not result.ok:
+                raise RuntimeError(f"Could not sign the digest: {result}")
+            return (pathlib.Path(directory) / "digest.asc").read_bytes()
+
+    def sign_plays(self, plays: list[dict], jobs: typing.Optional[int] = None) -> None:
+        """Sign the plays in place.
+
+        :param jobs: Number of concurrent signing processes.
+        """
+        digests: list[bytes] = [lib.canonicalize_play(play).digest for play in plays]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            signatures: list[bytes] = list(executor.map(self.sign, digests))
+        for play, signature in zip(plays, signatures):
+            play["vars"]["insights_signature"] = base64.b64encode(signature)
+
+    def close(self) -> None:
+        self._keyring.close()
+
+    def __enter__(self) -> "SigningSession":
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.close()
+
+
+def dump_playbook(plays: list[dict]) -> str:
+    """Dump signed plays, ensuring they are read back as they were signed."""
+    raw: str = yaml.safe_dump(plays, sort_keys=False, allow_unicode=True)
+    for play, parsed in zip(plays, lib.parse_playbook(raw)):
+        if lib.canonicalize_play(parsed).digest != lib.canonicalize_play(play).digest:
+            raise RuntimeError(f"Play '{play['name']}' changed when it was dumped.")
+    return raw
+
+
+def _text(rng: random.Random, spec: CorpusSpec, length: int) -> str:
+    words: tuple[str, ...] = (
+        UNICODE_WORDS if rng.random() < spec.unicode_ratio else WORDS
+    )
+    result: list[str] = []
+    size: int = 0
+    while size < length:
+        result.append(rng.choice(words))
+        size += len(result[-1]) + 1
+    return " ".join(result)
+
+
+def _play(rng: random.Random, spec: CorpusSpec, name: str) -> dict:
+    tasks: list[dict] = []
+    shared: typing.Optional[dict] = None
+    if rng.random() < spec.alias_ratio:
+        shared = {"state": "present", "name": [_text(rng, spec, 12) for _ in range(3)]}
+
+    for index in range(rng.randint(*spec.tasks)):
+        kind: int = rng.randrange(4)
+        task: dict = {"name": f"{_text(rng, spec, 16)} {index}"}
+        if shared is not None:
+            task["ansible.builtin.dnf"] = shared
+        elif kind == 0:
+            task["ansible.builtin.copy"] = {
+                "dest": f"/etc/corpus/{index}.conf",
+                "content": _text(rng, spec, rng.randint(*spec.scalar_size)) + "\n",
+                "mode": "0644",
+            }
+        elif kind == 1:
+            task["ansible.builtin.command"] = {"cmd": _text(rng, spec, 32)}
+            task["register"] = f"result_{index}"
+            task["changed_when"] = False
+        elif kind == 2:
+            task["ansible.builtin.service"] = {"name": "corpus", "state": "restarted"}
+            task["when"] = [
+                f"result_{index - 1} is defined",
+                "ansible_os_family == 'RedHat'",
+            ]
+        else:
+            task["ansible.builtin.debug"] = {
+                "msg": _text(rng, spec, 24),
+                "verbosity": 1,
+            }
+        tasks.append(task)
+
+    return {
+        "name": name,
+        "hosts": "localhost",
+        "become": rng.random() < 0.5,
+        "vars": {
+            "insights_signature_exclude": "/hosts,/vars/insights_signature",
+            "insights_signature": b"placeholder",
+            "timeout": rng.randint(10, 600),
+        },
+        "tasks": tasks,
+    }
+
+
+def _tamper(rng: random.Random, play: dict) -> None:
+    """Modify the signed play, as an attacker would."""
+    task: dict = rng.choice(play["tasks"])
+    task["name"] += " "
+
+
+def _revocation_list(revoked: list[tuple[str, bytes]], session: SigningSession) -> str:
+    data: dict = {
+        "name": "revocation list",
+        "timestamp": int(time.time()),
+        "vars": {
+            "insights_signature_exclude": "/vars/insights_signature",
+            "insights_signature": b"placeholder",
+        },
+        "revoked_playbooks": [
+            {"name": name, "hash": digest.hex()} for name, digest in revoked
+        ],
+    }
+    session.sign_plays([data], jobs=1)
+    return dump_playbook([data])
+
+
+def generate_corpus(
+    directory: pathlib.Path,
+    spec: CorpusSpec,
+    jobs: typing.Optional[int] = None,
+    algorithm: str = _keygen.DEFAULT_ALGORITHM,
+    key_cache: typing.Optional[pathlib.Path] = None,
+) -> Manifest:
+    """Generate, sign and save the corpus.
+
+    :param directory: Directory to write the corpus to.
+    :param spec: Shape of the corpus.
+    :param jobs: Number of concurrent signing processes; CPU count by default.
+    :param algorithm: Algorithm of the signing key.
+    :param key_cache: Directory to reuse the signing key from.
+    """
+    rng = random.Random(spec.seed)
+    (directory / "playbooks").mkdir(parents=True, exist_ok=True)
+    jobs = jobs or os.cpu_count() or 1
+
+    playbooks: list[list[dict]] = []
+    verdicts: list[list[str]] = []
+    for number in range(spec.playbooks):
+        plays: list[dict] = []
+        expected: list[str] = []
+        for index in range(rng.randint(*spec.plays)):
+            plays.append(_play(rng, spec, f"Playbook {number} play {index}"))
+            draw: float = rng.random()
+            if draw < spec.tampered_ratio:
+                expected.append(TAMPERED)
+            elif draw < spec.tampered_ratio + spec.revoked_ratio:
+                expected.append(REVOKED)
+            else:
+                expected.append(OK)
+        playbooks.append(plays)
+        verdicts.append(expected)
+
+    with SigningSession(directory / "keys", algorithm, key_cache) as session:
+        session.sign_plays([play for plays in playbooks for play in plays], jobs=jobs)
+
+        manifests: list[PlaybookManifest] = []
+        revoked: list[tuple[str, bytes]] = []
+        for number, (plays, expected) in enumerate(zip(playbooks, verdicts)):
+            entries: list[PlayManifest] = []
+            for play, verdict in zip(plays, expected):
+                digest: bytes = lib.canonicalize_play(play).digest
+                entries.append(PlayManifest(play["name"], digest.hex(), verdict))
+                if verdict == REVOKED:
+                    revoked.append((play["name"], digest))
+
+            raw: str = dump_playbook(plays)
+            # Tampered after dumping, the round trip check would reject them
+            for play, verdict in zip(plays, expected):
+                if verdict == TAMPERED:
+                    _tamper(rng, play)
+            if TAMPERED in expected:
+                raw = yaml.safe_dump(plays, sort_keys=False, allow_unicode=True)
+
+            path: str = f"playbooks/playbook-{number:05d}.yml"
+            (directory / path).write_text(raw)
+            manifests.append(PlaybookManifest(path=path, plays=entries))
+
+        (directory / "revoked_playbooks.yml").write_text(
+            _revocation_list(revoked, session)
+        )
+
+    manifest = Manifest(
+        directory=directory,
+        spec=spec,
+        public_key="keys/key.public.gpg",
+        revocation_list="revoked_playbooks.yml",
+        playbooks=manifests,
+    )
+    manifest.save()
+    return manifest
@@ -0,0 +1,177 @@
+"""Playbooks the benchmarks run over."""
+
+import dataclasses
+import pathlib
+import tempfile
+import typing
+
+from benchmarks import corpus
+from insights_ansible_playbook_lib import _keygen
+
+
+DATA = pathlib.Path(__file__).parents[2].absolute() / "data"
+
+# Sizes of the synthetic playbooks, the first one is used by quick runs.
+SIZES: dict[str, tuple[int, ...]] = {
+    "plays": (1, 10, 50),
+    "depth": (4, 16, 48),
+    "scalar": (1024, 64 * 1024, 1024 * 1024),
+    "unicode": (10, 100, 1000),
+    "aliases": (10, 100, 900),
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class Input:
+    """Signed playbook.
+
+    :param name: Name of the playbook in the results.
+    :param raw: Content of the playbook.
+    :param gpg_key: Public key the playbook is signed with.
+    """
+
+    name: str
+    raw: str
+    gpg_key: bytes
+
+
+def fixture_inputs() -> list[Input]:
+    """Load the signed playbooks of the test data."""
+    gpg_key: bytes = (DATA / "public.gpg").read_bytes()
+    return [
+        Input(name=path.stem, raw=path.read_text(), gpg_key=gpg_key)
+        for path in sorted((DATA / "playbooks").glob("*.yml"))
+        if not path.stem.endswith(".serialized")
+    ]
+
+
+def _play(name: str, tasks: list[dict], **extra: typing.Any) -> dict:
+    return {
+        "name": name,
+        "hosts": "localhost",
+        "vars": {
+            "insights_signature_exclude": "/hosts,/vars/insights_signature",
+            "insights_signature": b"placeholder",
+        },
+        **extra,
+        "tasks": tasks,
+    }
+
+
+def _task(index: int, **arguments: typing.Any) -> dict:
+    return {
+        "name": f"Task {index}",
+        "ansible.builtin.command": arguments or {"cmd": f"echo {index}"},
+    }
+
+
+def _many_plays(count: int) -> list[dict]:
+    return [
+        _play(f"Play {index}", [_task(task) for task in range(5)])
+        for index in range(count)
+    ]
+
+
+def _deep_nesting(depth: int) -> list[dict]:
+    value: typing.Any = "leaf"
+    for level in range(depth):
+        value = {f"level{level}": value, "list": [level]}
+    return [_play("Deeply nested play", [_task(0, nested=value)])]
+
+
+def _huge_scalar(size: int) -> list[dict]:
+    line: str = "A line of a configuration file.\n"
+    content: str = line * (size // len(line))
+    return [
+        _play(
+            "Play with a huge scalar",
+            [{"name": "Write", "ansible.builtin.copy": {"content": content}}],
+        )
+    ]
+
+
+def _unicode(count: int) -> list[dict]:
+    words: list[str] = [
+        "příšerně",
+        "ご飯が熱い",
+        "電脳",
+        "ანბანი",
+        "κάπου",
+        "👨\u200d👩\u200d👦",
+    ]
+    return [
+        _play(
+            "Unicode play 🎉",
+            [
+                _task(index, cmd=" ".join(words[: 1 + index % 6]))
+                for index in range(count)
+            ],
+        )
+    ]
+
+
+def _aliases(count: int) -> list[dict]:
+    # The dumper writes objects referenced repeatedly as anchors and aliases
+    shared: dict = {"state": "present", "options": ["a", "b", "c"]}
+    return [
+        _play(
+            "Play with aliases",
+            [
+                {"name": f"Task {index}", "ansible.builtin.dnf": shared}
+                for index in range(count)
+            ],
+        )
+    ]
+
+
+GENERATORS: dict[str, typing.Callable[[int], list[dict]]] = {
+    "plays": _many_plays,
+    "depth": _deep_nesting,
+    "scalar": _huge_scalar,
+    "unicode": _unicode,
+    "aliases": _aliases,
+}
+
+
+def synthetic_inputs(
+    quick: bool = False,
+    algorithm: str = _keygen.DEFAULT_ALGORITHM,
+    key_cache: typing.Optional[pathlib.Path] = None,
+) -> list[Input]:
+    """Generate and sign synthetic playbooks of growing size.
+
+    :param quick: Only generate the smallest playbook of each kind.
+    :param algorithm: Algorithm of the signing key.
+    :param key_cache: Directory to reuse the signing key from.
+    """
+    result: list[Input] = []
+    with tempfile.TemporaryDirectory(prefix="benchmark-keys-") as directory:
+        with corpus.SigningSession(
+            pathlib.Path(directory), algorithm, key_cache
+        ) as session:
+            gpg_key: bytes = session.public_key.read_bytes()
+            for kind, generator in GENERATORS.items():
+                sizes: tuple[int, ...] = SIZES[kind][:1] if quick else SIZES[kind]
+                for size in sizes:
+                    plays: list[dict] = generator(size)
+                    session.sign_plays(plays)
+                    raw: str = corpus.dump_playbook(plays)
+                    result.append(
+                        Input(name=f"{kind}-{size}", raw=raw, gpg_key=gpg_key)
+                    )
+    return result
+
+
+def corpus_inputs(directory: pathlib.Path) -> list[Input]:
+    """Load the playbooks of a generated corpus that are expected to pass."""
+    manifest = corpus.Manifest.load(directory)
+    gpg_key: bytes = (directory / manifest.public_key).read_bytes()
+    return [
+        Input(
+            name=pathlib.Path(playbook.path).stem,
+            raw=(directory / playbook.path).read_text(),
+            gpg_key=gpg_key,
+        )
+        for playbook in manifest.playbooks
+        if playbook.ok
+    ]
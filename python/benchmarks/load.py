@@ -0,0 +1,340 @@
+"""Load test of many verifiers running at once, as on a shared host.
+
+Each of the concurrent clients verifies the playbooks of a generated corpus
+one after another, either by running the verifier command (as the fleet
+does), or by calling the library in a worker process. The clients compete
+for the temporary directories, GPG agents and CPU, and the report shows
+the distribution of latencies under that contention, the failures, the peak
+memory, and what was left behind by the cleanup of the GPG environments.
+"""
+
+import concurrent.futures
+import dataclasses
+import logging
+import math
+import os
+import pathlib
+import resource
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+import typing
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import crypto
+
+from benchmarks import corpus
+
+
+MODES: tuple[str, ...] = ("cli", "library")
+
+
+@dataclasses.dataclass(frozen=True)
+class Sample:
+    """A single verification.
+
+    :param client: Index of the client which ran the verification.
+    :param playbook: Path of the playbook relative to the corpus.
+    :param latency: Wall time of the verification, in seconds.
+    :param ok: Whether the playbook passed.
+    :param expected: Whether the playbook was expected to pass.
+    :param rss: Peak resident memory of the verifier, in kilobytes.
+    """
+
+    client: int
+    playbook: str
+    latency: float
+    ok: bool
+    expected: bool
+    rss: int
+
+
+@dataclasses.dataclass(frozen=True)
+class Workload:
+    """What every client runs.
+
+    :param manifest: Corpus to verify.
+    :param clients: Number of concurrent clients.
+    :param duration: Seconds to keep the clients running for.
+    :param requests: Total number of verifications, instead of a duration.
+    :param command: Verifier command of the 'cli' mode.
+    """
+
+    manifest: corpus.Manifest
+    clients: int
+    duration: typing.Optional[float] = None
+    requests: typing.Optional[int] = None
+    command: tuple[str, ...] = (
+        sys.executable,
+        "-m",
+        "insights_ansible_playbook_verifier",
+    )
+
+    def assignments(self, client: int) -> typing.Iterator[corpus.PlaybookManifest]:
+        """Playbooks of the client, until its share of requests or time runs out."""
+        playbooks: list[corpus.PlaybookManifest] = self.manifest.playbooks
+        deadline: float = time.monotonic() + (self.duration or 0)
+        count: int = 0
+        index: int = client
+        while True:
+            if self.requests is not None:
+                # Requests are spread over the clients as evenly as possible
+                if count >= (self.requests - client + self.clients - 1) // self.clients:
+                    return
+            elif time.monotonic() >= deadline:
+                return
+            yield playbooks[index % len(playbooks)]
+            count += 1
+            index += self.clients
+
+
+def _run_command(workload: Workload, client: int) -> list[Sample]:
+    """Run the verifier command for each playbook of the client."""
+    directory: pathlib.Path = workload.manifest.directory
+    env: dict[str, str] = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(pathlib.Path(lib.__file__).parents[1]), env.get("PYTHONPATH", "")]
+    )
+
+    samples: list[Sample] = []
+    for playbook in workload.assignments(client):
+        command: list[str] = [
+            *workload.command,
+            "--playbook",
+            str(directory / playbook.path),
+            "--key",
+            str(directory / workload.manifest.public_key),
+            "--revocation-list",
+            str(directory / workload.manifest.revocation_list),
+        ]
+        start: float = time.perf_counter()
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=env,
+        )
+        # Reaped here instead of by Popen, to get the usage of this child only
+        _, status, usage = os.wait4(process.pid, 0)
+        latency: float = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        samples.append(
+            Sample(
+                client=client,
+                playbook=playbook.path,
+                latency=latency,
+                ok=process.returncode == 0,
+                expected=playbook.ok,
+                rss=usage.ru_maxrss,
+            )
+        )
+    return samples
+
+
+def _run_library(workload: Workload, client: int) -> list[Sample]:
+    """Verify each playbook of the client in this process, as the command would."""
+    directory: pathlib.Path = workload.manifest.directory
+    gpg_key: bytes = (directory / workload.manifest.public_key).read_bytes()
+    revocation_list: str = (directory / workload.manifest.revocation_list).read_text()
+
+    # Failures are counted in the report; logging them would flood the output
+    logging.disable(logging.CRITICAL)
+
+    samples: list[Sample] = []
+    for playbook in workload.assignments(client):
+        start: float = time.perf_counter()
+        with lib.Verifier(gpg_key, revocation_list=revocation_list) as verifier:
+            verdict: lib.PlaybookVerdict = verifier.verify_playbook(
+                (directory / playbook.path).read_text()
+            )
+        latency: float = time.perf_counter() - start
+
+        samples.append(
+            Sample(
+                client=client,
+                playbook=playbook.path,
+                latency=latency,
+                ok=verdict.ok,
+                expected=playbook.ok,
+                rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            )
+        )
+    return samples
+
+
+def temporary_directories() -> set[pathlib.Path]:
+    """Find the temporary directories of the verifiers on this host."""
+    result: set[pathlib.Path] = set()
+    for parent, prefix in (
+        (
+            crypto._setting("TEMPORARY_GPG_HOME_PARENT_DIRECTORY"),
+            crypto._setting("TEMPORARY_GPG_HOME_PARENT_DIRECTORY_PREFIX"),
+        ),
+        (
+            lib._setting("TEMPORARY_STASH_DIRECTORY"),
+            lib._setting("TEMPORARY_STASH_DIRECTORY_PREFIX"),
+        ),
+    ):
+        result.update(pathlib.Path(parent).glob(f"{prefix}*"))
+    return result
+
+
+def gpg_agents() -> set[int]:
+    """Find the running GPG agents of this user, ignoring exited ones."""
+    result: set[int] = set()
+    for stat in pathlib.Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # The command may contain spaces and parentheses, the state follows it
+            name, _, rest = stat.read_text().rpartition(")")
+            if not name.endswith("(gpg-agent") or rest.split()[0] in ("Z", "X"):
+                continue
+            if stat.parent.stat().st_uid == os.getuid():
+                result.add(int(stat.parent.name))
+        except OSError:
+            # The process has exited
+            continue
+    return result
+
+
+@dataclasses.dataclass(frozen=True)
+class Report:
+    """Summary of a load test.
+
+    :param elapsed: Wall time of the whole test, in seconds.
+    :param failed: Number of verifications which did not pass.
+    :param unexpected: Number of verdicts differing from the manifest.
+    :param leftover_directories: Temporary directories left behind.
+    :param leftover_agents: Number of GPG agents left running.
+    :param peak_rss: Highest peak resident memory of a verifier, in kilobytes.
+    """
+
+    mode: str
+    clients: int
+    requests: int
+    elapsed: float
+    throughput: float
+    latency: dict[str, float]
+    failed: int
+    unexpected: int
+    leftover_directories: list[str]
+    leftover_agents: int
+    peak_rss: int
+
+    @property
+    def ok(self) -> bool:
+        return not (
+            self.unexpected or self.leftover_directories or self.leftover_agents
+        )
+
+
+def percentile(values: typing.Sequence[float], fraction: float) -> float:
+    """Get the nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    rank: int = max(0, min(len(values) - 1, math.ceil(fraction * len(values)) - 1))
+    return values[rank]
+
+
+def summarize(
+    mode: str,
+    clients: int,
+    samples: list[Sample],
+    elapsed: float,
+    leftover_directories: set[pathlib.Path],
+    leftover_agents: set[int],
+) -> Report:
+    latencies: list[float] = sorted(sample.latency for sample in samples)
+    return Report(
+        mode=mode,
+        clients=clients,
+        requests=len(samples),
+        elapsed=elapsed,
+        throughput=len(samples) / elapsed if elapsed else 0.0,
+        latency={
+            "min": latencies[0] if latencies else 0.0,
+            "p50": percentile(latencies, 0.50),
+            "p90": percentile(latencies, 0.90),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0.0,
+            "mean": statistics.fmean(latencies) if latencies else 0.0,
+        },
+        failed=sum(not sample.ok for sample in samples),
+        unexpected=sum(sample.ok != sample.expected for sample in samples),
+        leftover_directories=sorted(str(path) for path in leftover_directories),
+        leftover_agents=len(leftover_agents),
+        peak_rss=max((sample.rss for sample in samples), default=0),
+    )
+
+
+def run(
+    workload: Workload, mode: str, settle: float = 5.0
+) -> tuple[Report, list[Sample]]:
+    """Run the clients concurrently and summarize their samples.
+
+    :param mode: Either 'cli' or 'library'.
+    :param settle: Seconds to wait for exiting GPG agents before reporting leftovers.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}'.")
+    directories: set[pathlib.Path] = temporary_directories()
+    agents: set[int] = gpg_agents()
+
+    executor: concurrent.futures.Executor
+    if mode == "cli":
+        # The verifiers are separate processes, the clients only wait for them
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workload.clients)
+        client: typing.Callable[[Workload, int], list[Sample]] = _run_command
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=workload.clients)
+        client = _run_library
+
+    start: float = time.perf_counter()
+    with executor:
+        futures = [
+            executor.submit(client, workload, index)
+            for index in range(workload.clients)
+        ]
+        samples: list[Sample] = [
+            sample for future in futures for sample in future.result()
+        ]
+    elapsed: float = time.perf_counter() - start
+
+    # Agents are stopped asynchronously, give them time to exit
+    deadline: float = time.monotonic() + settle
+    while True:
+        leftover_directories = temporary_directories() - directories
+        leftover_agents = gpg_agents() - agents
+        if not (leftover_directories or leftover_agents) or time.monotonic() > deadline:
+            break
+        time.sleep(0.1)
+
+    report: Report = summarize(
+        mode, workload.clients, samples, elapsed, leftover_directories, leftover_agents
+    )
+    return report, samples
+
+
+def format_report(report: Report) -> str:
+    latency: str = ", ".join(
+        f"{name} {value * 1000:.1f} ms" for name, value in report.latency.items()
+    )
+    lines: list[str] = [
+        f"Mode:         {report.mode}, {report.clients} concurrent clients",
+        f"Requests:     {report.requests} in {report.elapsed:.1f} s "
+        f"({report.throughput:.1f}/s)",
+        f"Latency:      {latency}",
+        f"Failed:       {report.failed} ({report.unexpected} unexpected)",
+        f"Peak RSS:     {report.peak_rss / 1024:.1f} MiB",
+        f"Leftovers:    {len(report.leftover_directories)} temporary directories, "
+        f"{report.leftover_agents} GPG agents",
+    ]
+    lines += [f"              {path}" for path in report.leftover_directories]
+    return "\n".join(lines)
+
+
+def parse_command(command: str) -> tuple[str, ...]:
+    return tuple(shlex.split(command))
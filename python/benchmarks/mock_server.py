@@ -0,0 +1,313 @@
+"""Mock signing server, to develop and load test the signer offline.
+
+The server signs digests with a throwaway key pair, as the signing server
+behind `rpm-sign` does with the production key. It can be made as slow,
+as busy and as unreliable as the real one:
+
+- every request waits `latency` seconds, plus up to `jitter`,
+- at most `concurrency` requests are handled at once, the others queue,
+- a `failure_rate` fraction of the requests fails.
+
+Messages are framed by `insights_ansible_playbook_lib.protocol`, as for the
+verification daemon: the client sends the digest and receives a JSON object,
+
+    {"ok": true, "signature": "<base64>", "error": null}
+
+Run it with `python3 -m benchmarks.mock_server`; the signer requests
+signatures from it through `MockServerBackend`.
+"""
+
+import argparse
+import base64
+import contextlib
+import dataclasses
+import json
+import logging
+import pathlib
+import random
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import typing
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import _keygen, crypto, protocol, tracing
+from insights_ansible_playbook_signer import backends
+
+
+logger = logging.getLogger(__name__)
+
+
+# Largest digest the server accepts.
+MAX_DIGEST_SIZE: int = 1024
+
+# Seconds the backend waits for a signature.
+BACKEND_TIMEOUT: float = 60.0
+
+
+@dataclasses.dataclass(frozen=True)
+class MockSettings:
+    """Behavior of the mock signing server.
+
+    :param latency: Seconds every request takes at least.
+    :param jitter: Largest random number of seconds added to the latency.
+    :param concurrency: Number of requests handled at once.
+    :param failure_rate: Fraction of the requests that fail.
+    :param seed: Seed of the jitter and failures; random when None.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    concurrency: int = 4
+    failure_rate: float = 0.0
+    seed: typing.Optional[int] = None
+
+
+@dataclasses.dataclass
+class MockStatistics:
+    """What the mock signing server has done.
+
+    :param signed: Number of signed digests.
+    :param failed: Number of requests that failed.
+    :param peak_concurrency: Most requests handled at once.
+    """
+
+    signed: int = 0
+    failed: int = 0
+    peak_concurrency: int = 0
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "MockSigningServer"
+
+    def handle(self) -> None:
+        try:
+            digest: bytes = protocol.receive_message(
+                self.request, max_size=MAX_DIGEST_SIZE
+            )
+        except protocol.ProtocolError as exc:
+            logger.warning("Rejecting request: %s", exc)
+            response: dict = {"ok": False, "signature": None, "error": str(exc)}
+        else:
+            response = self.server.sign(digest)
+        protocol.send_message(self.request, json.dumps(response).encode("utf-8"))
+
+
+class MockSigningServer(socketserver.ThreadingUnixStreamServer):
+    """Server signing digests with a local key pair, one thread per connection.
+
+    :param socket_path: Path of the Unix socket to listen on.
+    :param key_pair: Key pair to sign with.
+    :param settings: Latency, concurrency and failures to simulate.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path: pathlib.Path,
+        key_pair: _keygen.KeyPair,
+        settings: typing.Optional[MockSettings] = None,
+    ):
+        settings = settings or MockSettings()
+        self.settings: MockSettings = settings
+        self.statistics = MockStatistics()
+        self._random = random.Random(settings.seed)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(settings.concurrency)
+        self._active: int = 0
+
+        self._directory = tempfile.TemporaryDirectory(
+            prefix=lib.TEMPORARY_STASH_DIRECTORY_PREFIX,
+            dir=lib.TEMPORARY_STASH_DIRECTORY,
+        )
+        key: pathlib.Path = pathlib.Path(self._directory.name) / "key.private.gpg"
+        key.write_bytes(key_pair.private)
+        self._keyring = crypto.GPGKeyring(key)
+        result: crypto.GPGCommandResult = self._keyring.open()
+        if not result.ok:
+            self._keyring.close()
+            self._directory.cleanup()
+            raise RuntimeError(f"Could not import the key: {result}")
+
+        try:
+            super().__init__(str(socket_path), _Handler)
+        except Exception:
+            self._keyring.close()
+            self._directory.cleanup()
+            raise
+
+    def _draw(self) -> tuple[float, bool]:
+        """Get the latency of a request and whether it fails."""
+        with self._lock:
+            delay: float = self.settings.latency + self._random.uniform(
+                0, self.settings.jitter
+            )
+            return delay, self._random.random() < self.settings.failure_rate
+
+    def sign(self, digest: bytes) -> dict:
+        """Sign the digest once a slot is free, as configured."""
+        delay, fail = self._draw()
+        with self._slots:
+            with self._lock:
+                self._active += 1
+                self.statistics.peak_concurrency = max(
+                    self.statistics.peak_concurrency, self._active
+                )
+            try:
+                time.sleep(delay)
+                if fail:
+                    raise RuntimeError("Simulated failure.")
+                signature: bytes = self._sign(digest)
+            except Exception as exc:
+                with self._lock:
+                    self.statistics.failed += 1
+                logger.debug("Could not sign the digest: %s", exc)
+                return {"ok": False, "signature": None, "error": str(exc)}
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+        with self._lock:
+            self.statistics.signed += 1
+        return {
+            "ok": True,
+            "signature": base64.b64encode(signature).decode("ascii"),
+            "error": None,
+        }
+
+    def _sign(self, digest: bytes) -> bytes:
+        with tempfile.TemporaryDirectory(
+            prefix=lib.TEMPORARY_STASH_DIRECTORY_PREFIX,
+            dir=lib.TEMPORARY_STASH_DIRECTORY,
+        ) as temp_dir:
+            digest_file = pathlib.Path(temp_dir) / "digest"
+            digest_file.write_bytes(digest)
+            result: crypto.GPGCommandResult = self._keyring.sign(digest_file)
+            if not result.ok:
+                raise RuntimeError(f"GPG failed: {result}")
+            return (pathlib.Path(temp_dir) / "digest.asc").read_bytes()
+
+    def server_close(self) -> None:
+        super().server_close()
+        self._keyring.close()
+        self._directory.cleanup()
+
+
+class MockServerBackend(backends.SigningBackend):
+    """Request the signatures from the mock signing server.
+
+    Each signature is requested over a new connection, as with `rpm-sign`.
+
+    :param socket_path: Unix socket the mock server listens on.
+    :param timeout: Seconds to wait for a signature.
+    """
+
+    name = "mock-server"
+
+    def __init__(self, socket_path: pathlib.Path, timeout: float = BACKEND_TIMEOUT):
+        self.socket_path: pathlib.Path = socket_path
+        self.timeout: float = timeout
+
+    def sign(self, digest: bytes) -> bytes:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(str(self.socket_path))
+            except OSError as exc:
+                raise RuntimeError(
+                    f"Could not connect to the signing server at "
+                    f"'{self.socket_path}': {exc}."
+                ) from exc
+            with tracing.span("mock-server"):
+                protocol.send_message(sock, digest)
+                response: dict = json.loads(
+                    protocol.receive_message(sock, max_size=1024 * 1024)
+                )
+
+        if not response["ok"]:
+            raise RuntimeError(f"Signing server failed: {response['error']}")
+        signature: bytes = base64.b64decode(response["signature"])
+        return signature
+
+
+@contextlib.contextmanager
+def running(
+    socket_path: pathlib.Path,
+    key_pair: _keygen.KeyPair,
+    settings: typing.Optional[MockSettings] = None,
+) -> typing.Iterator[MockSigningServer]:
+    """Run the mock signing server in a background thread."""
+    with MockSigningServer(socket_path, key_pair, settings) as mock:
+        thread = threading.Thread(target=mock.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield mock
+        finally:
+            mock.shutdown()
+            thread.join()
+            with contextlib.suppress(FileNotFoundError):
+                socket_path.unlink()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--debug", action="store_true", help="Display logs")
+    parser.add_argument(
+        "--socket",
+        type=pathlib.Path,
+        required=True,
+        help="Path of the Unix socket to listen on",
+    )
+    parser.add_argument(
+        "--public-key",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="Write the public key the server signs with to the file",
+    )
+    parser.add_argument(
+        "--key-cache",
+        type=pathlib.Path,
+        metavar="DIR",
+        help="Directory to reuse the key pair from, instead of generating one",
+    )
+    defaults = MockSettings()
+    parser.add_argument("--latency", type=float, default=defaults.latency)
+    parser.add_argument("--jitter", type=float, default=defaults.jitter)
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency)
+    parser.add_argument("--failure-rate", type=float, default=defaults.failure_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+    lib._configure_logging(debug=args.debug)
+
+    key_pair: _keygen.KeyPair
+    if args.key_cache is not None:
+        (key_pair,) = _keygen.cached_key_pairs(args.key_cache, 1)
+    else:
+        (key_pair,) = _keygen.generate_key_pairs(1)
+    if args.public_key is not None:
+        args.public_key.write_bytes(key_pair.public)
+
+    settings = MockSettings(
+        latency=args.latency,
+        jitter=args.jitter,
+        concurrency=args.concurrency,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    try:
+        with MockSigningServer(args.socket, key_pair, settings) as mock:
+            print(f"Listening on '{args.socket}'.", file=sys.stderr)
+            with contextlib.suppress(KeyboardInterrupt):
+                mock.serve_forever()
+            print(f"{mock.statistics}", file=sys.stderr)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            args.socket.unlink()
+
+
+if __name__ == "__main__":
+    main()
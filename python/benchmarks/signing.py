@@ -0,0 +1,99 @@
+"""Throughput of the signer against the mock signing server.
+
+A playbook of many plays is signed by `sign_playbook`, as the signer
+command does, with the mock server backend. Each round signs it with a
+different number of concurrent jobs, against a fresh server with the given
+latency, concurrency limit and failure rate, so that changes to batching
+and concurrency in the signer can be measured without the signing server.
+"""
+
+import dataclasses
+import pathlib
+import tempfile
+import time
+import typing
+
+from insights_ansible_playbook_lib import _keygen
+from insights_ansible_playbook_signer import app
+
+from benchmarks import inputs, mock_server
+
+
+@dataclasses.dataclass(frozen=True)
+class Result:
+    """Signing of the playbook with a number of jobs.
+
+    :param jobs: Number of signatures requested at once.
+    :param plays: Number of plays in the playbook.
+    :param elapsed: Wall time of the signing, in seconds.
+    :param peak_concurrency: Most requests the server handled at once.
+    :param error: Why the signing failed, if it did.
+    """
+
+    jobs: int
+    plays: int
+    elapsed: float
+    peak_concurrency: int
+    error: typing.Optional[str] = None
+
+    @property
+    def throughput(self) -> float:
+        return self.plays / self.elapsed if self.elapsed else 0.0
+
+
+def run(
+    plays: int,
+    jobs: typing.Iterable[int],
+    settings: mock_server.MockSettings,
+    key_pair: _keygen.KeyPair,
+) -> list[Result]:
+    """Sign a playbook of the plays once for each number of jobs.
+
+    :param plays: Number of plays in the playbook.
+    :param jobs: Numbers of signatures requested at once.
+    :param settings: Behavior of the mock server.
+    :param key_pair: Key pair the mock server signs with.
+    """
+    playbook: list[dict] = inputs._many_plays(plays)
+    results: list[Result] = []
+    for count in jobs:
+        # The default temporary directory keeps the socket path short enough
+        with tempfile.TemporaryDirectory(prefix="signing-") as directory:
+            socket_path = pathlib.Path(directory) / "socket"
+            with mock_server.running(socket_path, key_pair, settings) as mock:
+                error: typing.Optional[str] = None
+                start: float = time.perf_counter()
+                try:
+                    with mock_server.MockServerBackend(socket_path) as backend:
+                        app.sign_playbook(playbook, backend, jobs=count)
+                except RuntimeError as exc:
+                    error = str(exc)
+                elapsed: float = time.perf_counter() - start
+                results.append(
+                    Result(
+                        jobs=count,
+                        plays=plays,
+                        elapsed=elapsed,
+                        peak_concurrency=mock.statistics.peak_concurrency,
+                        error=error,
+                    )
+                )
+    return results
+
+
+def format_results(results: list[Result], settings: mock_server.MockSettings) -> str:
+    lines: list[str] = [
+        f"Server:  {settings.latency * 1000:.0f} ms latency "
+        f"(+{settings.jitter * 1000:.0f} ms jitter), {settings.concurrency} "
+        f"concurrent requests, {settings.failure_rate:.0%} failures",
+        f"{'Jobs':>6} {'Plays':>7} {'Time':>10} {'Plays/s':>9} {'Peak':>6}",
+    ]
+    for result in results:
+        line: str = (
+            f"{result.jobs:>6} {result.plays:>7} {result.elapsed:>8.2f} s "
+            f"{result.throughput:>9.1f} {result.peak_concurrency:>6}"
+        )
+        if result.error is not None:
+            line += f"  failed: {result.error}"
+        lines.append(line)
+    return "\n".join(lines)
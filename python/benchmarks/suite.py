@@ -0,0 +1,281 @@
+"""Stages, crypto strategies and their measurement."""
+
+import contextlib
+import dataclasses
+import datetime
+import pathlib
+import platform
+import statistics
+import timeit
+import typing
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import crypto
+from insights_ansible_playbook_lib.serialization import serialize_play
+
+from benchmarks.inputs import Input
+
+
+FAKE_GPG: pathlib.Path = pathlib.Path(__file__).parent / "fake-gpg"
+
+# Seconds a single round of a benchmark should take at least.
+ROUND_TIME: float = 0.2
+
+
+@dataclasses.dataclass(frozen=True)
+class Result:
+    """Timing of a single benchmark, in seconds per call.
+
+    :param stage: Name of the measured stage.
+    :param input: Name of the playbook.
+    :param strategy: Crypto strategy, for the stages that verify signatures.
+    :param number: Number of calls in each round.
+    :param repeat: Number of rounds.
+    """
+
+    stage: str
+    input: str
+    strategy: typing.Optional[str]
+    number: int
+    repeat: int
+    min: float
+    median: float
+    mean: float
+
+    @property
+    def name(self) -> str:
+        parts: list[str] = [self.stage, self.input]
+        if self.strategy is not None:
+            parts.append(self.strategy)
+        return "/".join(parts)
+
+
+@contextlib.contextmanager
+def use_gpg(gpg: str) -> typing.Iterator[None]:
+    """Run the real GPG, or the stand-in accepting every signature."""
+    if gpg == "real":
+        yield
+        return
+    original: tuple[str, str] = (crypto.GPG_BINARY, crypto.GPGCONF_BINARY)
+    crypto.GPG_BINARY = crypto.GPGCONF_BINARY = str(FAKE_GPG)
+    try:
+        yield
+    finally:
+        crypto.GPG_BINARY, crypto.GPGCONF_BINARY = original
+
+
+def _pure_stages(playbook: Input) -> dict[str, typing.Callable[[], typing.Any]]:
+    """Stages that do not verify signatures."""
+    plays: list[dict] = lib.parse_playbook(playbook.raw)
+    excluded: list[list[tuple[str, ...]]] = [
+        lib.get_excluded_fields(play) for play in plays
+    ]
+    serialized: list[bytes] = [
+        serialize_play(play, exclude=fields).encode("utf-8")
+        for play, fields in zip(plays, excluded)
+    ]
+    return {
+        "parse": lambda: lib.parse_playbook(playbook.raw),
+        "clean": lambda: [lib.clean_play(play) for play in plays],
+        "serialize": lambda: [
+            serialize_play(play, exclude=fields)
+            for play, fields in zip(plays, excluded)
+        ],
+        "digest": lambda: [lib.create_play_digest(play) for play in serialized],
+        "canonicalize": lambda: [lib.canonicalize_play(play) for play in plays],
+    }
+
+
+@contextlib.contextmanager
+def _crypto_stages(
+    playbook: Input, strategy: str
+) -> typing.Iterator[dict[str, typing.Callable[[], typing.Any]]]:
+    """Stages that verify signatures using the strategy.
+
+    - oneshot: Each play imports the key into its own GPG home directory.
+    - keyring: All plays share a keyring the key was imported into once.
+    - verifier: A `Verifier`, with its cache of verified signatures disabled.
+    """
+    plays: list[dict] = lib.parse_playbook(playbook.raw)
+
+    if strategy == "oneshot":
+        yield {
+            "verify": lambda: [
+                lib.verify_play(play, playbook.gpg_key) for play in plays
+            ],
+            "end-to-end": lambda: [
+                lib.verify_play(play, playbook.gpg_key)
+                for play in lib.parse_playbook(playbook.raw)
+            ],
+        }
+    elif strategy == "keyring":
+        keyring: crypto.GPGKeyring = lib.open_keyring(playbook.gpg_key)
+        try:
+            yield {
+                "verify": lambda: [
+                    lib.verify_play(play, playbook.gpg_key, keyring=keyring)
+                    for play in plays
+                ],
+                "end-to-end": lambda: [
+                    lib.verify_play(play, playbook.gpg_key, keyring=keyring)
+                    for play in lib.iter_playbook(playbook.raw)
+                ],
+            }
+        finally:
+            keyring.close()
+    elif strategy == "verifier":
+        with lib.Verifier(playbook.gpg_key, cache_size=0) as verifier:
+            verifier.wait()
+            yield {
+                "verify": lambda: verifier.verify_plays(plays).raise_for_error(),
+                "end-to-end": lambda: verifier.verify_playbook(
+                    playbook.raw
+                ).raise_for_error(),
+            }
+    else:
+        raise ValueError(f"Unknown strategy '{strategy}'.")
+
+
+CRYPTO_STAGES: tuple[str, ...] = ("verify", "end-to-end")
+STRATEGIES: tuple[str, ...] = ("oneshot", "keyring", "verifier")
+GPG: tuple[str, ...] = ("real", "fake")
+
+
+def measure(
+    function: typing.Callable[[], typing.Any], repeat: int
+) -> tuple[int, list[float]]:
+    """Time the function.
+
+    :returns: Number of calls in each round and the time of a call in each round.
+    """
+    timer = timeit.Timer(function)
+    number: int = 1
+    while True:
+        elapsed: float = timer.timeit(number)
+        if elapsed >= ROUND_TIME or number >= 1_000_000:
+            break
+        number = max(number * 2, int(number * ROUND_TIME / max(elapsed, 1e-9)))
+    times: list[float] = [elapsed / number] + [
+        timer.timeit(number) / number for _ in range(repeat - 1)
+    ]
+    return number, times
+
+
+def _result(
+    stage: str,
+    playbook: Input,
+    strategy: typing.Optional[str],
+    function: typing.Callable[[], typing.Any],
+    repeat: int,
+) -> Result:
+    number, times = measure(function, repeat)
+    return Result(
+        stage=stage,
+        input=playbook.name,
+        strategy=strategy,
+        number=number,
+        repeat=repeat,
+        min=min(times),
+        median=statistics.median(times),
+        mean=statistics.fmean(times),
+    )
+
+
+def run(
+    playbooks: typing.Iterable[Input],
+    stages: typing.Container[str],
+    strategies: typing.Iterable[str] = STRATEGIES,
+    gpg: typing.Iterable[str] = GPG,
+    repeat: int = 5,
+    progress: typing.Callable[[Result], None] = lambda result: None,
+) -> list[Result]:
+    """Time the stages over the playbooks.
+
+    :param stages: Names of the stages to time.
+    :param strategies: Crypto strategies to time the verification with.
+    :param gpg: Whether to use the real GPG, the stand-in, or both.
+    :param repeat: Number of rounds of each benchmark.
+    :param progress: Called with each result as soon as it is measured.
+    """
+    results: list[Result] = []
+    for playbook in playbooks:
+        for stage, function in _pure_stages(playbook).items():
+            if stage in stages:
+                results.append(_result(stage, playbook, None, function, repeat))
+                progress(results[-1])
+
+        if not any(stage in stages for stage in CRYPTO_STAGES):
+            continue
+        for binary in gpg:
+            for strategy in strategies:
+                with (
+                    use_gpg(binary),
+                    _crypto_stages(playbook, strategy) as crypto_stages,
+                ):
+                    for stage, function in crypto_stages.items():
+                        if stage in stages:
+                            name: str = f"{strategy}+{binary}-gpg"
+                            results.append(
+                                _result(stage, playbook, name, function, repeat)
+                            )
+                            progress(results[-1])
+    return results
+
+
+def metadata() -> dict:
+    """Describe the environment the benchmarks ran in."""
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+@dataclasses.dataclass(frozen=True)
+class Comparison:
+    """Change of a benchmark against the baseline.
+
+    :param ratio: Current time divided by the baseline time.
+    """
+
+    name: str
+    baseline: float
+    current: float
+    ratio: float
+    regressed: bool
+
+
+def compare(
+    baseline: list[dict], current: list[dict], threshold: float, metric: str = "min"
+) -> tuple[list[Comparison], list[str], list[str]]:
+    """Compare results with the baseline.
+
+    :param threshold: Relative slowdown considered a regression, e.g. 0.25.
+    :param metric: Statistic of the results to compare.
+    :returns: Comparisons of benchmarks present in both, names of the
+        benchmarks missing from the current results and names of new ones.
+    """
+    before: dict[str, dict] = {item["name"]: item for item in baseline}
+    after: dict[str, dict] = {item["name"]: item for item in current}
+
+    comparisons: list[Comparison] = []
+    for name, item in after.items():
+        if name not in before:
+            continue
+        old: float = before[name][metric]
+        new: float = item[metric]
+        ratio: float = new / old if old > 0 else float("inf")
+        comparisons.append(
+            Comparison(
+                name=name,
+                baseline=old,
+                current=new,
+                ratio=ratio,
+                regressed=ratio > 1 + threshold,
+            )
+        )
+    missing: list[str] = [name for name in before if name not in after]
+    added: list[str] = [name for name in after if name not in before]
+    return comparisons, missing, added
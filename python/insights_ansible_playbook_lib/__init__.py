@@ -2,31 +2,81 @@ import base64
 import copy
 import dataclasses
 import hashlib
+import importlib
 import logging
-import os
 import pathlib
 import sys
 import tempfile
+import typing
 
 import yaml
 
-from insights_ansible_playbook_lib import crypto
+from insights_ansible_playbook_lib import artifacts, crypto, tracing
+from insights_ansible_playbook_lib.errors import GPGValidationError, PreconditionError
+from insights_ansible_playbook_lib.limits import (
+    DEFAULT_LIMITS,
+    LimitExceededError as LimitExceededError,
+    Limits,
+)
+from insights_ansible_playbook_lib.openpgp import (
+    KeyIndex,
+    PacketError,
+    SignatureMismatchError,
+    check_signature,
+    name_issuer,
+)
 from insights_ansible_playbook_lib.serialization import serialize_play, Loader
 
+if typing.TYPE_CHECKING:
+    from insights_ansible_playbook_lib.cost import (
+        Cost as Cost,
+        PlayCost as PlayCost,
+        explain_cost as explain_cost,
+    )
+    from insights_ansible_playbook_lib.verifier import (
+        PlaybookVerdict as PlaybookVerdict,
+        PlayVerdict as PlayVerdict,
+        Verifier as Verifier,
+    )
+
 
 logger = logging.getLogger(__name__)
 
 
 VARIABLE_FIELDS: list[str] = ["hosts", "vars"]
 
+# Number of plays a `Verifier` verifies at once.
+VERIFICATION_JOBS: int = 4
+
+# Modules providing the names below, imported on first use. They are built
+# on top of this module and pull in threads, which the CLI often never needs.
+_LAZY_MODULES: dict[str, str] = {
+    "PlaybookVerdict": "insights_ansible_playbook_lib.verifier",
+    "PlayVerdict": "insights_ansible_playbook_lib.verifier",
+    "Verifier": "insights_ansible_playbook_lib.verifier",
+    "Cost": "insights_ansible_playbook_lib.cost",
+    "PlayCost": "insights_ansible_playbook_lib.cost",
+    "explain_cost": "insights_ansible_playbook_lib.cost",
+}
+
 
-# Try to use the special /var/lib/ directory.
-if os.geteuid() == 0 and os.path.isdir("/var/lib/insights-ansible-playbook-verifier/"):
-    TEMPORARY_STASH_DIRECTORY = "/var/lib/insights-ansible-playbook-verifier/"
-    TEMPORARY_STASH_DIRECTORY_PREFIX = "files-"
-else:
-    TEMPORARY_STASH_DIRECTORY = "/tmp/"
-    TEMPORARY_STASH_DIRECTORY_PREFIX = "insights-ansible-playbook-verifier-files-"
+def __getattr__(name: str) -> typing.Any:
+    if name in _LAZY_MODULES:
+        return getattr(importlib.import_module(_LAZY_MODULES[name]), name)
+    # Try to use the special /var/lib/ directory, detected on first use.
+    if name == "TEMPORARY_STASH_DIRECTORY":
+        return crypto.STASH_DIRECTORY if crypto.use_stash_directory() else "/tmp/"
+    if name == "TEMPORARY_STASH_DIRECTORY_PREFIX":
+        if crypto.use_stash_directory():
+            return "files-"
+        return "insights-ansible-playbook-verifier-files-"
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _setting(name: str) -> str:
+    """Get a lazily detected module attribute, unless it has been overridden."""
+    value: str = globals()[name] if name in globals() else __getattr__(name)
+    return value
 
 
 def _configure_logging(debug: bool = False) -> None:
@@ -60,31 +110,104 @@ def _configure_logging(debug: bool = False) -> None:
         main_logger.addHandler(handler)
 
 
-class PreconditionError(RuntimeError):
-    pass
-
-
 @dataclasses.dataclass(frozen=True)
-class GPGValidationError(RuntimeError):
-    message: str
-    serialized_play: bytes
-    digest: bytes
+class CanonicalPlay:
+    """Canonical form of a play, ready to be verified.
+
+    :param name: Name of the play.
+    :param signature: Base64-encoded signature of the play.
+    :param digest: SHA256 of the serialized play.
+    :param serialized_play: Serialized play without its variable fields.
+        It may be omitted when it is not kept in memory.
+    """
+
+    name: str
     signature: bytes
+    digest: bytes
+    serialized_play: typing.Optional[bytes]
+
 
+def parse_playbook(playbook: str, limits: Limits = DEFAULT_LIMITS) -> list[dict]:
+    """Parse a raw playbook into a list of plays.
 
-def parse_playbook(playbook: str) -> list[dict]:
-    """Parse a raw playbook into a list of plays."""
+    :raises LimitExceededError: The playbook exceeds the limits.
+    """
     logger.info("Parsing playbook.")
-    content: list[dict] = yaml.load(playbook, Loader=Loader)  # type: ignore
+    limits.check_input(playbook)
+    loader = Loader(playbook, limits=limits)
+    try:
+        with tracing.span("parse_playbook", size=len(playbook)):
+            content: list[dict] = loader.get_single_data()
+    finally:
+        loader.dispose()
     return content
 
 
-def clean_play(play: dict) -> dict:
-    """Remove variable fields from the play."""
-    logger.info(f"Cleaning play '{play.get('name')}'.")
+def iter_playbook(
+    playbook: str, limits: Limits = DEFAULT_LIMITS
+) -> typing.Iterator[dict]:
+    """Parse a raw playbook, yielding each play as soon as it has been parsed.
+
+    The plays are equal to the ones returned by `parse_playbook()`; anchors
+    defined in a play can still be referenced by the following plays.
+
+    :raises LimitExceededError: The playbook exceeds the limits.
+    """
+    logger.info("Parsing playbook play by play.")
+    limits.check_input(playbook)
+    # PyYAML's event API is not annotated
+    loader: typing.Any = Loader(playbook, limits=limits)
+    try:
+        loader.get_event()  # StreamStartEvent
+        if loader.check_event(yaml.StreamEndEvent):
+            return
+        document_start = loader.get_event()  # DocumentStartEvent
+
+        if not loader.check_event(yaml.SequenceStartEvent):
+            content: typing.Any = loader.construct_document(
+                loader.compose_node(None, None)
+            )
+            if content is not None:
+                yield from content
+        else:
+            loader.get_event()  # SequenceStartEvent
+            index: int = 0
+            while not loader.check_event(yaml.SequenceEndEvent):
+                with tracing.span("parse_play", index=index):
+                    node: yaml.Node = loader.compose_node(None, None)
+                    play: typing.Any = loader.construct_document(node)
+                logger.debug(
+                    "Parsed play %s (lines %s-%s).",
+                    index + 1,
+                    node.start_mark.line + 1,
+                    node.end_mark.line + 1,
+                )
+                yield play
+                index += 1
+            loader.get_event()  # SequenceEndEvent
+
+        loader.get_event()  # DocumentEndEvent
+        if not loader.check_event(yaml.StreamEndEvent):
+            event = loader.get_event()
+            raise yaml.composer.ComposerError(
+                "expected a single document in the stream",
+                document_start.start_mark,
+                "but found another document",
+                event.start_mark,
+            )
+    finally:
+        loader.dispose()
 
+
+def get_excluded_fields(play: dict) -> list[tuple[str, ...]]:
+    """Parse the variable fields the play excludes from its signature.
+
+    :param play: Parsed play.
+    :raises PreconditionError: The exclusion is invalid or refers to a missing field.
+    :returns: Paths of excluded fields, each one or two levels deep.
+    """
     fields: list[str] = play["vars"]["insights_signature_exclude"].split(",")
-    result: dict = copy.deepcopy(play)
+    result: list[tuple[str, ...]] = []
 
     for field in fields:
         elements: list[str] = [string for string in field.split("/") if string != ""]
@@ -95,20 +218,39 @@ def clean_play(play: dict) -> dict:
         if elements[0] not in VARIABLE_FIELDS:
             raise PreconditionError("Variable field '{field}' cannot be excluded.")
 
+        path: tuple[str, ...] = tuple(elements)
+        # A field excluded earlier is not present in the play anymore
+        removed: bool = any(path[: len(other)] == other for other in result)
         if len(elements) == 1:
-            if elements[0] not in result.keys():
-                raise PreconditionError(
-                    f"Variable field '{field}' is not present in the play."
-                )
-            logger.debug(f"Excluding variable field '{field}'.")
-            del result[elements[0]]
+            present: bool = elements[0] in play
         else:
-            if elements[1] not in result[elements[0]].keys():
-                raise PreconditionError(
-                    f"Variable field '{field}' is not present in the play."
-                )
-            logger.debug(f"Excluding variable field '{field}'.")
-            del result[elements[0]][elements[1]]
+            parent: typing.Any = play.get(elements[0])
+            present = isinstance(parent, dict) and elements[1] in parent
+        if removed or not present:
+            raise PreconditionError(
+                f"Variable field '{field}' is not present in the play."
+            )
+        logger.debug("Excluding variable field '%s'.", field)
+        result.append(path)
+
+    return result
+
+
+def clean_play(play: dict) -> dict:
+    """Remove variable fields from a copy of the play.
+
+    Verification and signing do not need the copy, they pass the result of
+    `get_excluded_fields()` to `serialize_play()` instead.
+    """
+    logger.info("Cleaning play '%s'.", play.get("name"))
+
+    excluded_fields: list[tuple[str, ...]] = get_excluded_fields(play)
+    result: dict = copy.deepcopy(play)
+    for path in excluded_fields:
+        if len(path) == 1:
+            del result[path[0]]
+        else:
+            del result[path[0]][path[1]]
 
     return result
 
@@ -122,59 +264,209 @@ def create_play_digest(play: bytes) -> bytes:
     return sha.digest()
 
 
-def verify_play(play: dict, gpg_key: bytes) -> bytes:
-    """Verify play's signature.
+def check_signature_fields(play_name: str, play_vars: typing.Any) -> None:
+    """Ensure the play contains the signature and the excluded fields.
 
-    :param play: Parsed play.
-    :param gpg_key: Content of public GPG key.
-    :raises PreconditionError: Play doesn't contain a signature.
-    :raises GPGValidationError: Digest does not match its signature.
-    :returns: Play digest.
+    :param play_name: Name of the play.
+    :param play_vars: Value of the 'vars' key of the play, or an empty dictionary.
+    :raises PreconditionError: One of the keys is missing.
     """
-    play_name: str = play.get("name", "???")
-    logger.info(f"Preparing to verify play '{play_name}'.")
-
-    b64_signature: bytes = play.get("vars", {}).get("insights_signature", b"")
+    b64_signature: bytes = play_vars.get("insights_signature", b"")
     if b64_signature == b"":
         raise PreconditionError(f"The play '{play_name}' does not contain a signature.")
 
-    if "insights_signature_exclude" not in play.get("vars", {}):
+    if "insights_signature_exclude" not in play_vars:
         raise PreconditionError(
             "The play does not have the key 'vars/insights_signature_exclude', "
             "cannot exclude dynamic fields."
         )
 
-    cleaned_play: dict = clean_play(play)
-    serialized_play: bytes = serialize_play(cleaned_play).encode("utf-8")
-    logger.debug(f"Serialized play as {serialized_play!r}")
+
+def canonicalize_play(play: dict, limits: Limits = DEFAULT_LIMITS) -> CanonicalPlay:
+    """Serialize and hash the play.
+
+    :param play: Parsed play.
+    :param limits: Limits of the serialization.
+    :raises PreconditionError: Play doesn't contain a signature or exceeds the limits.
+    :returns: Canonical form of the play.
+    """
+    play_name: str = play.get("name", "???")
+    check_signature_fields(play_name, play.get("vars", {}))
+
+    excluded_fields: list[tuple[str, ...]] = get_excluded_fields(play)
+    with tracing.span("serialize_play", play=play_name):
+        serialized_play: bytes = serialize_play(
+            play, exclude=excluded_fields, limits=limits
+        ).encode("utf-8")
+    tracing.count("bytes_serialized", len(serialized_play))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Serialized play as %s", artifacts.Payload(serialized_play))
     digest: bytes = create_play_digest(serialized_play)
-    signature: bytes = base64.b64decode(b64_signature)
 
-    with tempfile.TemporaryDirectory(
-        dir=TEMPORARY_STASH_DIRECTORY,
-        prefix=TEMPORARY_STASH_DIRECTORY_PREFIX,
-    ) as temp_dir:
+    return CanonicalPlay(
+        name=play_name,
+        signature=play["vars"]["insights_signature"],
+        digest=digest,
+        serialized_play=serialized_play,
+    )
+
+
+def verify_play(
+    play: dict,
+    gpg_key: typing.Union[bytes, KeyIndex],
+    limits: Limits = DEFAULT_LIMITS,
+    keyring: typing.Optional[crypto.GPGKeyring] = None,
+) -> bytes:
+    """Verify play's signature.
+
+    :param play: Parsed play.
+    :param gpg_key: Content of public GPG key, or an index of trusted keys.
+    :param limits: Limits of the serialization.
+    :param keyring: Keyring with the key already imported, see `open_keyring()`.
+    :raises PreconditionError: Play doesn't contain a signature or exceeds the limits.
+    :raises GPGValidationError: Digest does not match its signature.
+    :returns: Play digest.
+    """
+    logger.info("Preparing to verify play '%s'.", play.get("name", "???"))
+    canonical_play: CanonicalPlay = canonicalize_play(play, limits=limits)
+    return verify_canonical_play(canonical_play, gpg_key=gpg_key, keyring=keyring)
+
+
+def open_keyring(gpg_key: typing.Union[bytes, KeyIndex]) -> crypto.GPGKeyring:
+    """Import the public GPG key into a keyring for repeated verifications.
+
+    The caller is responsible for closing the keyring.
+
+    :param gpg_key: Content of public GPG key, or an index of trusted keys.
+    :raises RuntimeError: The key could not be imported.
+    """
+    with (
+        tracing.span("open_keyring"),
+        tempfile.TemporaryDirectory(
+            dir=_setting("TEMPORARY_STASH_DIRECTORY"),
+            prefix=_setting("TEMPORARY_STASH_DIRECTORY_PREFIX"),
+        ) as temp_dir,
+    ):
+        tracing.count("temp_files")
+        key_file = pathlib.Path(temp_dir) / "key"
+        if isinstance(gpg_key, KeyIndex):
+            # GPG imports all keys of the file
+            key_file.write_bytes(b"\n".join(gpg_key.gpg_keys))
+        else:
+            key_file.write_bytes(gpg_key)
+
+        keyring = crypto.GPGKeyring(key=key_file)
+        result: crypto.GPGCommandResult = keyring.open()
+        if not result.ok:
+            keyring.close()
+            raise RuntimeError(f"Could not import the GPG key: {result}")
+    return keyring
+
+
+def _log_mismatch(play: CanonicalPlay) -> None:
+    """Log the play failing its signature, saving it if artifacts are enabled."""
+    path: typing.Optional[pathlib.Path] = artifacts.save(
+        f"{play.digest.hex()}.play", play.serialized_play
+    )
+    if path is None:
+        logger.error(
+            "Play content failed to match its digest's signature: %s.",
+            artifacts.Payload(play.serialized_play),
+        )
+    else:
+        logger.error(
+            "Play content failed to match its digest's signature: %s, saved to '%s'.",
+            artifacts.Payload(play.serialized_play),
+            path,
+        )
+
+
+def decode_signature(play: CanonicalPlay) -> bytes:
+    """Decode the signature of the play and check its structure.
+
+    Malformed signatures, and most signatures not matching the digest, are
+    rejected without starting GPG.
+
+    :param play: Canonical form of the play.
+    :raises PacketError: The signature is malformed.
+    :raises GPGValidationError: Digest does not match its signature.
+    :returns: Detached signature of the digest.
+    """
+    signature: bytes = base64.b64decode(play.signature)
+    try:
+        with tracing.span("check_signature", play=play.name):
+            check_signature(signature, data=play.digest)
+    except SignatureMismatchError as exc:
+        _log_mismatch(play)
+        raise GPGValidationError(
+            "Play digest does not match its signature.",
+            serialized_play=play.serialized_play or b"",
+            digest=play.digest,
+            signature=signature,
+        ) from exc
+    except PacketError as exc:
+        raise PacketError(
+            f"Signature of play '{play.name}' is malformed: {exc}"
+        ) from exc
+    return signature
+
+
+def verify_canonical_play(
+    play: CanonicalPlay,
+    gpg_key: typing.Union[bytes, KeyIndex],
+    keyring: typing.Optional[crypto.GPGKeyring] = None,
+) -> bytes:
+    """Verify signature of a canonicalized play.
+
+    :param play: Canonical form of the play.
+    :param gpg_key: Content of public GPG key, or an index of trusted keys.
+    :param keyring: Keyring with the key already imported, see `open_keyring()`.
+    :raises PacketError: The signature is malformed or was not issued by any
+        of the trusted keys.
+    :raises GPGValidationError: Digest does not match its signature.
+    :returns: Play digest.
+    """
+    play_name: str = play.name
+    serialized_play: typing.Optional[bytes] = play.serialized_play
+    digest: bytes = play.digest
+    signature: bytes = decode_signature(play)
+    if isinstance(gpg_key, KeyIndex):
+        # Only the key that issued the signature can verify it
+        gpg_key = gpg_key.find(signature)
+    issued_signature: bytes = name_issuer(signature, gpg_key)
+
+    with (
+        tracing.span("verify_signature", play=play_name),
+        tempfile.TemporaryDirectory(
+            dir=_setting("TEMPORARY_STASH_DIRECTORY"),
+            prefix=_setting("TEMPORARY_STASH_DIRECTORY_PREFIX"),
+        ) as temp_dir,
+    ):
         temp_path = pathlib.Path(temp_dir)
 
         digest_file = temp_path / "digest"
         digest_file.write_bytes(digest)
         signature_file = temp_path / "signature"
-        signature_file.write_bytes(signature)
-        key_file = temp_path / "key"
-        key_file.write_bytes(gpg_key)
+        signature_file.write_bytes(issued_signature)
+        tracing.count("temp_files", 2)
 
-        logger.info(f"Cryptographically verifying play '{play_name}'.")
-        result: crypto.GPGCommandResult = crypto.verify_gpg_signed_file(
-            digest_file, signature_file, key_file
-        )
+        logger.info("Cryptographically verifying play '%s'.", play_name)
+        result: crypto.GPGCommandResult
+        if keyring is not None:
+            result = keyring.verify(digest_file, signature_file)
+        else:
+            key_file = temp_path / "key"
+            key_file.write_bytes(gpg_key)
+            tracing.count("temp_files")
+            result = crypto.verify_gpg_signed_file(
+                digest_file, signature_file, key_file
+            )
 
         if not result.ok:
-            logger.error(
-                f"Play content failed to match its digest's signature: {serialized_play!r}."
-            )
+            _log_mismatch(play)
             raise GPGValidationError(
                 "Play digest does not match its signature.",
-                serialized_play=serialized_play,
+                serialized_play=serialized_play or b"",
                 digest=digest,
                 signature=signature,
             )
@@ -182,25 +474,47 @@ def verify_play(play: dict, gpg_key: bytes) -> bytes:
         return digest
 
 
-def get_revocation_digests(playbook: str, gpg_key: bytes) -> set[bytes]:
+def check_revocation(play: CanonicalPlay, revoked: typing.Container[bytes]) -> None:
+    """Ensure the play has not been revoked.
+
+    :param play: Canonical form of the play.
+    :param revoked: Digests of revoked plays.
+    :raises PreconditionError: The digest of the play is on the revocation list.
+    """
+    if play.digest in revoked:
+        raise PreconditionError(
+            f"Digest of play '{play.name}' is on revocation list: '{bytearray(play.digest).hex()}'."
+        )
+
+
+def get_revocation_digests(
+    playbook: str,
+    gpg_key: typing.Union[bytes, KeyIndex],
+    limits: Limits = DEFAULT_LIMITS,
+    keyring: typing.Optional[crypto.GPGKeyring] = None,
+) -> set[bytes]:
     """Loads and verifies playbook containing revoked digests
 
     :param playbook: Content of the playbook containing digests of revoked plays.
-    :param gpg_key: Content of GPG public key.
+    :param gpg_key: Content of public GPG key, or an index of trusted keys.
+    :param limits: Limits of parsing and serialization.
+    :param keyring: Keyring with the key already imported, see `open_keyring()`.
     :returns: Set of digests of plays that have been revoked.
     """
     logger.info("Loading revocation digests.")
 
-    parsed_plays: list[dict] = parse_playbook(playbook)
+    with tracing.span("load_revocation_list"):
+        parsed_plays: list[dict] = parse_playbook(playbook, limits=limits)
 
-    if len(parsed_plays) != 1:
-        raise PreconditionError(
-            "Playbook containing hashes of revoked plays may only include one play."
-        )
-    play: dict = parsed_plays[0]
+        if len(parsed_plays) != 1:
+            raise PreconditionError(
+                "Playbook containing hashes of revoked plays may only include one play."
+            )
+        play: dict = parsed_plays[0]
 
-    _ = verify_play(play, gpg_key=gpg_key)
+        _ = verify_play(play, gpg_key=gpg_key, limits=limits, keyring=keyring)
 
     revoked: list[dict] = play.get("revoked_playbooks", [])
     digests = set(bytes(bytearray.fromhex(item["hash"])) for item in revoked)
+    tracing.count("revoked_digests", len(digests))
     return digests
@@ -1,13 +1,13 @@
 import argparse
+import dataclasses
+import hashlib
 import logging
 import os
 import pathlib
-import re
 import shutil
 import subprocess
 import sys
 import tempfile
-import textwrap
 import traceback
 
 import insights_ansible_playbook_lib as lib
@@ -20,145 +20,233 @@ logger = logging.getLogger(__name__)
 TEMPORARY_GPG_HOME_PARENT_DIRECTORY = "/tmp/"
 TEMPORARY_GPG_HOME_PARENT_DIRECTORY_PREFIX = "insights-ansible-playbook-verifier-gpg-"
 
+GPG_OWNER = "insights-ansible-playbook-verifier test"
+
+# Parameters of the primary key and its subkey, as `gpg --generate-key` reads them.
+ALGORITHMS: dict[str, str] = {
+    "ed25519": (
+        "Key-Type: EDDSA\n"
+        "Key-Curve: ed25519\n"
+        "Subkey-Type: ECDH\n"
+        "Subkey-Curve: cv25519\n"
+    ),
+    **{
+        f"rsa{length}": (
+            f"Key-Type: RSA\n"
+            f"Key-Length: {length}\n"
+            f"Subkey-Type: RSA\n"
+            f"Subkey-Length: {length}\n"
+        )
+        for length in (2048, 3072, 4096)
+    },
+}
+DEFAULT_ALGORITHM = "ed25519"
+
+
+@dataclasses.dataclass(frozen=True)
+class KeyPair:
+    """Armored GPG key pair.
+
+    :param public: Armored public key.
+    :param private: Armored private key, not protected by a passphrase.
+    :param fingerprint: Fingerprint of the primary key, in hex digits.
+    """
+
+    public: bytes
+    private: bytes
+    fingerprint: str
+
+    def write(self, directory: pathlib.Path) -> None:
+        """Write the key pair as `key.public.gpg`, `key.private.gpg` and `key.fingerprint.txt`."""
+        (directory / "key.public.gpg").write_bytes(self.public)
+        (directory / "key.private.gpg").write_bytes(self.private)
+        (directory / "key.fingerprint.txt").write_text(
+            format_fingerprint(self.fingerprint)
+        )
+
+    @classmethod
+    def read(cls, directory: pathlib.Path) -> "KeyPair":
+        """Read the key pair written by `write`."""
+        return cls(
+            public=(directory / "key.public.gpg").read_bytes(),
+            private=(directory / "key.private.gpg").read_bytes(),
+            fingerprint="".join(
+                (directory / "key.fingerprint.txt").read_text().split()
+            ),
+        )
+
+
+def format_fingerprint(fingerprint: str) -> str:
+    """Group the fingerprint the way `gpg --fingerprint` prints it."""
+    groups: list[str] = [
+        fingerprint[index : index + 4] for index in range(0, len(fingerprint), 4)
+    ]
+    half: int = len(groups) // 2
+    return " ".join(groups[:half]) + "  " + " ".join(groups[half:])
 
-def _run_gpg_command(command: list[str], fingerprint: bool = False) -> GPGCommandResult:
+
+def _instructions(algorithm: str) -> str:
+    """Get the unattended key generation parameters of a key pair.
+
+    :raises ValueError: The algorithm is not known.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(
+            f"Unknown key algorithm '{algorithm}', expected one of: "
+            f"{', '.join(ALGORITHMS)}."
+        )
+    return (
+        f"{ALGORITHMS[algorithm]}"
+        f"Name-Real: {GPG_OWNER}\n"
+        "Expire-Date: 0\n"
+        "%no-protection\n"
+        "%commit\n"
+    )
+
+
+def _run_gpg_command(command: list[str]) -> GPGCommandResult:
     """Run a GPG command in a specific directory.
 
     :param command: The command to be executed.
-    :param fingerprint: Optional flag to get the fingerprint from the output.
     """
     process = subprocess.Popen(
         command,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         env={"LC_ALL": "C.UTF-8"},
-        text=fingerprint,
     )
     stdout, stderr = process.communicate()
 
     result = GPGCommandResult(
         ok=process.returncode == 0,
         return_code=process.returncode,
-        stdout=stdout.decode("utf-8") if not fingerprint else stdout,
-        stderr=stderr.decode("utf-8") if not fingerprint else stderr,
+        stdout=stdout.decode("utf-8"),
+        stderr=stderr.decode("utf-8"),
         _command=None,
     )
 
     if result.ok:
-        logger.debug(f"GPG command {command}: ok.")
+        logger.debug("GPG command %s: ok.", command)
     else:
-        logger.error(f"GPG command {command} returned non-zero code: {result}.")
+        logger.error("GPG command %s returned non-zero code: %s.", command, result)
 
     return result
 
 
-def _generate_keys() -> str:
-    """
-    Generate GPG keys into a temporary directory.
+def _gpg(home: str, *arguments: str) -> str:
+    """Run a GPG command in the home directory.
+
+    :raises RuntimeError: The command failed.
+    :returns: Standard output of the command.
     """
-    # Create a temporary directory to store the keys
-    gpg_tmp_dir = tempfile.mkdtemp(
-        dir=TEMPORARY_GPG_HOME_PARENT_DIRECTORY,
-        prefix=TEMPORARY_GPG_HOME_PARENT_DIRECTORY_PREFIX,
-    )
-    logger.debug(f"Generating GPG keys into {gpg_tmp_dir}.")
-
-    instructions_file = pathlib.Path(gpg_tmp_dir) / "keygen"
-    instructions_file.write_text(
-        textwrap.dedent(
-            """
-            Key-Type: EDDSA
-            Key-Curve: ed25519
-            Subkey-Type: ECDH
-            Subkey-Curve: cv25519
-            Name-Real: insights-ansible-playbook-verifier test
-            Expire-Date: 0
-            %no-protection
-            %commit
-            """
-        ).strip()
-    )
-    logger.debug(f"Keys generation instructions written to a file {instructions_file}.")
-
-    # Generate the keys in a temporary directory
-    _run_gpg_command(
-        [
-            "/usr/bin/gpg",
-            "--batch",
-            "--homedir",
-            gpg_tmp_dir,
-            "--generate-key",
-            f"{instructions_file}",
-        ]
+    result = _run_gpg_command(
+        ["/usr/bin/gpg", "--batch", "--homedir", home, *arguments]
     )
+    if not result.ok:
+        raise RuntimeError(f"GPG command {arguments[0]} failed: {result.stderr}")
+    return result.stdout
+
+
+def _primary_fingerprints(listing: str) -> list[str]:
+    """Get the fingerprints of the primary keys from a `--with-colons` listing."""
+    result: list[str] = []
+    primary: bool = False
+    for line in listing.splitlines():
+        fields: list[str] = line.split(":")
+        if fields[0] in ("pub", "sec"):
+            primary = True
+        elif fields[0] == "fpr" and primary:
+            result.append(fields[9])
+            primary = False
+    return result
 
-    return gpg_tmp_dir
 
+def generate_key_pairs(count: int, algorithm: str = DEFAULT_ALGORITHM) -> list[KeyPair]:
+    """Generate key pairs in a single GPG home directory.
 
-def _export_key_pair(gpg_tmp_dir: str, keys_path: str) -> None:
-    """
-    Export the generated key pair to the `keys_path` directory.
+    One GPG process generates all of the keys, which are then exported
+    into memory. The home directory is removed even if a step fails.
 
-    :param gpg_tmp_dir: The GPG home directory where the key pair was generated.
-    :param keys_path: The directory where the key pair should be exported.
+    :param count: Number of key pairs.
+    :param algorithm: One of `ALGORITHMS`.
+    :raises ValueError: The algorithm is not known.
+    :raises RuntimeError: A GPG command failed.
     """
-    _run_gpg_command(
-        [
-            "/usr/bin/gpg",
-            "--homedir",
-            gpg_tmp_dir,
-            "--export",
-            "--armor",
-            "--yes",
-            "--output",
-            f"{keys_path}/key.public.gpg",
-        ]
+    instructions: str = _instructions(algorithm)
+    if count < 1:
+        return []
+
+    home: str = tempfile.mkdtemp(
+        dir=TEMPORARY_GPG_HOME_PARENT_DIRECTORY,
+        prefix=TEMPORARY_GPG_HOME_PARENT_DIRECTORY_PREFIX,
     )
-    logger.debug(f"GPG public key written to a file {keys_path}/key.public.gpg.")
-
-    _run_gpg_command(
-        [
-            "/usr/bin/gpg",
-            "--homedir",
-            gpg_tmp_dir,
-            "--export-secret-keys",
-            "--armor",
-            "--yes",
-            "--output",
-            f"{keys_path}/key.private.gpg",
+    logger.debug("Generating %d %s GPG key pairs into %s.", count, algorithm, home)
+    try:
+        instructions_file = pathlib.Path(home) / "keygen"
+        instructions_file.write_text(instructions * count)
+        _gpg(home, "--generate-key", str(instructions_file))
+
+        fingerprints: list[str] = _primary_fingerprints(
+            _gpg(home, "--with-colons", "--list-secret-keys")
+        )
+        return [
+            KeyPair(
+                public=_gpg(home, "--armor", "--export", fingerprint).encode(),
+                private=_gpg(
+                    home, "--armor", "--export-secret-keys", fingerprint
+                ).encode(),
+                fingerprint=fingerprint,
+            )
+            for fingerprint in fingerprints
         ]
-    )
-    logger.debug(f"GPG private key written to a file {keys_path}/key.private.gpg.")
+    finally:
+        # The agent started by the generation keeps a socket in the directory
+        subprocess.run(
+            ["/usr/bin/gpgconf", "--kill", "all"],
+            capture_output=True,
+            check=False,
+            env={"GNUPGHOME": home, "LC_ALL": "C.UTF-8"},
+        )
+        shutil.rmtree(home, ignore_errors=True)
 
 
-def _get_fingerprint(gpg_tmp_dir: str, keys_path: str) -> str:
-    """
-    Get the fingerprint of the generated key pair and write it to a file in the `keys_path` directory.
+def _cache_address(algorithm: str, index: int) -> str:
+    """Get the name of a cached key pair from the parameters it was generated from."""
+    return hashlib.sha256(f"{index}\n{_instructions(algorithm)}".encode()).hexdigest()
 
-    :param gpg_tmp_dir: The GPG home directory where the key pair was generated.
-    :param keys_path: The directory where the key pair is exported.
-    """
-    result = _run_gpg_command(
-        [
-            "/usr/bin/gpg",
-            "--homedir",
-            gpg_tmp_dir,
-            "--fingerprint",
-            "insights-ansible-playbook-verifier test",
-        ],
-        fingerprint=True,
-    )
 
-    # Extract the fingerprint from the output
-    match = re.search(r"^\s+([A-F0-9\s]+)", result.stdout, re.MULTILINE)
-    gpg_fingerprint = match.group(1).strip() if match else ""
+def cached_key_pairs(
+    directory: pathlib.Path, count: int, algorithm: str = DEFAULT_ALGORITHM
+) -> list[KeyPair]:
+    """Get key pairs from a cache directory, generating the missing ones.
 
-    # Write the fingerprint to a file
-    with open(f"{keys_path}/key.fingerprint.txt", "w") as fingerprint_file:
-        fingerprint_file.write(gpg_fingerprint)
-        logger.debug(f"GPG fingerprint written to a file {fingerprint_file.name}")
+    A key pair is stored in a subdirectory named by the digest of its
+    generation parameters and its index, so that every run asking for the
+    same keys gets the same ones. Missing key pairs are generated together
+    and renamed into place, so runs may share the cache concurrently.
 
-    return gpg_fingerprint
+    :param directory: Cache directory, created if needed.
+    :param count: Number of key pairs.
+    :param algorithm: One of `ALGORITHMS`.
+    :raises ValueError: The algorithm is not known.
+    :raises RuntimeError: A GPG command failed.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    entries: list[pathlib.Path] = [
+        directory / _cache_address(algorithm, index) for index in range(count)
+    ]
+    missing: list[pathlib.Path] = [entry for entry in entries if not entry.is_dir()]
+    if missing:
+        logger.debug("Key pairs %s are not cached.", [entry.name for entry in missing])
+        for entry, pair in zip(missing, generate_key_pairs(len(missing), algorithm)):
+            staging = pathlib.Path(tempfile.mkdtemp(dir=directory, prefix=".staging-"))
+            pair.write(staging)
+            try:
+                staging.rename(entry)
+            except OSError:
+                # Another run has cached the key pair first
+                shutil.rmtree(staging, ignore_errors=True)
+    return [KeyPair.read(entry) for entry in entries]
 
 
 def run() -> None:
@@ -176,20 +264,18 @@ def run() -> None:
         metavar="DIR",
         help="Directory to store the key pair (default: current working directory)",
     )
+    parser.add_argument(
+        "--algorithm",
+        choices=ALGORITHMS,
+        default=DEFAULT_ALGORITHM,
+        help="Algorithm of the key pair (default: %(default)s)",
+    )
     args = parser.parse_args()
 
-    # Generate the keys
-    gpg_tmp_dir = _generate_keys()
-
-    # Export the keys to the specified directory
+    # Generate the keys and export them to the specified directory
+    (key_pair,) = generate_key_pairs(1, args.algorithm)
     os.makedirs(args.directory, exist_ok=True)
-    _export_key_pair(gpg_tmp_dir, str(args.directory))
-
-    # Get the fingerprint of the generated key pair
-    _get_fingerprint(gpg_tmp_dir, str(args.directory))
-
-    # Clean up the temporary directory
-    shutil.rmtree(gpg_tmp_dir)
+    key_pair.write(args.directory)
 
 
 def main() -> None:
@@ -0,0 +1,60 @@
+"""Large payloads in logs.
+
+Serialized plays may be megabytes large. Logs only show the beginning of
+such a payload with its size and digest, and the text is only built when
+the message is emitted. The full payloads of failed verifications are
+saved into `ARTIFACTS_DIRECTORY`, if it is set.
+"""
+
+import hashlib
+import pathlib
+import typing
+
+
+__all__ = ["Payload", "save"]
+
+
+# Directory to save the full payloads of failures to; disabled when None.
+ARTIFACTS_DIRECTORY: typing.Optional[str] = None
+
+# Number of bytes of a payload shown in logs.
+LOG_PAYLOAD_LIMIT: int = 512
+
+
+class Payload:
+    """Payload formatted for logs when the message is emitted.
+
+    :param data: The payload, or None if it was not kept.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: typing.Optional[bytes]):
+        self.data: typing.Optional[bytes] = data
+
+    def __str__(self) -> str:
+        if self.data is None:
+            return "<not kept>"
+        if len(self.data) <= LOG_PAYLOAD_LIMIT:
+            return repr(self.data)
+        return (
+            f"{self.data[:LOG_PAYLOAD_LIMIT]!r}... ({len(self.data)} bytes, "
+            f"sha256 {hashlib.sha256(self.data).hexdigest()})"
+        )
+
+    __repr__ = __str__
+
+
+def save(name: str, data: typing.Optional[bytes]) -> typing.Optional[pathlib.Path]:
+    """Save the payload into the artifacts directory, if it is set.
+
+    :param name: Name of the file.
+    :returns: Path of the saved file, or None if it was not saved.
+    """
+    if ARTIFACTS_DIRECTORY is None or data is None:
+        return None
+    directory = pathlib.Path(ARTIFACTS_DIRECTORY)
+    directory.mkdir(parents=True, exist_ok=True)
+    path: pathlib.Path = directory / name
+    path.write_bytes(data)
+    return path
@@ -0,0 +1,133 @@
+"""Command line options and helpers shared by the verifier and the signer."""
+
+import argparse
+import atexit
+import logging
+import pathlib
+import typing
+
+from insights_ansible_playbook_lib import tracing
+
+if typing.TYPE_CHECKING:
+    from insights_ansible_playbook_lib import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_version_from_package() -> str:
+    """Read the package metadata to obtain version."""
+    # Scanning the installed distributions is slow, only do it when asked to
+    import importlib.metadata
+
+    try:
+        version = importlib.metadata.version("insights-ansible-playbook-verifier")
+    except ImportError:
+        version = "unknown"
+    return version
+
+
+class VersionAction(argparse.Action):
+    """Print the package version and exit.
+
+    Unlike argparse's own 'version' action, the version is only looked up
+    when the option is used.
+    """
+
+    def __init__(
+        self,
+        option_strings: list[str],
+        dest: str = argparse.SUPPRESS,
+        default: str = argparse.SUPPRESS,
+        help: str = "show program's version number and exit",
+    ) -> None:
+        super().__init__(
+            option_strings=option_strings,
+            dest=dest,
+            default=default,
+            nargs=0,
+            help=help,
+        )
+
+    def __call__(
+        self,
+        parser: argparse.ArgumentParser,
+        namespace: argparse.Namespace,
+        values: typing.Any,
+        option_string: typing.Optional[str] = None,
+    ) -> None:
+        print(get_version_from_package())
+        parser.exit()
+
+
+def add_instrumentation_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the options recording traces and metrics of the run."""
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument(
+        "--trace",
+        type=pathlib.Path,
+        metavar="FILE",
+        help="Write the spans and counters of the run as a Chrome trace to the file",
+    )
+    group.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Record the peak memory of each span in the trace (slow)",
+    )
+    group.add_argument(
+        "--metrics-file",
+        type=pathlib.Path,
+        metavar="PATH",
+        help="Merge metrics of the run into the Prometheus text file",
+    )
+
+
+def start_trace(args: argparse.Namespace) -> typing.Optional[tracing.ChromeTrace]:
+    """Start recording the trace requested on the command line.
+
+    The trace is written when the process exits, also when it fails.
+    Processes spawned for bulk verification are not traced.
+    """
+    if args.trace is None:
+        return None
+    trace = tracing.ChromeTrace(memory=args.trace_memory)
+    trace.start()
+
+    def write() -> None:
+        trace.stop()
+        trace.write(args.trace)
+        logger.debug("Trace written to '%s'.", args.trace)
+
+    atexit.register(write)
+    return trace
+
+
+def start_metrics(
+    args: argparse.Namespace, namespace: str
+) -> typing.Optional["metrics.Metrics"]:
+    """Start collecting the metrics requested on the command line.
+
+    The metrics are written when the process exits, also when it fails.
+
+    :param namespace: Prefix of the names of the metrics.
+    """
+    if args.metrics_file is None:
+        return None
+    from insights_ansible_playbook_lib import metrics
+
+    collector = metrics.Metrics(namespace)
+    collector.start()
+
+    def write() -> None:
+        collector.stop()
+        try:
+            collector.write(args.metrics_file)
+        except OSError as exc:
+            logger.warning(
+                "Could not write metrics to '%s': %s", args.metrics_file, exc
+            )
+        else:
+            logger.debug("Metrics written to '%s'.", args.metrics_file)
+
+    atexit.register(write)
+    return collector
@@ -0,0 +1,229 @@
+"""Breakdown of the canonicalization cost of a play.
+
+The play is serialized by the same `Serializer` as when it is verified,
+sharing a single pass between its parts, so aliases serialized once are
+reused as they would be. The cost is attributed to the top-level keys of
+the play, and to the items of the top-level lists, such as tasks.
+"""
+
+import dataclasses
+import time
+import typing
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib.limits import DEFAULT_LIMITS, Limits
+from insights_ansible_playbook_lib.serialization import Serializer, _Pass
+
+
+__all__ = ["Cost", "PlayCost", "explain_cost", "format_cost"]
+
+
+@dataclasses.dataclass(frozen=True)
+class Cost:
+    """Cost of a part of the play.
+
+    :param path: Path of the part, e.g. '/tasks/3'.
+    :param name: Name of the part, if it has one, e.g. the name of a task.
+    :param bytes: Size of the serialized part in UTF-8.
+    :param nodes: Number of serialized nodes, including alias expansions.
+    :param escapes: Number of characters escaped in its strings.
+    :param aliases: Number of alias expansions.
+    :param seconds: Time spent serializing the part.
+    :param children: Costs of the items of a list, most expensive first.
+    """
+
+    path: str
+    name: typing.Optional[str]
+    bytes: int
+    nodes: int
+    escapes: int
+    aliases: int
+    seconds: float
+    children: tuple["Cost", ...] = ()
+
+
+@dataclasses.dataclass(frozen=True)
+class PlayCost:
+    """Cost of a play.
+
+    :param total: Cost of the whole play; its children are the top-level
+        keys, most expensive first.
+    :param excluded: Paths of the fields excluded from the serialization.
+    """
+
+    name: str
+    total: Cost
+    excluded: tuple[str, ...]
+
+
+class _CostPass(_Pass):
+    escapes: int = 0
+
+
+def count_escapes(value: str) -> int:
+    """Count the characters `Serializer` escapes in the string."""
+    result: int = sum(value.count(char) for char, _ in Serializer._ESCAPES)
+    if "'" in value and '"' in value:
+        result += value.count("'")
+    return result
+
+
+class _CostSerializer(Serializer):
+    @classmethod
+    def _obj(cls, value: typing.Any, state: typing.Optional[_Pass] = None) -> str:
+        if isinstance(value, str) and isinstance(state, _CostPass):
+            state.escapes += count_escapes(value)
+        return super()._obj(value, state)
+
+
+def _measure(
+    path: str,
+    value: typing.Any,
+    state: _CostPass,
+    children: tuple[Cost, ...] = (),
+) -> tuple[Cost, str]:
+    nodes, escapes, aliases = state.nodes, state.escapes, state.aliases
+    start: float = time.perf_counter()
+    serialized: str = _CostSerializer._obj(value, state)
+    seconds: float = time.perf_counter() - start
+    name: typing.Any = value.get("name") if isinstance(value, dict) else None
+    cost = Cost(
+        path=path,
+        name=name if isinstance(name, str) else None,
+        bytes=len(serialized.encode("utf-8")),
+        nodes=state.nodes - nodes,
+        escapes=state.escapes - escapes,
+        aliases=state.aliases - aliases,
+        seconds=seconds,
+        children=children,
+    )
+    return cost, serialized
+
+
+def _ranked(costs: typing.Iterable[Cost]) -> tuple[Cost, ...]:
+    return tuple(sorted(costs, key=lambda cost: (-cost.bytes, -cost.nodes)))
+
+
+def _list_cost(path: str, items: list, state: _CostPass) -> Cost:
+    """Measure the items of a list separately, as `Serializer._list` joins them."""
+    state.count(1)
+    state.depth += 1
+    try:
+        if state.limits is not None:
+            state.limits.check_depth(state.depth)
+        children: list[Cost] = [
+            _measure(f"{path}/{index}", item, state)[0]
+            for index, item in enumerate(items)
+        ]
+    finally:
+        state.depth -= 1
+    return Cost(
+        path=path,
+        name=None,
+        # Brackets and separators of the items
+        bytes=sum(child.bytes for child in children) + 2 * max(len(children), 1),
+        nodes=sum(child.nodes for child in children) + 1,
+        escapes=sum(child.escapes for child in children),
+        aliases=sum(child.aliases for child in children),
+        seconds=sum(child.seconds for child in children),
+        children=_ranked(children),
+    )
+
+
+def _dict_bytes(entries: list[Cost]) -> int:
+    """Size of a serialized dictionary with the entries, as `Serializer._dict` joins them."""
+    if not entries:
+        return len("ordereddict()")
+    # "('key', value)" joined by ", " within "ordereddict([" and "])"
+    keys: int = sum(len(entry.path[1:].encode("utf-8")) + 6 for entry in entries)
+    return (
+        sum(entry.bytes for entry in entries)
+        + keys
+        + 2 * (len(entries) - 1)
+        + len("ordereddict([])")
+    )
+
+
+def explain_cost(play: dict, limits: Limits = DEFAULT_LIMITS) -> PlayCost:
+    """Break down the cost of serializing the play into its canonical form.
+
+    The fields excluded by the play are skipped, as when it is verified;
+    a play without `insights_signature_exclude` is measured whole.
+
+    :param play: Parsed play.
+    :param limits: Limits of the serialization.
+    :raises PreconditionError: The play is not a mapping or its exclusion is invalid.
+    :raises LimitExceededError: The play exceeds the limits.
+    """
+    if not isinstance(play, dict):
+        raise lib.PreconditionError("Play is not a mapping.")
+    exclude: list[tuple[str, ...]] = []
+    if (
+        isinstance(play.get("vars"), dict)
+        and "insights_signature_exclude" in play["vars"]
+    ):
+        exclude = lib.get_excluded_fields(play)
+    excluded_keys: set[str] = {path[0] for path in exclude if len(path) == 1}
+
+    state = _CostPass(play, exclude, limits)
+    state.count(1)
+    state.depth = 1
+    start: float = time.perf_counter()
+    entries: list[Cost] = []
+    for key, value in play.items():
+        if key in excluded_keys:
+            continue
+        path: str = f"/{key}"
+        if isinstance(value, list) and id(value) not in state.shared:
+            entries.append(_list_cost(path, value, state))
+        else:
+            entries.append(_measure(path, value, state)[0])
+    seconds: float = time.perf_counter() - start
+
+    total = Cost(
+        path="/",
+        name=play.get("name") if isinstance(play.get("name"), str) else None,
+        bytes=_dict_bytes(entries),
+        nodes=state.nodes,
+        escapes=state.escapes,
+        aliases=state.aliases,
+        seconds=seconds,
+        children=_ranked(entries),
+    )
+    return PlayCost(
+        name=play.get("name", "???"),
+        total=total,
+        excluded=tuple("/" + "/".join(path) for path in exclude),
+    )
+
+
+def _describe(cost: Cost) -> str:
+    return f"{cost.path} ({cost.name})" if cost.name else cost.path
+
+
+def format_cost(cost: PlayCost, top: int = 10) -> str:
+    """Describe the cost as a table, most expensive parts first.
+
+    :param top: Number of items of a list to show.
+    """
+    header: str = f"{'Part':<40} {'Bytes':>10} {'Nodes':>8} {'Escapes':>8} {'Aliases':>8} {'Time':>10}"
+
+    def row(item: Cost, indent: int) -> str:
+        label: str = " " * indent + _describe(item)
+        if len(label) > 40:
+            label = label[:39] + "…"
+        return (
+            f"{label:<40} {item.bytes:>10} {item.nodes:>8} {item.escapes:>8} "
+            f"{item.aliases:>8} {item.seconds * 1000:>7.2f} ms"
+        )
+
+    lines: list[str] = [f"Play '{cost.name}'", header, row(cost.total, 0)]
+    for entry in cost.total.children:
+        lines.append(row(entry, 2))
+        for child in entry.children[:top]:
+            lines.append(row(child, 4))
+        if len(entry.children) > top:
+            lines.append(" " * 4 + f"... {len(entry.children) - top} more")
+    if cost.excluded:
+        lines.append(f"Excluded: {', '.join(cost.excluded)}")
+    return "\n".join(lines)
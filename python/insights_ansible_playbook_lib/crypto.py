@@ -1,5 +1,6 @@
 import dataclasses
 import errno
+import functools
 import logging
 import os
 import os.path
@@ -9,19 +10,45 @@ import tempfile
 import subprocess
 import typing
 
+from insights_ansible_playbook_lib import tracing
+
 logger = logging.getLogger(__name__)
 
 
 # We try to use the special /var/lib/ directory in which gnupg has SELinux
 # permissions to write to.
-if os.geteuid() == 0 and os.path.isdir("/var/lib/insights-ansible-playbook-verifier/"):
-    TEMPORARY_GPG_HOME_PARENT_DIRECTORY = "/var/lib/insights-ansible-playbook-verifier/"
-    TEMPORARY_GPG_HOME_PARENT_DIRECTORY_PREFIX = "gpg-"
-else:
-    TEMPORARY_GPG_HOME_PARENT_DIRECTORY = "/tmp/"
-    TEMPORARY_GPG_HOME_PARENT_DIRECTORY_PREFIX = (
-        "insights-ansible-playbook-verifier-gpg-"
-    )
+STASH_DIRECTORY = "/var/lib/insights-ansible-playbook-verifier/"
+
+# GnuPG binaries; benchmarks point them to a stand-in to measure the
+# overhead of the library alone.
+GPG_BINARY: str = "/usr/bin/gpg"
+GPGCONF_BINARY: str = "/usr/bin/gpgconf"
+
+
+@functools.lru_cache(maxsize=None)
+def use_stash_directory() -> bool:
+    """Check if the special /var/lib/ directory can be used.
+
+    The check runs on first use instead of on import, so that starting the
+    applications does not touch the filesystem.
+    """
+    return os.geteuid() == 0 and os.path.isdir(STASH_DIRECTORY)
+
+
+def __getattr__(name: str) -> str:
+    if name == "TEMPORARY_GPG_HOME_PARENT_DIRECTORY":
+        return STASH_DIRECTORY if use_stash_directory() else "/tmp/"
+    if name == "TEMPORARY_GPG_HOME_PARENT_DIRECTORY_PREFIX":
+        if use_stash_directory():
+            return "gpg-"
+        return "insights-ansible-playbook-verifier-gpg-"
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _setting(name: str) -> str:
+    """Get a lazily detected module attribute, unless it has been overridden."""
+    value: str = globals()[name] if name in globals() else __getattr__(name)
+    return value
 
 
 @dataclasses.dataclass(frozen=True)
@@ -73,37 +100,43 @@ class GPGCommand:
 
     def _setup(self) -> GPGCommandResult:
         """Prepare GPG environment."""
-        self._home = tempfile.mkdtemp(
-            dir=TEMPORARY_GPG_HOME_PARENT_DIRECTORY,
-            prefix=TEMPORARY_GPG_HOME_PARENT_DIRECTORY_PREFIX,
-        )
+        with tracing.span("gpg_setup"):
+            self._home = tempfile.mkdtemp(
+                dir=_setting("TEMPORARY_GPG_HOME_PARENT_DIRECTORY"),
+                prefix=_setting("TEMPORARY_GPG_HOME_PARENT_DIRECTORY_PREFIX"),
+            )
 
-        logger.debug(f"Will use temporary environment in '{self._home}'.")
-        result: GPGCommandResult = self._run(["--import", f"{self.key.absolute()!s}"])
-        if not result.ok:
-            logger.error(f"Failed to import key '{self.key!s}': {result}")
-        return result
+            tracing.count("temp_directories")
+            logger.debug("Will use temporary environment in '%s'.", self._home)
+            result: GPGCommandResult = self._run(
+                ["--import", f"{self.key.absolute()!s}"]
+            )
+            if not result.ok:
+                logger.error("Failed to import key '%s': %s", self.key, result)
+            return result
 
     def _supports_cleanup_socket(self) -> bool:
         """Queries for the version of GPG binary.
 
         :returns: `True` if the gnupg is known for supporting `--kill all`.
         """
-        version_process = subprocess.Popen(
-            ["/usr/bin/gpg", "--version"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            env={"GNUPGHOME": self._home, "LC_ALL": "C.UTF-8"},  # type: ignore
-        )
-        stdout, stderr = version_process.communicate()
+        tracing.count("subprocesses")
+        with tracing.span("gpg --version"):
+            version_process = subprocess.Popen(
+                [GPG_BINARY, "--version"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                env={"GNUPGHOME": self._home, "LC_ALL": "C.UTF-8"},  # type: ignore
+            )
+            stdout, stderr = version_process.communicate()
         if version_process.returncode != 0:
             stderr = "\n".join(
                 "stderr: {line}".format(line=line)
                 for line in stderr.split("\n")
                 if len(line)
             )
-            logger.warning(f"Could not query for GPG version:\n{stderr}")
+            logger.warning("Could not query for GPG version:\n%s", stderr)
             return False
 
         for line in stdout.split("\n"):
@@ -117,15 +150,13 @@ class GPGCommand:
                 if len(line)
             )
             logger.debug(
-                f"Could not query for GPG version: output not recognized:\n{stdout}."
+                "Could not query for GPG version: output not recognized:\n%s.", stdout
             )
             return False
 
         version_info = tuple(int(v) for v in version.split("."))
         if len(version_info) < 3:
-            logger.debug(
-                "GPG version is not recognized: '{version}'.".format(version=version)
-            )
+            logger.debug("GPG version is not recognized: '%s'.", version)
             return False
 
         # `gpgconf --kill` was added in GnuPG 2.1.0-beta2 and `--kill all` exists since 2.1.18.
@@ -144,14 +175,16 @@ class GPGCommand:
         """Stop GPG socket in its home directory."""
         # GPG writes a temporary socket file for the gpg-agent into the home
         # directory. This is only supported since gnupg 2.1.18 (RHEL 8).
-        shutdown_process = subprocess.Popen(
-            ["/usr/bin/gpgconf", "--kill", "all"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            env={"GNUPGHOME": self._home, "LC_ALL": "C.UTF-8"},  # type: ignore
-        )
-        _, stderr = shutdown_process.communicate()
+        tracing.count("subprocesses")
+        with tracing.span("gpgconf --kill"):
+            shutdown_process = subprocess.Popen(
+                [GPGCONF_BINARY, "--kill", "all"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                universal_newlines=True,
+                env={"GNUPGHOME": self._home, "LC_ALL": "C.UTF-8"},  # type: ignore
+            )
+            _, stderr = shutdown_process.communicate()
         if shutdown_process.returncode == 0:
             logger.debug("Killed GPG agent.")
         else:
@@ -161,45 +194,51 @@ class GPGCommand:
                 if len(line)
             )
             logger.warning(
-                "Could not kill the GPG agent, "
-                f"got return code {shutdown_process.returncode}: \n{stderr}."
+                "Could not kill the GPG agent, got return code %s: \n%s.",
+                shutdown_process.returncode,
+                stderr,
             )
 
     def _cleanup(self) -> None:
         """Clean up GPG environment."""
-        if self._supports_cleanup_socket():
-            self._cleanup_socket()
-
-        # Older systems do not support `gpgconf --kill`.
-        # The socket may remove its socket file after `rmtree()` has determined
-        # it should be deleted, but before the actual deletion occurs.
-        # This would cause a FileNotFoundError/OSError.
-        for _ in range(5):
-            try:
-                shutil.rmtree(self._home)  # type: ignore
-                logger.debug("Deleted temporary directory.")
-                break
-            except OSError as exc:
-                if exc.errno == errno.ENOENT:
-                    # The file has already been removed by the `gpg-agent`.
-                    continue
-                raise
-        else:
-            logger.debug(f"Could not clean up temporary GPG directory '{self._home}'.")
+        with tracing.span("gpg_cleanup"):
+            if self._supports_cleanup_socket():
+                self._cleanup_socket()
+
+            # Older systems do not support `gpgconf --kill`.
+            # The socket may remove its socket file after `rmtree()` has determined
+            # it should be deleted, but before the actual deletion occurs.
+            # This would cause a FileNotFoundError/OSError.
+            for _ in range(5):
+                try:
+                    shutil.rmtree(self._home)  # type: ignore
+                    logger.debug("Deleted temporary directory.")
+                    break
+                except OSError as exc:
+                    if exc.errno == errno.ENOENT:
+                        # The file has already been removed by the `gpg-agent`.
+                        continue
+                    raise
+            else:
+                logger.debug(
+                    "Could not clean up temporary GPG directory '%s'.", self._home
+                )
 
     def _run(self, command: list[str]) -> "GPGCommandResult":
         """Run the actual command.
 
         :returns: The result of the shell command.
         """
-        self._raw_command = ["/usr/bin/gpg", "--homedir", self._home] + command  # type: ignore
-        process = subprocess.Popen(
-            self._raw_command,  # type: ignore
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            env={"LC_ALL": "C.UTF-8"},
-        )
-        stdout, stderr = process.communicate()
+        self._raw_command = [GPG_BINARY, "--homedir", self._home] + command  # type: ignore
+        tracing.count("subprocesses")
+        with tracing.span(f"gpg {command[0] if command else ''}"):
+            process = subprocess.Popen(
+                self._raw_command,  # type: ignore
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                env={"LC_ALL": "C.UTF-8"},
+            )
+            stdout, stderr = process.communicate()
 
         result = GPGCommandResult(
             ok=process.returncode == 0,
@@ -210,9 +249,9 @@ class GPGCommand:
         )
 
         if result.ok:
-            logger.debug(f"GPG command {command}: ok.")
+            logger.debug("GPG command %s: ok.", command)
         else:
-            logger.debug(f"GPG command {command} returned non-zero code: {result}.")
+            logger.debug("GPG command %s returned non-zero code: %s.", command, result)
 
         return result
 
@@ -232,6 +271,48 @@ class GPGCommand:
             self._cleanup()
 
 
+class GPGKeyring(GPGCommand):
+    """Temporary GPG environment kept alive for repeated verifications.
+
+    The key is imported once by `open()`; every `verify()` then only spawns
+    a single GPG process. Verifications may run concurrently.
+
+    When a private key is imported, the environment can sign files with
+    `sign()` in the same manner.
+
+    :param key: Path to the GPG public key to check against, or to the
+        private key to sign with.
+    """
+
+    def __init__(self, key: pathlib.Path):
+        super().__init__(command=[], key=key)
+
+    def open(self) -> GPGCommandResult:
+        """Create the environment and import the key."""
+        return self._setup()
+
+    def verify(self, file: pathlib.Path, signature: pathlib.Path) -> GPGCommandResult:
+        """Verify a file against its detached signature.
+
+        :param file: A path to the signed file.
+        :param signature: A path to the detached signature.
+        """
+        return self._run(["--verify", str(signature), str(file)])
+
+    def sign(self, file: pathlib.Path) -> GPGCommandResult:
+        """Create an armored detached signature of a file, next to the file.
+
+        :param file: A path to the file to sign.
+        """
+        return self._run(["--detach-sign", "--armor", str(file)])
+
+    def close(self) -> None:
+        """Stop the GPG agent and remove the environment."""
+        if self._home is not None:
+            self._cleanup()
+            self._home = None
+
+
 def verify_gpg_signed_file(
     file: pathlib.Path, signature: pathlib.Path, key: pathlib.Path
 ) -> GPGCommandResult:
@@ -245,12 +326,14 @@ def verify_gpg_signed_file(
     :returns: Evaluated GPG command.
     """
     if not file.is_file():
-        logger.debug(f"Cannot verify signature of '{file}', file does not exist")
+        logger.debug("Cannot verify signature of '%s', file does not exist", file)
         raise FileNotFoundError(f"File '{file}' not found")
 
     if not signature.is_file():
         logger.debug(
-            f"Cannot verify signature of '{file!s}', signature '{signature!s}' does not exist."
+            "Cannot verify signature of '%s', signature '%s' does not exist.",
+            file,
+            signature,
         )
         raise FileNotFoundError(
             f"Signature '{signature!s}' of file '{file!s}' not found."
@@ -258,13 +341,13 @@ def verify_gpg_signed_file(
 
     gpg = GPGCommand(command=["--verify", str(signature), str(file)], key=key)
 
-    logger.debug(f"Starting GPG verification process for '{file}'.")
+    logger.debug("Starting GPG verification process for '%s'.", file)
     result: GPGCommandResult = gpg.evaluate()
 
     if result.ok:
-        logger.debug(f"Signature verification of '{file}' passed.")
+        logger.debug("Signature verification of '%s' passed.", file)
     else:
-        logger.error(f"Signature verification of '{file}' failed.")
+        logger.error("Signature verification of '%s' failed.", file)
 
     return result
 
@@ -279,21 +362,21 @@ def sign_file(file: pathlib.Path, key: pathlib.Path) -> GPGCommandResult:
     :return: Evaluated GPG command.
     """
     if not file.is_file():
-        logger.debug(f"Cannot sign file '{file}', file does not exist.")
+        logger.debug("Cannot sign file '%s', file does not exist.", file)
         raise FileNotFoundError(f"File '{file}' not found")
 
     if not key.is_file():
-        logger.debug(f"Cannot sign file '{file}', key does not exist.")
+        logger.debug("Cannot sign file '%s', key does not exist.", file)
         raise FileNotFoundError(f"Key '{key}' not found")
 
     gpg = GPGCommand(command=["--detach-sign", "--armor", str(file)], key=key)
 
-    logger.debug(f"Starting GPG signing process for '{file}'.")
+    logger.debug("Starting GPG signing process for '%s'.", file)
     result: GPGCommandResult = gpg.evaluate()
 
     if result.ok:
-        logger.debug(f"File '{file}' was signed.")
+        logger.debug("File '%s' was signed.", file)
     else:
-        logger.error(f"File '{file}' could not be signed.")
+        logger.error("File '%s' could not be signed.", file)
 
     return result
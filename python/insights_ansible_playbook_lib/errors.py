@@ -0,0 +1,13 @@
+import dataclasses
+
+
+class PreconditionError(RuntimeError):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class GPGValidationError(RuntimeError):
+    message: str
+    serialized_play: bytes
+    digest: bytes
+    signature: bytes
@@ -0,0 +1,84 @@
+import dataclasses
+import typing
+
+from insights_ansible_playbook_lib.errors import PreconditionError
+
+
+__all__ = ["Limits", "DEFAULT_LIMITS", "LimitExceededError"]
+
+
+class LimitExceededError(PreconditionError):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class Limits:
+    """Bounds of the work spent on a single playbook.
+
+    Playbooks are untrusted until they are verified, so parsing and
+    serialization must not be able to exhaust CPU time or memory before
+    the signature is checked.
+
+    :param max_input_bytes: Size of the raw playbook.
+    :param max_alias_expansions: Number of alias references, both when parsing
+        and when serializing a play.
+    :param max_depth: Nesting of collections.
+    :param max_nodes: Number of nodes, counting every expansion of an alias.
+    :param max_scalar_length: Length of a single scalar value.
+    :param max_serialized_length: Length of the scalars of a serialized play,
+        counting every expansion of an alias.
+    """
+
+    max_input_bytes: int = 32 * 1024 * 1024
+    max_alias_expansions: int = 1000
+    max_depth: int = 64
+    max_nodes: int = 1_000_000
+    max_scalar_length: int = 8 * 1024 * 1024
+    max_serialized_length: int = 64 * 1024 * 1024
+
+    def check_input(self, playbook: typing.Union[str, bytes]) -> None:
+        """Ensure the raw playbook is not too large.
+
+        :raises LimitExceededError: The playbook is too large.
+        """
+        size: int = len(playbook)
+        if isinstance(playbook, str) and size * 4 > self.max_input_bytes:
+            # Only encode the playbook when its size may exceed the limit
+            size = len(playbook.encode("utf-8"))
+        if size > self.max_input_bytes:
+            raise LimitExceededError(
+                f"Playbook is larger than {self.max_input_bytes} bytes."
+            )
+
+    def check_scalar(self, length: int, where: str = "") -> None:
+        if length > self.max_scalar_length:
+            raise LimitExceededError(
+                f"Scalar{where} is longer than {self.max_scalar_length} characters."
+            )
+
+    def check_serialized(self, length: int) -> None:
+        if length > self.max_serialized_length:
+            raise LimitExceededError(
+                f"Serialized play is longer than {self.max_serialized_length} characters."
+            )
+
+    def check_depth(self, depth: int, where: str = "") -> None:
+        if depth > self.max_depth:
+            raise LimitExceededError(
+                f"Playbook{where} is nested deeper than {self.max_depth} levels."
+            )
+
+    def check_nodes(self, nodes: int, where: str = "") -> None:
+        if nodes > self.max_nodes:
+            raise LimitExceededError(
+                f"Playbook{where} contains more than {self.max_nodes} nodes."
+            )
+
+    def check_aliases(self, aliases: int, where: str = "") -> None:
+        if aliases > self.max_alias_expansions:
+            raise LimitExceededError(
+                f"Playbook{where} expands more than {self.max_alias_expansions} aliases."
+            )
+
+
+DEFAULT_LIMITS: Limits = Limits()
@@ -0,0 +1,172 @@
+"""Token-level checks of the playbook specification.
+
+The checks walk the token stream of the YAML scanner, without constructing
+any objects, so that playbooks violating the specification are rejected
+before they are parsed, serialized and verified by GPG.
+
+The module can also be run as a linter:
+
+    python3 -m insights_ansible_playbook_lib.lint playbook.yml [...]
+"""
+
+import argparse
+import dataclasses
+import logging
+import pathlib
+import sys
+import typing
+
+import yaml
+import yaml.reader
+import yaml.scanner
+
+from insights_ansible_playbook_lib.errors import PreconditionError
+
+
+__all__ = ["Violation", "iter_violations", "check_playbook"]
+
+
+logger = logging.getLogger(__name__)
+
+
+# The only tag allowed by the specification, on the embedded signature
+SIGNATURE_KEY: str = "insights_signature"
+SIGNATURE_TAG: tuple[str, str] = ("!!", "binary")
+
+
+@dataclasses.dataclass(frozen=True)
+class Violation:
+    """A part of the playbook that does not conform to the specification.
+
+    :param line: Line of the violation, starting at 1.
+    :param column: Column of the violation, starting at 1.
+    :param message: Description of the violation.
+    """
+
+    line: int
+    column: int
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.message} (line {self.line}, column {self.column})"
+
+
+class _Scanner(yaml.reader.Reader, yaml.scanner.Scanner):
+    def __init__(self, stream: str) -> None:
+        yaml.reader.Reader.__init__(self, stream)
+        yaml.scanner.Scanner.__init__(self)
+
+
+def _violation(token: yaml.Token, message: str) -> Violation:
+    mark = token.start_mark
+    return Violation(line=mark.line + 1, column=mark.column + 1, message=message)
+
+
+def _is_signature(previous: list[yaml.Token]) -> bool:
+    """Check if the tokens precede the value of the signature variable."""
+    if len(previous) < 3:
+        return False
+    key, scalar, value = previous[-3:]
+    return (
+        isinstance(key, yaml.KeyToken)
+        and isinstance(scalar, yaml.ScalarToken)
+        and scalar.value == SIGNATURE_KEY
+        and isinstance(value, yaml.ValueToken)
+    )
+
+
+def iter_violations(playbook: str) -> typing.Iterator[Violation]:
+    """Find the parts of the playbook that violate the specification.
+
+    The following constructs are reported:
+
+    - tags, except for the `!!binary` tag of the signature,
+    - `%TAG` directives,
+    - aliases without an anchor, e.g. unquoted `*.html`,
+    - invalid YAML, after which the scan stops.
+
+    Constructs the checks cannot see without parsing, such as the structure
+    of the plays, are left to the parser.
+    """
+    scanner: typing.Any = _Scanner(playbook)
+    anchors: set[str] = set()
+    previous: list[yaml.Token] = []
+    try:
+        while True:
+            token: yaml.Token = scanner.get_token()
+            if isinstance(token, yaml.StreamEndToken):
+                return
+
+            if isinstance(token, yaml.TagToken):
+                if token.value != SIGNATURE_TAG or not _is_signature(previous):
+                    handle, suffix = token.value
+                    yield _violation(
+                        token, f"Tags are not allowed: '{handle or ''}{suffix}'."
+                    )
+            elif isinstance(token, yaml.DirectiveToken):
+                if token.name == "TAG":
+                    yield _violation(token, "Tag directives are not allowed.")
+            elif isinstance(token, (yaml.DocumentStartToken, yaml.DocumentEndToken)):
+                anchors.clear()
+            elif isinstance(token, yaml.AnchorToken):
+                anchors.add(token.value)
+            elif isinstance(token, yaml.AliasToken):
+                if token.value not in anchors:
+                    yield _violation(
+                        token,
+                        f"Value '*{token.value}' is an undefined alias, "
+                        f"it has to be quoted.",
+                    )
+
+            previous = previous[-2:] + [token]
+    except yaml.MarkedYAMLError as exc:
+        if exc.context == "while scanning an alias" and exc.context_mark:
+            # PyYAML only accepts alphanumeric alias names, e.g. '*.html'
+            # is a syntax error rather than an undefined alias
+            yield Violation(
+                line=exc.context_mark.line + 1,
+                column=exc.context_mark.column + 1,
+                message="Values starting with '*' are aliases, they have to be quoted.",
+            )
+            return
+        mark = exc.problem_mark or exc.context_mark
+        line, column = (mark.line + 1, mark.column + 1) if mark else (0, 0)
+        yield Violation(
+            line=line, column=column, message=f"Invalid YAML: {exc.problem}."
+        )
+
+
+def check_playbook(playbook: str) -> None:
+    """Ensure the playbook does not violate the specification.
+
+    :raises PreconditionError: The playbook violates the specification.
+    """
+    logger.info("Checking playbook against the specification.")
+    for violation in iter_violations(playbook):
+        raise PreconditionError(f"Playbook violates the specification: {violation}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python3 -m insights_ansible_playbook_lib.lint",
+        description="Check playbooks against the playbook specification.",
+    )
+    parser.add_argument(
+        "playbooks",
+        nargs="+",
+        type=pathlib.Path,
+        metavar="PLAYBOOK",
+        help="Path to the playbook",
+    )
+    args = parser.parse_args()
+
+    failed: bool = False
+    for path in args.playbooks:
+        for violation in iter_violations(path.read_text()):
+            failed = True
+            print(f"{path}:{violation.line}:{violation.column}: {violation.message}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Metrics of the runs in the Prometheus text format.
+
+The file is meant for the textfile collector of node_exporter. Every run
+merges its metrics into the file: counters and histograms are added to the
+values written by earlier runs, gauges are replaced. Processes writing the
+same file at once are serialized by a lock on a file next to it, and the
+file is replaced atomically, so the collector never reads a partial file.
+
+The durations of the spans reported through `tracing` are observed in the
+`stage_duration_seconds` histogram, labeled by the name of the span, and the
+tracing counters are exported as `<name>_total`. Spans and counters of the
+processes spawned for bulk verification are not collected.
+"""
+
+import contextlib
+import dataclasses
+import fcntl
+import logging
+import os
+import pathlib
+import re
+import tempfile
+import threading
+import typing
+
+from insights_ansible_playbook_lib import tracing
+
+
+logger = logging.getLogger(__name__)
+
+
+# Bucket bounds of the histograms.
+DURATION_BUCKETS: tuple[float, ...] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+PLAYS_BUCKETS: tuple[float, ...] = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# Tracing counters reporting a current value instead of an increment,
+# with the names of their gauges.
+GAUGES: dict[str, str] = {"revoked_digests": "revocation_list_digests"}
+
+# Spans whose last duration is also exported as a gauge.
+TIMED_SPANS: dict[str, str] = {
+    "load_revocation_list": "revocation_list_load_seconds",
+}
+
+DESCRIPTIONS: dict[str, str] = {
+    "verifications_total": "Verified playbooks by outcome.",
+    "signatures_total": "Signed playbooks by outcome.",
+    "plays_per_playbook": "Number of plays in a playbook.",
+    "stage_duration_seconds": "Duration of the stages of a run.",
+    "subprocesses_total": "Spawned subprocesses, e.g. GPG.",
+    "temp_files_total": "Created temporary files.",
+    "temp_directories_total": "Created temporary directories.",
+    "bytes_serialized_total": "Bytes of plays in their canonical form.",
+    "signature_cache_hits_total": "Signatures found in the cache of verified ones.",
+    "signature_cache_misses_total": "Signatures verified by GPG.",
+    "revocation_list_digests": "Digests in the last loaded revocation list.",
+    "revocation_list_load_seconds": "Time to load the last revocation list.",
+}
+
+_SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)")
+_LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+Labels = tuple[tuple[str, str], ...]
+
+
+@dataclasses.dataclass
+class Family:
+    """Metric with all its samples.
+
+    :param kind: Either 'counter', 'gauge', 'histogram' or 'untyped'.
+    :param samples: Values keyed by the name of the sample (e.g. `x_bucket`
+        of a histogram `x`) and its labels.
+    """
+
+    name: str
+    kind: str
+    description: str = ""
+    samples: dict[tuple[str, Labels], float] = dataclasses.field(default_factory=dict)
+
+    def merge(self, other: "Family") -> None:
+        """Merge samples of a later run into the family."""
+        for key, value in other.samples.items():
+            if self.kind in ("counter", "histogram"):
+                self.samples[key] = self.samples.get(key, 0.0) + value
+            else:
+                self.samples[key] = value
+        self.description = other.description or self.description
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _unescape(value: str) -> str:
+    return re.sub(r"\\(.)", lambda match: "\n" if match[1] == "n" else match[1], value)
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if value == float("inf"):
+        return "+Inf"
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _sample_order(key: tuple[str, Labels]) -> tuple[Labels, int, float]:
+    """Group the samples of a histogram by their labels, buckets first."""
+    name, labels = key
+    suffix: int = 1 if name.endswith("_sum") else 2 if name.endswith("_count") else 0
+    bound: float = 0.0
+    base: list[tuple[str, str]] = []
+    for label, value in labels:
+        if label == "le":
+            bound = float(value)
+        else:
+            base.append((label, value))
+    return tuple(base), suffix, bound
+
+
+def format_metrics(families: typing.Iterable[Family]) -> str:
+    lines: list[str] = []
+    for family in sorted(families, key=lambda family: family.name):
+        if family.description:
+            lines.append(f"# HELP {family.name} {family.description}")
+        lines.append(f"# TYPE {family.name} {family.kind}")
+        for name, labels in sorted(family.samples, key=_sample_order):
+            value: float = family.samples[(name, labels)]
+            text: str = ",".join(f'{key}="{_escape(item)}"' for key, item in labels)
+            labels_text: str = f"{{{text}}}" if text else ""
+            lines.append(f"{name}{labels_text} {_format_value(value)}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def parse_metrics(text: str) -> dict[str, Family]:
+    """Parse the metrics, as written by `format_metrics()`.
+
+    Timestamps are dropped, samples of unknown metrics are kept as untyped.
+    """
+    families: dict[str, Family] = {}
+    current: typing.Optional[Family] = None
+    for line in text.splitlines():
+        if line.startswith("#"):
+            parts: list[str] = line.split(None, 3)
+            if len(parts) < 3 or parts[1] not in ("HELP", "TYPE"):
+                continue
+            family: Family = families.setdefault(
+                parts[2], Family(name=parts[2], kind="untyped")
+            )
+            if parts[1] == "TYPE" and len(parts) == 4:
+                family.kind = parts[3].strip()
+            elif parts[1] == "HELP" and len(parts) == 4:
+                family.description = parts[3]
+            current = family
+            continue
+
+        match: typing.Optional[re.Match] = _SAMPLE.match(line)
+        if match is None:
+            continue
+        name, labels_text, value_text = match.groups()
+        try:
+            value: float = float(value_text)
+        except ValueError:
+            logger.debug("Ignoring metric sample '%s'.", line)
+            continue
+        labels: Labels = tuple(
+            (key, _unescape(item)) for key, item in _LABEL.findall(labels_text or "")
+        )
+        if current is None or not name.startswith(current.name):
+            current = families.setdefault(name, Family(name=name, kind="untyped"))
+        current.samples[(name, labels)] = value
+    return families
+
+
+class Metrics:
+    """Tracing handler collecting the metrics of a run.
+
+    :param namespace: Prefix of the names of the metrics.
+    """
+
+    def __init__(self, namespace: str):
+        self.namespace: str = namespace
+        self.playbooks: int = 0
+        self._families: dict[str, Family] = {}
+        self._lock = threading.Lock()
+
+    def _family(self, name: str, kind: str) -> Family:
+        family: typing.Optional[Family] = self._families.get(name)
+        if family is None:
+            family = Family(
+                name=f"{self.namespace}_{name}",
+                kind=kind,
+                description=DESCRIPTIONS.get(name, ""),
+            )
+            self._families[name] = family
+        return family
+
+    def increment(self, name: str, value: float = 1, **labels: str) -> None:
+        with self._lock:
+            family: Family = self._family(name, "counter")
+            key: tuple[str, Labels] = (family.name, tuple(sorted(labels.items())))
+            family.samples[key] = family.samples.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            family: Family = self._family(name, "gauge")
+            family.samples[(family.name, tuple(sorted(labels.items())))] = value
+
+    def observe(
+        self,
+        name: str,
+        value: float,
+        buckets: typing.Sequence[float],
+        **labels: str,
+    ) -> None:
+        with self._lock:
+            family: Family = self._family(name, "histogram")
+            base: Labels = tuple(sorted(labels.items()))
+            for bound in (*buckets, float("inf")):
+                key: tuple[str, Labels] = (
+                    f"{family.name}_bucket",
+                    (*base, ("le", _format_value(bound))),
+                )
+                family.samples[key] = family.samples.get(key, 0.0) + (value <= bound)
+            for suffix, increment in (("_sum", value), ("_count", 1)):
+                key = (f"{family.name}{suffix}", base)
+                family.samples[key] = family.samples.get(key, 0.0) + increment
+
+    def observe_playbook(
+        self,
+        outcome: str,
+        plays: typing.Optional[int] = None,
+        name: str = "verifications_total",
+    ) -> None:
+        """Record the outcome of a playbook.
+
+        :param outcome: 'ok', 'rejected' or 'error'.
+        :param plays: Number of plays in the playbook, if it was parsed.
+        :param name: Counter of the outcomes.
+        """
+        self.increment(name, outcome=outcome)
+        if plays is not None:
+            self.observe("plays_per_playbook", plays, PLAYS_BUCKETS)
+        with self._lock:
+            self.playbooks += 1
+
+    def __call__(self, event: tracing.Event) -> None:
+        if isinstance(event, tracing.SpanEvent):
+            seconds: float = event.duration / 1e9
+            self.observe(
+                "stage_duration_seconds", seconds, DURATION_BUCKETS, stage=event.name
+            )
+            if event.name in TIMED_SPANS:
+                self.set(TIMED_SPANS[event.name], seconds)
+        elif event.name in GAUGES:
+            self.set(GAUGES[event.name], event.value)
+        else:
+            self.increment(f"{event.name}_total", event.value)
+
+    def start(self) -> None:
+        tracing.add_handler(self)
+
+    def stop(self) -> None:
+        tracing.remove_handler(self)
+
+    def families(self) -> list[Family]:
+        with self._lock:
+            return [
+                dataclasses.replace(family, samples=dict(family.samples))
+                for family in self._families.values()
+            ]
+
+    def write(self, path: pathlib.Path) -> None:
+        """Merge the metrics into the file, replacing it atomically."""
+        path = path.absolute()
+        lock_path: pathlib.Path = path.with_name(path.name + ".lock")
+        with open(lock_path, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                families: dict[str, Family] = {}
+                with contextlib.suppress(FileNotFoundError):
+                    families = parse_metrics(path.read_text())
+                for family in self.families():
+                    if family.name in families:
+                        families[family.name].merge(family)
+                    else:
+                        families[family.name] = family
+
+                # Not ending with '.prom', the collector skips the temporary file
+                descriptor, temporary = tempfile.mkstemp(
+                    dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+                )
+                try:
+                    with os.fdopen(descriptor, "w") as file:
+                        file.write(format_metrics(families.values()))
+                    os.chmod(temporary, 0o644)
+                    os.replace(temporary, path)
+                except BaseException:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(temporary)
+                    raise
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
@@ -0,0 +1,503 @@
+"""Minimal reader of OpenPGP packets (RFC 4880, RFC 9580).
+
+Only the parts needed to match a signature to the key that issued it are
+read: the IDs of public keys and subkeys, and the issuer of signatures.
+Signatures are also checked structurally, so that malformed ones are
+rejected without starting GPG. The cryptography itself is left to GPG.
+"""
+
+import base64
+import binascii
+import hashlib
+import typing
+
+from insights_ansible_playbook_lib.errors import PreconditionError
+
+
+__all__ = [
+    "KeyIndex",
+    "PacketError",
+    "SignatureMismatchError",
+    "check_signature",
+    "dearmor",
+    "get_issuer",
+    "get_key_ids",
+    "iter_packets",
+    "name_issuer",
+]
+
+
+TAG_SIGNATURE: int = 2
+TAG_PUBLIC_KEY: int = 6
+TAG_PUBLIC_SUBKEY: int = 14
+
+SUBPACKET_ISSUER: int = 16
+SUBPACKET_ISSUER_FINGERPRINT: int = 33
+
+# Signature types of detached signatures of binary and text documents.
+SIGNATURE_TYPES: frozenset[int] = frozenset({0x00, 0x01})
+
+# Accepted public key algorithms and the number of MPIs of their signatures;
+# None marks signatures of a fixed size.
+PUBLIC_KEY_ALGORITHMS: dict[int, tuple[str, typing.Optional[int]]] = {
+    1: ("RSA", 1),
+    3: ("RSA", 1),
+    17: ("DSA", 2),
+    19: ("ECDSA", 2),
+    22: ("EdDSA", 2),
+    27: ("Ed25519", None),
+    28: ("Ed448", None),
+}
+
+# Accepted hash algorithms; MD5, SHA-1 and RIPEMD-160 are not.
+HASH_ALGORITHMS: dict[int, str] = {
+    8: "sha256",
+    9: "sha384",
+    10: "sha512",
+    11: "sha224",
+    12: "sha3_256",
+    14: "sha3_512",
+}
+
+# Sizes of fixed size signatures, and of the salts of version 6 signatures.
+_FIXED_SIZES: dict[int, int] = {27: 64, 28: 114}
+_SALT_SIZES: dict[int, int] = {8: 16, 9: 24, 10: 32, 11: 16, 12: 16, 14: 32}
+
+
+class PacketError(PreconditionError):
+    pass
+
+
+class SignatureMismatchError(PacketError):
+    pass
+
+
+def dearmor(data: bytes) -> bytes:
+    """Decode ASCII armored data; binary data is returned unchanged.
+
+    Consecutive armored blocks, e.g. several concatenated keys, are decoded
+    into consecutive packets.
+
+    :raises PacketError: The armor is malformed.
+    """
+    if b"-----BEGIN PGP " not in data:
+        return data
+
+    result: list[bytes] = []
+    body: typing.Optional[list[bytes]] = None
+    in_headers: bool = False
+    for raw_line in data.splitlines():
+        line: bytes = raw_line.strip()
+        if line.startswith(b"-----BEGIN PGP "):
+            body, in_headers = [], True
+        elif body is None:
+            continue
+        elif line.startswith(b"-----END PGP "):
+            try:
+                result.append(base64.b64decode(b"".join(body), validate=True))
+            except binascii.Error as exc:
+                raise PacketError(f"Armored data is not valid base64: {exc}.") from exc
+            body = None
+        elif in_headers:
+            # Headers like 'Version: ...' end with an empty line
+            in_headers = line != b"" and b":" in line
+            if not in_headers and line != b"":
+                body.append(line)
+        elif line.startswith(b"=") and len(line) == 5:
+            # CRC24 checksum, the packets are checked instead
+            continue
+        else:
+            body.append(line)
+    if body is not None:
+        raise PacketError("Armored data is not terminated.")
+    return b"".join(result)
+
+
+def _read_length(data: bytes, offset: int) -> tuple[int, int]:
+    """Read the length of a new format packet.
+
+    :returns: Length of the body and the offset of the body.
+    """
+    first: int = data[offset]
+    if first < 192:
+        return first, offset + 1
+    if first < 224:
+        if offset + 2 > len(data):
+            raise PacketError("Packet header is truncated.")
+        return ((first - 192) << 8) + data[offset + 1] + 192, offset + 2
+    if first == 255:
+        if offset + 5 > len(data):
+            raise PacketError("Packet header is truncated.")
+        return int.from_bytes(data[offset + 1 : offset + 5], "big"), offset + 5
+    raise PacketError("Partial body lengths are not supported.")
+
+
+def iter_packets(data: bytes) -> typing.Iterator[tuple[int, bytes]]:
+    """Split binary OpenPGP data into packets.
+
+    :raises PacketError: The data is not a sequence of packets.
+    :returns: Pairs of the packet tag and its body.
+    """
+    offset: int = 0
+    while offset < len(data):
+        header: int = data[offset]
+        if not header & 0x80:
+            raise PacketError(f"Invalid packet header at offset {offset}.")
+        if header & 0x40:
+            tag: int = header & 0x3F
+            if offset + 1 >= len(data):
+                raise PacketError("Packet header is truncated.")
+            length, offset = _read_length(data, offset + 1)
+        else:
+            tag = (header >> 2) & 0x0F
+            length_type: int = header & 0x03
+            if length_type == 3:
+                length, offset = len(data) - offset - 1, offset + 1
+            else:
+                size: int = 1 << length_type
+                if offset + 1 + size > len(data):
+                    raise PacketError("Packet header is truncated.")
+                length = int.from_bytes(data[offset + 1 : offset + 1 + size], "big")
+                offset += 1 + size
+        if offset + length > len(data):
+            raise PacketError(f"Packet with tag {tag} is truncated.")
+        yield tag, data[offset : offset + length]
+        offset += length
+
+
+def _get_key_id(body: bytes) -> bytes:
+    """Compute the ID of a public key or subkey packet."""
+    if not body:
+        raise PacketError("Key packet is empty.")
+    version: int = body[0]
+    if version == 4:
+        fingerprint: bytes = hashlib.sha1(
+            b"\x99" + len(body).to_bytes(2, "big") + body
+        ).digest()
+        return fingerprint[-8:]
+    if version in (5, 6):
+        prefix: bytes = b"\x9a" if version == 5 else b"\x9b"
+        fingerprint = hashlib.sha256(
+            prefix + len(body).to_bytes(4, "big") + body
+        ).digest()
+        return fingerprint[:8]
+    if version in (2, 3):
+        # The ID is the low 64 bits of the RSA modulus
+        if len(body) < 10:
+            raise PacketError("Key packet is truncated.")
+        bits: int = int.from_bytes(body[8:10], "big")
+        modulus: bytes = body[10 : 10 + (bits + 7) // 8]
+        if len(modulus) < 8:
+            raise PacketError("Key packet is truncated.")
+        return modulus[-8:]
+    raise PacketError(f"Key version {version} is not supported.")
+
+
+def get_key_ids(key: bytes) -> set[bytes]:
+    """Get the IDs of the public key and its subkeys.
+
+    :param key: Public key, binary or ASCII armored.
+    :raises PacketError: The key cannot be read.
+    """
+    key_ids: set[bytes] = {
+        _get_key_id(body)
+        for tag, body in iter_packets(dearmor(key))
+        if tag in (TAG_PUBLIC_KEY, TAG_PUBLIC_SUBKEY)
+    }
+    if not key_ids:
+        raise PacketError("Data does not contain any public key.")
+    return key_ids
+
+
+def _iter_subpackets(data: bytes) -> typing.Iterator[tuple[int, bytes]]:
+    offset: int = 0
+    while offset < len(data):
+        first: int = data[offset]
+        if first < 192:
+            length, offset = first, offset + 1
+        elif first < 255:
+            if offset + 2 > len(data):
+                raise PacketError("Signature subpacket is truncated.")
+            length, offset = ((first - 192) << 8) + data[offset + 1] + 192, offset + 2
+        else:
+            if offset + 5 > len(data):
+                raise PacketError("Signature subpacket is truncated.")
+            length = int.from_bytes(data[offset + 1 : offset + 5], "big")
+            offset += 5
+        if length == 0 or offset + length > len(data):
+            raise PacketError("Signature subpacket is truncated.")
+        # The top bit only marks critical subpackets
+        yield data[offset] & 0x7F, data[offset + 1 : offset + length]
+        offset += length
+
+
+def _get_signature_issuer(body: bytes) -> typing.Optional[bytes]:
+    if not body:
+        raise PacketError("Signature packet is empty.")
+    version: int = body[0]
+    if version in (2, 3):
+        if len(body) < 15:
+            raise PacketError("Signature packet is truncated.")
+        return body[7:15]
+    if version not in (4, 6):
+        raise PacketError(f"Signature version {version} is not supported.")
+
+    size: int = 2 if version == 4 else 4
+    offset: int = 4
+    areas: list[bytes] = []
+    for _ in ("hashed", "unhashed"):
+        if offset + size > len(body):
+            raise PacketError("Signature packet is truncated.")
+        length: int = int.from_bytes(body[offset : offset + size], "big")
+        offset += size
+        if offset + length > len(body):
+            raise PacketError("Signature packet is truncated.")
+        areas.append(body[offset : offset + length])
+        offset += length
+
+    issuer: typing.Optional[bytes] = None
+    for area in areas:
+        for kind, value in _iter_subpackets(area):
+            if kind == SUBPACKET_ISSUER_FINGERPRINT and len(value) > 8:
+                # Version 4 key IDs are the end of the fingerprint, newer the start
+                fingerprint: bytes = value[1:]
+                return fingerprint[-8:] if value[0] == 4 else fingerprint[:8]
+            if kind == SUBPACKET_ISSUER and len(value) == 8:
+                issuer = value
+    return issuer
+
+
+def _find_issuer(signature: bytes) -> typing.Optional[bytes]:
+    for tag, body in iter_packets(dearmor(signature)):
+        if tag == TAG_SIGNATURE:
+            return _get_signature_issuer(body)
+    raise PacketError("Data does not contain any signature.")
+
+
+def get_issuer(signature: bytes) -> bytes:
+    """Get the ID of the key that issued the signature.
+
+    :param signature: Detached signature, binary or ASCII armored.
+    :raises PacketError: The signature cannot be read or does not name its issuer.
+    """
+    issuer: typing.Optional[bytes] = _find_issuer(signature)
+    if issuer is None:
+        raise PacketError("Signature does not identify the key that issued it.")
+    return issuer
+
+
+def _encode_packet(tag: int, body: bytes) -> bytes:
+    """Encode a packet with a new format header."""
+    length: int = len(body)
+    if length < 192:
+        header: bytes = bytes([length])
+    elif length < 8384:
+        header = bytes([((length - 192) >> 8) + 192, (length - 192) & 0xFF])
+    else:
+        header = b"\xff" + length.to_bytes(4, "big")
+    return bytes([0xC0 | tag]) + header + body
+
+
+def name_issuer(signature: bytes, gpg_key: bytes) -> bytes:
+    """Name the primary key as the issuer of a signature that names none.
+
+    GPG cannot verify a signature without an issuer. The issuer is added to
+    the unhashed subpackets, which the signature does not cover; signatures
+    that name their issuer are returned unchanged.
+
+    :param signature: Detached signature, binary or ASCII armored.
+    :param gpg_key: Public key expected to have issued the signature.
+    :raises PacketError: The signature or the key cannot be read.
+    """
+    if _find_issuer(signature) is not None:
+        return signature
+    packets: list[tuple[int, bytes]] = list(iter_packets(dearmor(signature)))
+    tag, body = packets[0]
+    if tag != TAG_SIGNATURE or body[0] != 4:
+        # Version 6 signatures need the fingerprint of their issuer
+        return signature
+
+    key_id: typing.Optional[bytes] = next(
+        (
+            _get_key_id(key)
+            for key_tag, key in iter_packets(dearmor(gpg_key))
+            if key_tag == TAG_PUBLIC_KEY
+        ),
+        None,
+    )
+    if key_id is None:
+        raise PacketError("Data does not contain any public key.")
+
+    # Both areas were read while looking for the issuer, so they are complete
+    hashed_end: int = 6 + int.from_bytes(body[4:6], "big")
+    unhashed_end: int = (
+        hashed_end + 2 + int.from_bytes(body[hashed_end : hashed_end + 2], "big")
+    )
+    unhashed: bytes = (
+        body[hashed_end + 2 : unhashed_end] + bytes([9, SUBPACKET_ISSUER]) + key_id
+    )
+    if len(unhashed) > 0xFFFF:
+        raise PacketError("Signature subpackets are too long.")
+    body = (
+        body[:hashed_end]
+        + len(unhashed).to_bytes(2, "big")
+        + unhashed
+        + body[unhashed_end:]
+    )
+    return _encode_packet(tag, body) + b"".join(
+        _encode_packet(*packet) for packet in packets[1:]
+    )
+
+
+def _read_mpis(data: bytes, count: int) -> int:
+    """Read multiprecision integers.
+
+    :returns: Number of bytes they take.
+    """
+    offset: int = 0
+    for _ in range(count):
+        if offset + 2 > len(data):
+            raise PacketError("Signature value is truncated.")
+        bits: int = int.from_bytes(data[offset : offset + 2], "big")
+        offset += 2 + (bits + 7) // 8
+    if offset > len(data):
+        raise PacketError("Signature value is truncated.")
+    return offset
+
+
+def _check_signature_packet(body: bytes, data: typing.Optional[bytes]) -> None:
+    """Check the structure of a single signature packet.
+
+    :param data: Signed data to compare the hash prefix with.
+    """
+    if not body:
+        raise PacketError("Signature packet is empty.")
+    version: int = body[0]
+    salt: bytes = b""
+    if version in (2, 3):
+        if len(body) < 19 or body[1] != 5:
+            raise PacketError("Signature packet is truncated.")
+        signature_type, algorithm, hash_algorithm = body[2], body[15], body[16]
+        hashed: bytes = body[2:7]
+        trailer: bytes = b""
+        offset: int = 17
+    elif version in (4, 6):
+        size: int = 2 if version == 4 else 4
+        if len(body) < 4 + size:
+            raise PacketError("Signature packet is truncated.")
+        signature_type, algorithm, hash_algorithm = body[1], body[2], body[3]
+        hashed_length: int = int.from_bytes(body[4 : 4 + size], "big")
+        offset = 4 + size + hashed_length
+        if offset + size > len(body):
+            raise PacketError("Signature packet is truncated.")
+        hashed = body[:offset]
+        trailer = bytes([version, 0xFF]) + len(hashed).to_bytes(4, "big")
+        offset += size + int.from_bytes(body[offset : offset + size], "big")
+    else:
+        raise PacketError(f"Signature version {version} is not supported.")
+
+    if signature_type not in SIGNATURE_TYPES:
+        raise PacketError(
+            f"Signature type 0x{signature_type:02x} is not a detached signature."
+        )
+    if algorithm not in PUBLIC_KEY_ALGORITHMS:
+        raise PacketError(f"Public key algorithm {algorithm} is not supported.")
+    if hash_algorithm not in HASH_ALGORITHMS:
+        raise PacketError(f"Hash algorithm {hash_algorithm} is not allowed.")
+
+    # The left 16 bits of the hash
+    if offset + 2 > len(body):
+        raise PacketError("Signature packet is truncated.")
+    prefix: bytes = body[offset : offset + 2]
+    offset += 2
+    if version == 6:
+        salt_size: int = body[offset] if offset < len(body) else 0
+        if salt_size != _SALT_SIZES[hash_algorithm]:
+            raise PacketError(f"Salt of {salt_size} bytes is not valid.")
+        salt = body[offset + 1 : offset + 1 + salt_size]
+        offset += 1 + salt_size
+
+    value: bytes = body[offset:]
+    count: typing.Optional[int] = PUBLIC_KEY_ALGORITHMS[algorithm][1]
+    expected: int = (
+        _read_mpis(value, count) if count is not None else _FIXED_SIZES[algorithm]
+    )
+    if len(value) != expected:
+        raise PacketError(
+            f"Signature value has {len(value)} bytes instead of {expected}."
+        )
+
+    # Text signatures hash normalized line endings, only binary ones are checked
+    if data is not None and signature_type == 0x00:
+        digest = hashlib.new(HASH_ALGORITHMS[hash_algorithm], salt + data)
+        digest.update(hashed + trailer)
+        if digest.digest()[:2] != prefix:
+            raise SignatureMismatchError("Signature does not match the signed data.")
+
+
+def check_signature(signature: bytes, data: typing.Optional[bytes] = None) -> None:
+    """Check the structure of a detached signature.
+
+    Only well-formed signatures using accepted algorithms pass; the check
+    does not replace the cryptographic verification.
+
+    :param signature: Detached signature, binary or ASCII armored.
+    :param data: Signed data; when given, the hash prefix stored in the
+        signature has to match it.
+    :raises SignatureMismatchError: The hash prefix does not match the data.
+    :raises PacketError: The signature is malformed or uses an algorithm
+        that is not accepted.
+    """
+    packets: list[tuple[int, bytes]] = list(iter_packets(dearmor(signature)))
+    if not packets:
+        raise PacketError("Data does not contain any signature.")
+    for tag, body in packets:
+        if tag != TAG_SIGNATURE:
+            raise PacketError(f"Packet with tag {tag} is not a signature.")
+        _check_signature_packet(body, data)
+
+
+class KeyIndex:
+    """Trusted public keys indexed by the IDs of their keys and subkeys.
+
+    A signature is matched to the only key able to verify it, so the cost of
+    the verification does not grow with the number of trusted keys.
+
+    :param gpg_keys: Contents of public GPG keys.
+    :raises PacketError: One of the keys cannot be read.
+    """
+
+    def __init__(self, gpg_keys: typing.Iterable[bytes]):
+        self.gpg_keys: tuple[bytes, ...] = tuple(gpg_keys)
+        if not self.gpg_keys:
+            raise ValueError("At least one key has to be trusted.")
+        self._index: dict[bytes, bytes] = {}
+        for gpg_key in self.gpg_keys:
+            for key_id in get_key_ids(gpg_key):
+                self._index[key_id] = gpg_key
+
+    def __len__(self) -> int:
+        return len(self.gpg_keys)
+
+    def get(self, key_id: bytes) -> typing.Optional[bytes]:
+        """Get the key with the ID, or None if it is not trusted."""
+        return self._index.get(key_id)
+
+    def find(self, signature: bytes) -> bytes:
+        """Get the key that issued the signature.
+
+        Signatures that do not name their issuer can only be matched when a
+        single key is trusted.
+
+        :param signature: Detached signature, binary or ASCII armored.
+        :raises PacketError: The signature cannot be read or its key is not trusted.
+        """
+        issuer: typing.Optional[bytes] = _find_issuer(signature)
+        if issuer is None:
+            if len(self.gpg_keys) == 1:
+                return self.gpg_keys[0]
+            raise PacketError("Signature does not identify the key that issued it.")
+        gpg_key: typing.Optional[bytes] = self.get(issuer)
+        if gpg_key is None:
+            raise PacketError(f"Signature was issued by unknown key '{issuer.hex()}'.")
+        return gpg_key
@@ -0,0 +1,194 @@
+"""Canonicalization of many playbooks in worker processes.
+
+Parsing and serialization are CPU-bound pure Python code, so threads do
+not scale them. Workers read, check, parse and canonicalize whole
+playbooks and only send the compact canonical form of their plays back;
+the cryptographic verification and the revocation checks are left to
+the parent process.
+"""
+
+import binascii
+import concurrent.futures
+import dataclasses
+import functools
+import logging
+import multiprocessing
+import multiprocessing.context
+import pathlib
+import time
+import typing
+
+import yaml
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import lint
+
+
+__all__ = [
+    "PlayResult",
+    "PlaybookResult",
+    "canonicalize_file",
+    "canonicalize_files",
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+# Number of playbooks sent to a worker at once.
+CHUNK_SIZE: int = 16
+
+# Errors caused by the playbook, reported in its result. Limits and
+# malformed signatures are precondition errors.
+PLAYBOOK_ERRORS: tuple[type[Exception], ...] = (
+    lib.PreconditionError,
+    lib.GPGValidationError,
+    yaml.YAMLError,
+    UnicodeDecodeError,
+    binascii.Error,
+    OSError,
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class PlayResult:
+    """Canonical form of a single play.
+
+    :param index: Position of the play in the playbook.
+    :param name: Name of the play.
+    :param play: Canonical form of the play without the serialized play,
+        or None if the play could not be canonicalized.
+    :param error: Reason the play could not be canonicalized.
+    :param seconds: Time spent canonicalizing the play.
+    """
+
+    index: int
+    name: str
+    play: typing.Optional[lib.CanonicalPlay]
+    error: typing.Optional[str]
+    seconds: float
+
+
+@dataclasses.dataclass(frozen=True)
+class PlaybookResult:
+    """Canonical forms of all plays of a playbook.
+
+    :param path: Path to the playbook.
+    :param plays: Canonical forms of the plays, in order.
+    :param error: Reason the playbook could not be parsed.
+    :param seconds: Time spent reading and canonicalizing the playbook.
+    """
+
+    path: pathlib.Path
+    plays: tuple[PlayResult, ...]
+    error: typing.Optional[str]
+    seconds: float
+
+
+def read_playbook_file(path: pathlib.Path, limits: lib.Limits) -> str:
+    """Read the playbook, without reading more than the limits allow.
+
+    :raises LimitExceededError: The playbook is too large.
+    :raises PreconditionError: The playbook is empty.
+    """
+    if path.stat().st_size > limits.max_input_bytes:
+        raise lib.LimitExceededError(
+            f"Playbook is larger than {limits.max_input_bytes} bytes."
+        )
+    raw_playbook: str = path.read_text()
+    if len(raw_playbook) == 0:
+        raise lib.PreconditionError("Received empty playbook.")
+    return raw_playbook
+
+
+def _canonicalize_play(index: int, play: typing.Any, limits: lib.Limits) -> PlayResult:
+    start: float = time.perf_counter()
+    name: str = play.get("name", "???") if isinstance(play, dict) else "???"
+    try:
+        if not isinstance(play, dict):
+            raise lib.PreconditionError("Play is not a mapping.")
+        canonical_play: lib.CanonicalPlay = lib.canonicalize_play(play, limits=limits)
+        lib.decode_signature(canonical_play)
+    except PLAYBOOK_ERRORS as exc:
+        return PlayResult(
+            index=index,
+            name=name,
+            play=None,
+            error=str(exc),
+            seconds=time.perf_counter() - start,
+        )
+    return PlayResult(
+        index=index,
+        name=name,
+        play=dataclasses.replace(canonical_play, serialized_play=None),
+        error=None,
+        seconds=time.perf_counter() - start,
+    )
+
+
+def canonicalize_file(
+    path: pathlib.Path, limits: lib.Limits = lib.DEFAULT_LIMITS
+) -> PlaybookResult:
+    """Canonicalize all plays of the playbook.
+
+    Errors are described by the result instead of being raised; a failing
+    play does not prevent the following ones from being canonicalized.
+    """
+    start: float = time.perf_counter()
+    try:
+        raw_playbook: str = read_playbook_file(path, limits)
+        lint.check_playbook(raw_playbook)
+        plays: list[typing.Any] = list(lib.iter_playbook(raw_playbook, limits=limits))
+    except PLAYBOOK_ERRORS as exc:
+        return PlaybookResult(
+            path=path, plays=(), error=str(exc), seconds=time.perf_counter() - start
+        )
+
+    results: tuple[PlayResult, ...] = tuple(
+        _canonicalize_play(index, play, limits) for index, play in enumerate(plays)
+    )
+    return PlaybookResult(
+        path=path,
+        plays=results,
+        error="Playbook contains no plays." if len(plays) == 0 else None,
+        seconds=time.perf_counter() - start,
+    )
+
+
+def _get_context() -> multiprocessing.context.BaseContext:
+    """Get the context workers are started in.
+
+    The fork server is started once and forks each worker with the library
+    already imported. Unlike forking the parent directly, it is safe while
+    the parent runs other threads.
+    """
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["insights_ansible_playbook_lib.parallel"])
+    return context
+
+
+def canonicalize_files(
+    paths: typing.Iterable[pathlib.Path],
+    processes: int = 1,
+    chunk_size: int = CHUNK_SIZE,
+    limits: lib.Limits = lib.DEFAULT_LIMITS,
+) -> typing.Iterator[PlaybookResult]:
+    """Canonicalize the playbooks, in worker processes if requested.
+
+    :param paths: Paths to the playbooks.
+    :param processes: Number of worker processes; with one, the playbooks
+        are canonicalized in the current process.
+    :param chunk_size: Number of playbooks sent to a worker at once.
+    :param limits: Limits of parsing and serialization.
+    :returns: Results in order of the paths.
+    """
+    canonicalize = functools.partial(canonicalize_file, limits=limits)
+    if processes <= 1:
+        yield from map(canonicalize, paths)
+        return
+
+    logger.debug("Canonicalizing playbooks in %s processes.", processes)
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=processes, mp_context=_get_context()
+    ) as executor:
+        yield from executor.map(canonicalize, paths, chunksize=chunk_size)
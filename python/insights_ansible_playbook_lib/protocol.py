@@ -0,0 +1,45 @@
+"""Framing of the messages exchanged over local Unix sockets.
+
+Every message is prefixed by its length, a 4-byte big-endian integer. The
+verification daemon and the mock signing server both use it.
+"""
+
+import socket
+import struct
+
+
+__all__ = ["HEADER", "ProtocolError", "receive_message", "send_message"]
+
+
+HEADER = struct.Struct("!I")
+
+
+class ProtocolError(RuntimeError):
+    pass
+
+
+def send_message(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(HEADER.pack(len(payload)) + payload)
+
+
+def receive_message(sock: socket.socket, max_size: int) -> bytes:
+    """Receive a length-prefixed message.
+
+    :raises ProtocolError: The message is larger than allowed or incomplete.
+    """
+    (size,) = HEADER.unpack(_receive_exactly(sock, HEADER.size))
+    if size > max_size:
+        raise ProtocolError(f"Message is larger than {max_size} bytes.")
+    return _receive_exactly(sock, size)
+
+
+def _receive_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks: list[bytes] = []
+    remaining: int = size
+    while remaining > 0:
+        chunk: bytes = sock.recv(min(remaining, 1024 * 1024))
+        if not chunk:
+            raise ProtocolError("Connection closed before the message was received.")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
@@ -6,6 +6,8 @@ import yaml.parser
 import yaml.scanner
 import yaml.composer
 
+from insights_ansible_playbook_lib.limits import Limits
+
 
 logger = logging.getLogger(__name__)
 
@@ -34,62 +36,291 @@ class CustomYamlDumper(yaml.Dumper):
         return self.represent_scalar("tag:yaml.org,2002:null", "")
 
 
-class Loader(
-    yaml.reader.Reader,
-    yaml.scanner.Scanner,
-    yaml.parser.Parser,
-    yaml.composer.Composer,
-    CustomSafeConstructor,
-    yaml.resolver.Resolver,
+class _Composer(yaml.composer.Composer, CustomSafeConstructor, yaml.resolver.Resolver):
+    """Compose and construct the parsed events, enforcing the limits.
+
+    The events come from the parser the loaders mix in.
+    """
+
+    def __init__(self, limits: typing.Optional[Limits] = None):
+        yaml.composer.Composer.__init__(self)
+        CustomSafeConstructor.__init__(self)
+        yaml.resolver.Resolver.__init__(self)
+
+        self.limits: typing.Optional[Limits] = limits
+        self._nodes: int = 0
+        self._aliases: int = 0
+        self._depth: int = 0
+
+    def compose_node(self, parent, index):  # type: ignore
+        """Compose a node, enforcing the limits of the loader."""
+        limits: typing.Optional[Limits] = self.limits
+        if limits is None:
+            return super().compose_node(parent, index)
+
+        event = self.peek_event()  # type: ignore
+        if isinstance(event, yaml.AliasEvent):
+            self._aliases += 1
+            if self._aliases > limits.max_alias_expansions:
+                limits.check_aliases(self._aliases, _where(event))
+        else:
+            self._nodes += 1
+            if self._nodes > limits.max_nodes:
+                limits.check_nodes(self._nodes, _where(event))
+            if isinstance(event, yaml.ScalarEvent):
+                if len(event.value) > limits.max_scalar_length:
+                    limits.check_scalar(len(event.value), _where(event))
+
+        self._depth += 1
+        try:
+            if self._depth > limits.max_depth:
+                limits.check_depth(self._depth, _where(event))
+            return super().compose_node(parent, index)
+        finally:
+            self._depth -= 1
+
+
+# Registered once, so that loaders can be created concurrently without
+# modifying the class they share
+_Composer.add_constructor(
+    "tag:yaml.org,2002:bool", CustomSafeConstructor.construct_yaml_bool
+)  # type: ignore
+_Composer.add_constructor(
+    "tag:yaml.org,2002:int", CustomSafeConstructor.construct_yaml_int
+)  # type: ignore
+
+
+class PythonLoader(
+    yaml.reader.Reader, yaml.scanner.Scanner, yaml.parser.Parser, _Composer
 ):
-    def __init__(self, stream: str):
+    """Loader parsing with the pure Python parser of PyYAML."""
+
+    def __init__(self, stream: str, limits: typing.Optional[Limits] = None):
         yaml.reader.Reader.__init__(self, stream)
         yaml.scanner.Scanner.__init__(self)
         yaml.parser.Parser.__init__(self)
-        yaml.composer.Composer.__init__(self)
-        CustomSafeConstructor.__init__(self)
-        yaml.resolver.Resolver.__init__(self)
+        _Composer.__init__(self, limits)
+
+
+if yaml.__with_libyaml__:
+    from yaml._yaml import CParser
+
+    class CLoader(CParser, _Composer):
+        """Loader parsing with libyaml, as Ansible does when it is available.
+
+        Only the events come from libyaml; they are still composed in Python,
+        so that the limits are enforced on every node.
+        """
+
+        def __init__(self, stream: str, limits: typing.Optional[Limits] = None):
+            CParser.__init__(self, stream)
+            _Composer.__init__(self, limits)
+
+        # The composer of libyaml would bypass the limits
+        check_node = yaml.composer.Composer.check_node
+        get_node = yaml.composer.Composer.get_node
+        get_single_node = yaml.composer.Composer.get_single_node
 
-        type(self).add_constructor(
-            "tag:yaml.org,2002:bool", CustomSafeConstructor.construct_yaml_bool
-        )  # type: ignore
-        type(self).add_constructor(
-            "tag:yaml.org,2002:int", CustomSafeConstructor.construct_yaml_int
-        )  # type: ignore
+
+# libyaml parses several times faster than the pure Python parser.
+Loader: typing.Union[type[PythonLoader], type["CLoader"]] = (
+    CLoader if yaml.__with_libyaml__ else PythonLoader
+)
+
+
+def _where(event: yaml.Event) -> str:
+    """Describe the position of the event for error messages."""
+    if event.start_mark is None:
+        return ""
+    return f" at line {event.start_mark.line + 1}, column {event.start_mark.column + 1}"
+
+
+# Upper bound of characters held by the memo of a single serialization pass.
+MEMO_LIMIT: int = 16 * 1024 * 1024
+
+
+class _Pass:
+    """State of a single serialization pass.
+
+    PyYAML constructs a single Python object for an anchor and returns it for
+    every alias referencing it. Both the memo and the exclusions are keyed by
+    identity, so they are only valid for a single serialization pass: the
+    identities of objects may be reused once they are garbage collected.
+
+    :param shared: Identities of containers referenced more than once.
+    :param visited: Identities of shared containers that have been serialized.
+    :param cache: Canonical form of already serialized shared containers,
+        with the number of nodes, alias expansions and scalar characters they
+        contain, so that a cache hit counts as much as serializing them again.
+    :param size: Number of characters held by the cache.
+    :param excluded: Keys to skip, keyed by the identity of their dictionary.
+    :param limits: Limits enforced during the pass.
+    :param nodes: Number of serialized nodes, including alias expansions.
+    :param aliases: Number of alias expansions.
+    :param length: Number of serialized scalar characters, including alias
+        expansions.
+    :param depth: Nesting of the currently serialized node.
+    """
+
+    def __init__(
+        self,
+        root: typing.Any,
+        exclude: typing.Iterable[tuple[str, ...]] = (),
+        limits: typing.Optional[Limits] = None,
+    ):
+        self.shared: set[int] = self._find_shared(root)
+        self.visited: set[int] = set()
+        self.cache: dict[int, tuple[str, int, int, int]] = {}
+        self.size: int = 0
+        self.excluded: dict[int, set[str]] = {}
+        self.limits: typing.Optional[Limits] = limits
+        self.nodes: int = 0
+        self.aliases: int = 0
+        self.length: int = 0
+        self.depth: int = 0
+
+        for path in exclude:
+            parent: typing.Any = root
+            for key in path[:-1]:
+                parent = parent[key]
+            self.excluded.setdefault(id(parent), set()).add(path[-1])
+
+    @staticmethod
+    def _find_shared(root: typing.Any) -> set[int]:
+        """Find containers that are reachable through more than one reference."""
+        seen: set[int] = set()
+        shared: set[int] = set()
+        stack: list[typing.Any] = [root]
+        while stack:
+            value = stack.pop()
+            if isinstance(value, dict):
+                children: typing.Iterable = value.values()
+            elif isinstance(value, list):
+                children = value
+            else:
+                continue
+            if id(value) in seen:
+                shared.add(id(value))
+                continue
+            seen.add(id(value))
+            stack.extend(children)
+        return shared
+
+    def store(
+        self, value: typing.Any, serialized: str, nodes: int, aliases: int, length: int
+    ) -> None:
+        if self.size + len(serialized) > MEMO_LIMIT:
+            return
+        self.cache[id(value)] = (serialized, nodes, aliases, length)
+        self.size += len(serialized)
+
+    def count(self, nodes: int) -> None:
+        self.nodes += nodes
+        if self.limits is not None and self.nodes > self.limits.max_nodes:
+            self.limits.check_nodes(self.nodes)
+
+    def expand_alias(self, aliases: int = 1) -> None:
+        self.aliases += aliases
+        if self.limits is not None and self.aliases > self.limits.max_alias_expansions:
+            self.limits.check_aliases(self.aliases)
+
+    def measure(self, length: int) -> None:
+        self.length += length
+        if self.limits is not None and self.length > self.limits.max_serialized_length:
+            self.limits.check_serialized(self.length)
 
 
 class Serializer:
+    # Escaped characters and their escapes; the backslash goes first, so that
+    # it is not escaped again in the escapes of the other characters
+    _ESCAPES: typing.ClassVar[tuple[tuple[str, str], ...]] = (
+        ("\\", "\\\\"),
+        ("\n", "\\n"),
+        ("\t", "\\t"),
+        ("\u200b", "\\u200b"),  # Zero-width space
+        ("\u200c", "\\u200c"),  # Zero-width non-joiner
+        ("\u200d", "\\u200d"),  # Zero-width joiner
+    )
+
     @classmethod
-    def _obj(cls, value: typing.Any) -> str:
-        if isinstance(value, dict):
-            return cls._dict(value)
-        if isinstance(value, list):
-            return cls._list(value)
+    def _obj(cls, value: typing.Any, state: typing.Optional[_Pass] = None) -> str:
+        if state is not None:
+            state.count(1)
+        if isinstance(value, dict) or isinstance(value, list):
+            if state is None or id(value) not in state.shared:
+                return cls._container(value, state)
+            if id(value) in state.visited:
+                state.expand_alias()
+            state.visited.add(id(value))
+            cached: typing.Optional[tuple[str, int, int, int]] = state.cache.get(
+                id(value)
+            )
+            if cached is not None:
+                serialized, nodes, aliases, length = cached
+                state.count(nodes)
+                state.expand_alias(aliases)
+                state.measure(length)
+                return serialized
+            start: tuple[int, int, int] = (state.nodes, state.aliases, state.length)
+            serialized = cls._container(value, state)
+            state.store(
+                value,
+                serialized,
+                state.nodes - start[0],
+                state.aliases - start[1],
+                state.length - start[2],
+            )
+            return serialized
         if isinstance(value, int) or isinstance(value, float):
             return str(value)
         if isinstance(value, str):
+            if state is not None:
+                if state.limits is not None:
+                    state.limits.check_scalar(len(value))
+                state.measure(len(value))
             return cls._str(value)
-        logger.debug(f"Value type unknown: {value} {type(value).__name__}")
+        logger.debug("Value type unknown: %s %s", value, type(value).__name__)
         return f"{value}"
 
     @classmethod
-    def _dict(cls, source: dict) -> str:
-        if not source:
+    def _container(
+        cls, value: typing.Union[dict, list], state: typing.Optional[_Pass]
+    ) -> str:
+        if state is None:
+            if isinstance(value, dict):
+                return cls._dict(value, state)
+            return cls._list(value, state)
+
+        state.depth += 1
+        try:
+            if state.limits is not None:
+                state.limits.check_depth(state.depth)
+            if isinstance(value, dict):
+                return cls._dict(value, state)
+            return cls._list(value, state)
+        finally:
+            state.depth -= 1
+
+    @classmethod
+    def _dict(cls, source: dict, state: typing.Optional[_Pass] = None) -> str:
+        items: typing.Iterable[tuple[typing.Any, typing.Any]] = source.items()
+        if state is not None and id(source) in state.excluded:
+            excluded: set[str] = state.excluded[id(source)]
+            items = [(k, v) for k, v in items if k not in excluded]
+        if not items:
             return "ordereddict()"
-        result = "ordereddict(["
-        result += ", ".join(
-            "('{key}', {value})".format(key=k, value=cls._obj(v))
-            for k, v in source.items()
+        return (
+            "ordereddict(["
+            + ", ".join(
+                "('{key}', {value})".format(key=k, value=cls._obj(v, state))
+                for k, v in items
+            )
+            + "])"
         )
-        result += "])"
-        return result
 
     @classmethod
-    def _list(cls, source: list) -> str:
-        result = "["
-        result += ", ".join(cls._obj(v) for v in source)
-        result += "]"
-        return result
+    def _list(cls, source: list, state: typing.Optional[_Pass] = None) -> str:
+        return "[" + ", ".join(cls._obj(v, state) for v in source) + "]"
 
     @classmethod
     def _str(cls, value: str) -> str:
@@ -101,19 +332,12 @@ class Serializer:
         # new\nline     'new\\nline'
         # tab\tchar     'tab\\tchar'
 
-        special_chars: dict[str, str] = {
-            "\\": "\\\\",
-            "\n": "\\n",
-            "\t": "\\t",
-            "\u200b": "\\u200b",  # Zero-width space
-            "\u200c": "\\u200c",  # Zero-width non-joiner
-            "\u200d": "\\u200d",  # Zero-width joiner
-        }
-        escaped_string: str = ""
-        for char in value:
-            escaped_string += special_chars.get(char, char)
-
-        value = escaped_string
+        # Each replacement scans the string once at C speed; escaping the
+        # characters one by one was slow for megabyte-sized scalars
+        for char, escape in cls._ESCAPES:
+            if char in value:
+                value = value.replace(char, escape)
+
         quote: str = "'"
         if "'" in value:
             if '"' not in value:
@@ -124,5 +348,19 @@ class Serializer:
         return quote + value + quote
 
 
-def serialize_play(play: dict) -> str:
-    return Serializer._obj(play)
+def serialize_play(
+    play: dict,
+    exclude: typing.Iterable[tuple[str, ...]] = (),
+    limits: typing.Optional[Limits] = None,
+) -> str:
+    """Serialize the play into its canonical form.
+
+    Containers shared through YAML aliases are only serialized once.
+
+    :param play: Parsed play.
+    :param exclude: Paths of fields to skip, as returned by `get_excluded_fields()`.
+        The play itself is not modified.
+    :param limits: Limits of the serialization.
+    :raises LimitExceededError: The play exceeds the limits.
+    """
+    return Serializer._obj(play, _Pass(play, exclude, limits))
@@ -0,0 +1,278 @@
+"""Timings and counters of the verification.
+
+The library reports named spans (e.g. parsing, serialization or a GPG
+subprocess) and counters (e.g. spawned subprocesses or serialized bytes)
+to the registered handlers. Without any handler, a span costs a single
+check and a counter nothing more, so the hooks stay in the hot paths.
+
+Applications embedding the library register a callback:
+
+    def handler(event: tracing.Event) -> None:
+        if isinstance(event, tracing.SpanEvent):
+            metrics.observe(event.name, event.duration)
+
+    tracing.add_handler(handler)
+
+`ChromeTrace` collects the events into the Chrome trace-event format,
+viewable in `chrome://tracing` or Perfetto. When `tracemalloc` is tracing,
+spans also carry the peak of the traced memory during the span.
+
+`tracemalloc` and `json` are only imported once a span is timed or a trace
+written, so that importing the library stays cheap.
+"""
+
+import dataclasses
+import os
+import threading
+import time
+import typing
+
+
+__all__ = [
+    "ChromeTrace",
+    "CounterEvent",
+    "Event",
+    "SpanEvent",
+    "add_handler",
+    "count",
+    "remove_handler",
+    "span",
+]
+
+
+@dataclasses.dataclass(frozen=True)
+class SpanEvent:
+    """A finished span.
+
+    :param name: Name of the span, e.g. 'serialize_play'.
+    :param start: Start of the span, from `time.perf_counter_ns()`.
+    :param duration: Duration of the span in nanoseconds.
+    :param thread: Identifier of the thread the span ran in.
+    :param args: Details of the span, e.g. the name of the play.
+    :param memory_peak: Peak of the memory traced by `tracemalloc` during the
+        span, in bytes, if it was tracing. Spans of concurrent threads
+        share the peak.
+    """
+
+    name: str
+    start: int
+    duration: int
+    thread: int
+    args: dict[str, typing.Any]
+    memory_peak: typing.Optional[int] = None
+
+
+@dataclasses.dataclass(frozen=True)
+class CounterEvent:
+    """An increment of a counter.
+
+    :param name: Name of the counter, e.g. 'subprocesses'.
+    :param value: Increment.
+    :param time: Time of the increment, from `time.perf_counter_ns()`.
+    """
+
+    name: str
+    value: int
+    time: int
+
+
+Event = typing.Union[SpanEvent, CounterEvent]
+Handler = typing.Callable[[Event], None]
+
+_handlers: list[Handler] = []
+_handlers_lock = threading.Lock()
+_local = threading.local()
+
+
+def add_handler(handler: Handler) -> None:
+    """Call the handler with every following event.
+
+    Handlers are called in the thread that produced the event, and must be
+    thread-safe.
+    """
+    global _handlers
+    with _handlers_lock:
+        # Replaced instead of modified, so that events are dispatched without locking
+        _handlers = [*_handlers, handler]
+
+
+def remove_handler(handler: Handler) -> None:
+    global _handlers
+    with _handlers_lock:
+        # Compared by equality, so that bound methods can be removed
+        _handlers = [item for item in _handlers if item != handler]
+
+
+def _emit(event: Event) -> None:
+    for handler in _handlers:
+        handler(event)
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name: str, args: dict[str, typing.Any]):
+        self.name: str = name
+        self.args: dict[str, typing.Any] = args
+        self.start: int = 0
+
+    def __enter__(self) -> "_Span":
+        import tracemalloc
+
+        if tracemalloc.is_tracing():
+            # Peaks of the enclosing spans, which are reset by each nested span
+            peaks: list[int] = getattr(_local, "peaks", None) or []
+            _local.peaks = peaks
+            if peaks:
+                peaks[-1] = max(peaks[-1], tracemalloc.get_traced_memory()[1])
+            peaks.append(0)
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        import tracemalloc
+
+        end: int = time.perf_counter_ns()
+        memory_peak: typing.Optional[int] = None
+        peaks: typing.Optional[list[int]] = getattr(_local, "peaks", None)
+        if peaks and tracemalloc.is_tracing():
+            memory_peak = max(peaks.pop(), tracemalloc.get_traced_memory()[1])
+            if peaks:
+                peaks[-1] = max(peaks[-1], memory_peak)
+        _emit(
+            SpanEvent(
+                name=self.name,
+                start=self.start,
+                duration=end - self.start,
+                thread=threading.get_ident(),
+                args=self.args,
+                memory_peak=memory_peak,
+            )
+        )
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, **args: typing.Any) -> typing.ContextManager[typing.Any]:
+    """Time the block as a named span.
+
+    :param name: Name of the span.
+    :param args: Details of the span, reported to the handlers.
+    """
+    if not _handlers:
+        return _NO_SPAN
+    return _Span(name, args)
+
+
+def count(name: str, value: int = 1) -> None:
+    """Increment a counter.
+
+    :param name: Name of the counter.
+    :param value: Increment.
+    """
+    if _handlers:
+        _emit(CounterEvent(name=name, value=value, time=time.perf_counter_ns()))
+
+
+class ChromeTrace:
+    """Handler collecting events in the Chrome trace-event format.
+
+    :param memory: Trace memory allocations with `tracemalloc`, so that
+        spans report their peak memory. Tracing slows the process down.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory: bool = memory
+        self._events: list[dict[str, typing.Any]] = []
+        self._totals: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._pid: int = os.getpid()
+        self._started_tracemalloc: bool = False
+
+    def __call__(self, event: Event) -> None:
+        if isinstance(event, SpanEvent):
+            args: dict[str, typing.Any] = {
+                key: value if isinstance(value, (int, float, bool)) else str(value)
+                for key, value in event.args.items()
+            }
+            if event.memory_peak is not None:
+                args["memory_peak"] = event.memory_peak
+            record: dict[str, typing.Any] = {
+                "name": event.name,
+                "ph": "X",
+                "ts": event.start / 1000,
+                "dur": event.duration / 1000,
+                "pid": self._pid,
+                "tid": event.thread,
+                "args": args,
+            }
+            with self._lock:
+                self._events.append(record)
+        else:
+            with self._lock:
+                # Counters are drawn as their running totals
+                total: int = self._totals.get(event.name, 0) + event.value
+                self._totals[event.name] = total
+                self._events.append(
+                    {
+                        "name": event.name,
+                        "ph": "C",
+                        "ts": event.time / 1000,
+                        "pid": self._pid,
+                        "args": {event.name: total},
+                    }
+                )
+
+    @property
+    def totals(self) -> dict[str, int]:
+        """Totals of the counters."""
+        with self._lock:
+            return dict(self._totals)
+
+    def start(self) -> None:
+        """Register the handler, and start tracing memory if requested."""
+        import tracemalloc
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        add_handler(self)
+
+    def stop(self) -> None:
+        remove_handler(self)
+        if self._started_tracemalloc:
+            import tracemalloc
+
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def __enter__(self) -> "ChromeTrace":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        self.stop()
+
+    def to_json(self) -> dict[str, typing.Any]:
+        with self._lock:
+            events: list[dict[str, typing.Any]] = list(self._events)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path: "os.PathLike[str]") -> None:
+        """Write the collected events as a JSON file."""
+        import json
+
+        with open(path, "w") as file:
+            json.dump(self.to_json(), file)
@@ -0,0 +1,319 @@
+"""Verifier reusable by applications embedding the library.
+
+A `Verifier` is built once from the trusted keys and the revocation list
+and can then verify any number of playbooks, from any number of threads.
+The keys are imported into a single keyring and the revocation list is
+verified only once; both happen in the background while the first playbook is
+being parsed.
+
+The verifier describes the result of every play instead of raising the
+first error:
+
+    with Verifier(gpg_key, revocation_list=revocation_playbook) as verifier:
+        verdict = verifier.verify_playbook(raw_playbook)
+        if not verdict.ok:
+            ...
+"""
+
+import collections
+import concurrent.futures
+import dataclasses
+import logging
+import threading
+import typing
+
+import yaml
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import crypto, lint, tracing
+
+
+__all__ = ["PlayVerdict", "PlaybookVerdict", "Verifier"]
+
+
+logger = logging.getLogger(__name__)
+
+
+# Number of verified signatures remembered by default.
+CACHE_SIZE: int = 1024
+
+
+@dataclasses.dataclass(frozen=True)
+class PlayVerdict:
+    """Result of the verification of a single play.
+
+    :param index: Position of the play in the playbook.
+    :param name: Name of the play.
+    :param digest: SHA256 of the serialized play, if it could be serialized.
+    :param revoked: The digest is on the revocation list.
+    :param verified: The signature of the play matches its digest.
+    :param error: Reason the play was rejected.
+    """
+
+    index: int
+    name: str
+    digest: typing.Optional[bytes] = None
+    revoked: bool = False
+    verified: bool = False
+    error: typing.Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.verified and self.error is None
+
+
+@dataclasses.dataclass(frozen=True)
+class PlaybookVerdict:
+    """Result of the verification of a playbook.
+
+    :param plays: Results of the plays, in order.
+    :param error: Reason the whole playbook was rejected, e.g. it could not
+        be parsed; the plays are then empty.
+    """
+
+    plays: tuple[PlayVerdict, ...]
+    error: typing.Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and all(play.ok for play in self.plays)
+
+    def raise_for_error(self) -> None:
+        """Raise the error of the playbook, or of its first rejected play."""
+        if self.error is not None:
+            raise self.error
+        for play in self.plays:
+            if play.error is not None:
+                raise play.error
+
+
+class Verifier:
+    """Verifier of playbooks signed by any of the trusted keys.
+
+    All keys are imported into a single keyring; each signature is only
+    checked against the key that issued it, and signatures of unknown keys
+    are rejected without running GPG.
+
+    The verifier is safe to use from multiple threads; it must be closed
+    to remove its keyring.
+
+    :param gpg_key: Content of public GPG key, or of several trusted keys.
+    :param revocation_list: Content of the signed playbook with digests of
+        revoked plays, verified with the trusted keys.
+    :param revoked: Additional digests of revoked plays.
+    :param limits: Limits of parsing and serialization.
+    :param jobs: Number of plays verified concurrently.
+    :param cache_size: Number of verified signatures remembered, so that
+        plays verified before do not run GPG again; zero disables the cache.
+    """
+
+    def __init__(
+        self,
+        gpg_key: typing.Union[bytes, typing.Iterable[bytes]],
+        revocation_list: typing.Optional[str] = None,
+        revoked: typing.Iterable[bytes] = (),
+        limits: lib.Limits = lib.DEFAULT_LIMITS,
+        jobs: int = lib.VERIFICATION_JOBS,
+        cache_size: int = CACHE_SIZE,
+    ):
+        self.keys: lib.KeyIndex = lib.KeyIndex(
+            [gpg_key] if isinstance(gpg_key, bytes) else gpg_key
+        )
+        self.limits: lib.Limits = limits
+        self.cache_size: int = cache_size
+        self._cache: collections.OrderedDict[tuple[bytes, bytes], None] = (
+            collections.OrderedDict()
+        )
+        self.closed: bool = False
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=jobs, thread_name_prefix="verify"
+        )
+        self._setup: concurrent.futures.Future[
+            tuple[crypto.GPGKeyring, frozenset[bytes]]
+        ] = self._executor.submit(self._prepare, revocation_list, frozenset(revoked))
+
+    def _prepare(
+        self, revocation_list: typing.Optional[str], revoked: frozenset[bytes]
+    ) -> tuple[crypto.GPGKeyring, frozenset[bytes]]:
+        with tracing.span("prepare_verifier"):
+            keyring: crypto.GPGKeyring = lib.open_keyring(self.keys)
+            if revocation_list is None:
+                return keyring, revoked
+            try:
+                digests: set[bytes] = lib.get_revocation_digests(
+                    revocation_list, self.keys, limits=self.limits, keyring=keyring
+                )
+            except Exception:
+                keyring.close()
+                raise
+            logger.debug("Revocation digests obtained, can proceed to verification.")
+            return keyring, revoked | digests
+
+    def wait(self) -> None:
+        """Wait until the key is imported and the revocation list verified.
+
+        :raises Exception: The key or the revocation list could not be loaded.
+        """
+        self._setup.result()
+
+    @property
+    def revoked(self) -> frozenset[bytes]:
+        """Digests of revoked plays, waiting until they have been verified."""
+        _, revoked = self._setup.result()
+        return revoked
+
+    def close(self) -> None:
+        self.closed = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if self._setup.done() and self._setup.exception() is None:
+            keyring, _ = self._setup.result()
+            keyring.close()
+
+    def __enter__(self) -> "Verifier":
+        return self
+
+    def __exit__(self, *exc_info: typing.Any) -> None:
+        self.close()
+
+    def _is_cached(self, key: tuple[bytes, bytes]) -> bool:
+        with self._lock:
+            if key not in self._cache:
+                return False
+            self._cache.move_to_end(key)
+            return True
+
+    def _remember(self, key: tuple[bytes, bytes]) -> None:
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = None
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _verify_signature(
+        self, play: lib.CanonicalPlay, keyring: crypto.GPGKeyring
+    ) -> None:
+        key: tuple[bytes, bytes] = (play.digest, play.signature)
+        if self._is_cached(key):
+            tracing.count("signature_cache_hits")
+            logger.debug("Signature of play '%s' was verified before.", play.name)
+            return
+        tracing.count("signature_cache_misses")
+        lib.verify_canonical_play(play, self.keys, keyring=keyring)
+        self._remember(key)
+
+    def verify_plays(
+        self, plays: typing.Iterable[typing.Any], verify_all: bool = False
+    ) -> PlaybookVerdict:
+        """Verify parsed plays.
+
+        Each play is canonicalized as soon as the iterable produces it, so
+        a lazy parser overlaps with the canonicalization. The cheap checks
+        of all plays run first; when any play fails them, no signature is
+        verified, unless `verify_all` is set.
+
+        :param plays: Parsed plays, e.g. from `iter_playbook()`.
+        :param verify_all: Verify the signatures of the valid plays even when
+            other plays failed the cheap checks.
+        :raises Exception: The key or the revocation list could not be loaded,
+            or the iterable failed to produce the plays.
+        """
+        canonical_plays: list[typing.Union[lib.CanonicalPlay, PlayVerdict]] = []
+        for index, play in enumerate(plays):
+            name: str = play.get("name", "???") if isinstance(play, dict) else "???"
+            try:
+                if not isinstance(play, dict):
+                    raise lib.PreconditionError("Play is not a mapping.")
+                canonical_plays.append(lib.canonicalize_play(play, limits=self.limits))
+            except Exception as exc:
+                canonical_plays.append(PlayVerdict(index=index, name=name, error=exc))
+        return self.verify_canonical_plays(canonical_plays, verify_all=verify_all)
+
+    def verify_canonical_plays(
+        self,
+        plays: typing.Sequence[typing.Union[lib.CanonicalPlay, PlayVerdict]],
+        verify_all: bool = False,
+    ) -> PlaybookVerdict:
+        """Verify plays canonicalized beforehand, e.g. by worker processes.
+
+        The serialized plays are not needed.
+
+        :param plays: Canonical forms of the plays, in order; plays that could
+            not be canonicalized are given by their verdict.
+        :param verify_all: Verify the signatures of the valid plays even when
+            other plays failed the cheap checks.
+        :raises Exception: The key or the revocation list could not be loaded.
+        """
+        verdicts: list[PlayVerdict] = []
+        valid_plays: dict[int, lib.CanonicalPlay] = {}
+        for index, play in enumerate(plays):
+            if isinstance(play, PlayVerdict):
+                verdicts.append(play)
+                continue
+            try:
+                self.keys.find(lib.decode_signature(play))
+            except Exception as exc:
+                verdicts.append(PlayVerdict(index=index, name=play.name, error=exc))
+            else:
+                verdicts.append(
+                    PlayVerdict(index=index, name=play.name, digest=play.digest)
+                )
+                valid_plays[index] = play
+        if not verdicts:
+            return PlaybookVerdict(
+                plays=(), error=lib.PreconditionError("Playbook contains no plays.")
+            )
+
+        keyring, revoked = self._setup.result()
+        for index in list(valid_plays):
+            try:
+                lib.check_revocation(valid_plays[index], revoked)
+            except lib.PreconditionError as exc:
+                verdicts[index] = dataclasses.replace(
+                    verdicts[index], revoked=True, error=exc
+                )
+                del valid_plays[index]
+
+        if not verify_all and len(valid_plays) < len(verdicts):
+            return PlaybookVerdict(plays=tuple(verdicts))
+
+        futures: dict[int, concurrent.futures.Future[None]] = {
+            index: self._executor.submit(self._verify_signature, play, keyring)
+            for index, play in valid_plays.items()
+        }
+        for index, future in futures.items():
+            try:
+                future.result()
+            except Exception as exc:
+                verdicts[index] = dataclasses.replace(verdicts[index], error=exc)
+            else:
+                verdicts[index] = dataclasses.replace(verdicts[index], verified=True)
+        return PlaybookVerdict(plays=tuple(verdicts))
+
+    def verify_playbook(self, playbook: typing.Union[str, bytes]) -> PlaybookVerdict:
+        """Verify all plays of a raw playbook.
+
+        :param playbook: Content of the playbook, bytes are decoded as UTF-8.
+        :raises Exception: The key or the revocation list could not be loaded.
+        """
+        with tracing.span("verify_playbook"):
+            try:
+                self.limits.check_input(playbook)
+                raw_playbook: str = (
+                    playbook.decode("utf-8")
+                    if isinstance(playbook, bytes)
+                    else playbook
+                )
+                if len(raw_playbook) == 0:
+                    raise lib.PreconditionError("Received empty playbook.")
+                # Reject playbooks violating the specification before parsing them
+                with tracing.span("lint"):
+                    lint.check_playbook(raw_playbook)
+                return self.verify_plays(
+                    lib.iter_playbook(raw_playbook, limits=self.limits)
+                )
+            except (lib.PreconditionError, yaml.YAMLError, UnicodeDecodeError) as exc:
+                # Problems with the key or the revocation list are reported first
+                self._setup.result()
+                return PlaybookVerdict(plays=(), error=exc)
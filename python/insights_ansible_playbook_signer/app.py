@@ -1,95 +1,70 @@
 import argparse
 import base64
+import concurrent.futures
 import contextlib
-import copy
 import logging
 import pathlib
-import subprocess
 import sys
-import tempfile
 import traceback
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
 import yaml
 
 import insights_ansible_playbook_lib as lib
-from insights_ansible_playbook_lib import crypto
+from insights_ansible_playbook_lib import artifacts, tracing
 from insights_ansible_playbook_lib.serialization import CustomYamlDumper
-from insights_ansible_playbook_verifier.app import get_version_from_package
+from insights_ansible_playbook_lib.cli import (
+    VersionAction,
+    add_instrumentation_arguments,
+    start_metrics,
+    start_trace,
+)
+from insights_ansible_playbook_signer import backends
 
-logger = logging.getLogger(__name__)
-
-
-def send_signing_request(play_digest: bytes, key: str) -> bytes:
-    """Use remote signing server to sign the digest.
-
-    :param play_digest: Hash of a play.
-    :param key: Name of the GPG key to use on the remote signing server.
-    """
-    logger.info("Requesting play signature from a signing server.")
-
-    with tempfile.TemporaryDirectory(
-        prefix=lib.TEMPORARY_STASH_DIRECTORY_PREFIX,
-        dir=lib.TEMPORARY_STASH_DIRECTORY,
-    ) as temp_dir:
-        temp_path = pathlib.Path(temp_dir)
-
-        digest_file = temp_path / "digest"
-        digest_file.write_bytes(play_digest)
-
-        subprocess.run(
-            ["rpm-sign", "--detachsign", "--key", key, "--nat", str(digest_file)],
-            check=True,
-            capture_output=True,
-        )
+if TYPE_CHECKING:
+    from insights_ansible_playbook_lib import metrics
 
-        return (temp_path / "digest.asc").read_bytes()
+logger = logging.getLogger(__name__)
 
 
-def sign_play_digest(play_digest: bytes, key: pathlib.Path) -> bytes:
-    """Get the GPG signature of the play digest.
+def sign_digests(
+    digests: list[tuple[str, bytes]], backend: backends.SigningBackend, jobs: int = 1
+) -> list[bytes]:
+    """Sign the digests, `jobs` of them at a time.
 
-    :param play_digest: Hash of a play.
-    :param key: Path to the GPG key to use.
+    :param digests: Names of the plays and their digests.
+    :param backend: Backend to sign with.
+    :param jobs: Number of signatures requested at once.
+    :raises RuntimeError: A digest could not be signed.
+    :returns: Signatures, in the order of the digests.
     """
-    logger.debug("Signing play.")
-
-    if not key.is_file():
-        raise RuntimeError(f"Key '{key}' does not exist.")
-
-    with tempfile.TemporaryDirectory(
-        prefix=lib.TEMPORARY_STASH_DIRECTORY_PREFIX,
-        dir=lib.TEMPORARY_STASH_DIRECTORY,
-    ) as temp_dir:
-        temp_path = pathlib.Path(temp_dir)
 
-        digest_file = temp_path / "digest"
-        digest_file.write_bytes(play_digest)
+    def sign_digest(item: tuple[str, bytes]) -> bytes:
+        name, digest = item
+        with tracing.span("sign_play", play=name):
+            return backend.sign(digest)
 
-        result = crypto.sign_file(digest_file, key)
-        if not result.ok:
-            raise RuntimeError(f"Could not sign the digest: {result}")
-        return (temp_path / "digest.asc").read_bytes()
+    if jobs <= 1 or len(digests) <= 1:
+        return [sign_digest(item) for item in digests]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(sign_digest, digests))
 
 
 def sign_revocation_list(
-    raw_data: list[dict],
-    *,
-    local_key: Optional[pathlib.Path],
-    remote_key: Optional[str],
-) -> None:
+    raw_data: list[dict], backend: backends.SigningBackend
+) -> dict:
     """Sign revocation list.
 
     :param raw_data: A map containing the revocation play references.
-    :param local_key: Path to private GPG key. Must not be used together with `remote_key`.
-    :param remote_key: Name of remote GPG key. Must not be used together with `local_key`.
+    :param backend: Backend to sign with.
+    :returns: The signed revocation list.
     """
     if len(raw_data) != 1:
         raise RuntimeError("Revocation file must contain exactly one entry.")
     if "revoked_playbooks" not in raw_data[0]:
         raise RuntimeError("Revocation file must contain key 'revoked_playbooks'.")
 
-    data: dict = copy.deepcopy(raw_data[0])
+    data: dict = dict(raw_data[0])
     data["vars"] = {
         "insights_signature_exclude": "/vars/insights_signature",
         "insights_signature": "",
@@ -98,47 +73,45 @@ def sign_revocation_list(
     # Ensure 'revoked_playbooks' are the last element
     data["revoked_playbooks"] = data.pop("revoked_playbooks")
 
-    cleaned_data: dict = lib.clean_play(data)
-    serialized_data: bytes = lib.serialize_play(cleaned_data).encode("utf-8")
+    excluded_fields: list[tuple[str, ...]] = lib.get_excluded_fields(data)
+    serialized_data: bytes = lib.serialize_play(data, exclude=excluded_fields).encode(
+        "utf-8"
+    )
     digest: bytes = lib.create_play_digest(serialized_data)
 
-    logger.debug(f"Serialized revocation list as {serialized_data!r}.")
-    logger.debug(f"Revocation list digest is '{bytearray(digest).hex()}'.")
-
-    signature: bytes
-    if remote_key is not None:
-        signature = send_signing_request(digest, key=remote_key)
-    elif local_key is not None:
-        signature = sign_play_digest(digest, key=local_key)
-    else:
-        raise RuntimeError("Either 'remote_key' or 'local_key' must be set.")
+    logger.debug(
+        "Serialized revocation list as %s.", artifacts.Payload(serialized_data)
+    )
+    logger.debug("Revocation list digest is '%s'.", bytearray(digest).hex())
 
+    signature: bytes = backend.sign(digest)
     data["vars"]["insights_signature"] = base64.b64encode(signature)
-
-    yaml.dump([data], sys.stdout, sort_keys=False)
+    return data
 
 
 def sign_playbook(
-    raw_plays: list[dict],
-    *,
-    local_key: Optional[pathlib.Path],
-    remote_key: Optional[str],
-) -> None:
+    raw_plays: list[dict], backend: backends.SigningBackend, jobs: int = 1
+) -> list[dict]:
     """Sign one or more plays in a playbook.
 
     :param raw_plays: Plays as they were loaded from the file.
-    :param local_key: Path to private GPG key. Must not be used together with `remote_key`.
-    :param remote_key: Name of remote GPG key. Must not be used together with `local_key`.
+    :param backend: Backend to sign with.
+    :param jobs: Number of signatures requested at once.
+    :returns: The signed plays.
     """
     plays: list[dict] = []
-    for i, raw_play in enumerate(raw_plays, 1):
+    digests: list[tuple[str, bytes]] = []
+    for raw_play in raw_plays:
         play_name: str = raw_play.get("name", "???")
-        logger.debug(f"Preparing to sign play {play_name}.")
-        play: dict = copy.deepcopy(raw_play)
+        logger.debug("Preparing to sign play %s.", play_name)
+        # Only the containers the signer modifies are copied
+        play: dict = dict(raw_play)
 
         if "vars" not in play.keys():
             logger.debug("Filling in missing 'vars' map.")
             play["vars"] = {}
+        else:
+            play["vars"] = dict(play["vars"])
         if "insights_signature_exclude" not in play["vars"].keys():
             logger.debug("Filling in missing 'insights_signature_exclude' pair.")
             play["vars"]["insights_signature_exclude"] = (
@@ -146,7 +119,7 @@ def sign_playbook(
             )
 
         if "insights_signature" not in play["vars"].keys():
-            # The 'clean_play' method requires this to be included.
+            # The 'get_excluded_fields' method requires this to be included.
             # It will be overwritten later.
             play["vars"]["insights_signature"] = ""
 
@@ -156,35 +129,33 @@ def sign_playbook(
         else:
             raise RuntimeError("Play does not contain key 'tasks'.")
 
-        cleaned_play: dict = lib.clean_play(play)
-        serialized_play: bytes = lib.serialize_play(cleaned_play).encode("utf-8")
+        excluded_fields: list[tuple[str, ...]] = lib.get_excluded_fields(play)
+        serialized_play: bytes = lib.serialize_play(
+            play, exclude=excluded_fields
+        ).encode("utf-8")
         digest: bytes = lib.create_play_digest(serialized_play)
 
-        logger.debug(f"Serialized play '{play_name}' as {serialized_play!r}")
-        logger.debug(f"Play digest is '{bytearray(digest).hex()}'.")
-
-        signature: bytes
-        if remote_key is not None:
-            signature = send_signing_request(digest, key=remote_key)
-        elif local_key is not None:
-            signature = sign_play_digest(digest, key=local_key)
-        else:
-            raise RuntimeError("Either 'remote_key' or 'local_key' must be set.")
+        logger.debug(
+            "Serialized play '%s' as %s", play_name, artifacts.Payload(serialized_play)
+        )
+        logger.debug("Play digest is '%s'.", bytearray(digest).hex())
+        plays.append(play)
+        digests.append((play_name, digest))
 
+    signatures: list[bytes] = sign_digests(digests, backend, jobs=jobs)
+    for i, (play, signature) in enumerate(zip(plays, signatures), 1):
         play["vars"]["insights_signature"] = base64.b64encode(signature)
-        plays.append(play)
-        logger.debug(f"Play {i}/{len(raw_plays)} ('{play_name}'): OK.")
+        logger.debug("Play %s/%s ('%s'): OK.", i, len(plays), play.get("name", "???"))
 
     logger.info("All plays were signed.")
-    yaml.dump(plays, sys.stdout, sort_keys=False)
+    return plays
 
 
 def run() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--version",
-        action="version",
-        version=get_version_from_package(),
+        action=VersionAction,
     )
     parser.add_argument(
         "--debug",
@@ -207,6 +178,12 @@ def run() -> None:
         type=str,
         help="Name of a key for a remote signing server",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of plays signed at once (default: %(default)s)",
+    )
     playbook = parser.add_mutually_exclusive_group(required=True)
     playbook.add_argument(
         "--playbook",
@@ -218,8 +195,37 @@ def run() -> None:
         action="store_true",
         help="Load playbook from stdin (the default)",
     )
+    add_instrumentation_arguments(parser)
     args = parser.parse_args()
+    start_trace(args)
+    collector: Optional["metrics.Metrics"] = start_metrics(
+        args, "insights_ansible_playbook_signer"
+    )
 
+    try:
+        plays: int = sign(args)
+    except Exception:
+        if collector is not None:
+            collector.observe_playbook("error", name="signatures_total")
+        raise
+    if collector is not None:
+        collector.observe_playbook("ok", plays, name="signatures_total")
+
+
+def create_backend(args: argparse.Namespace) -> backends.SigningBackend:
+    """Get the signing backend selected on the command line."""
+    if args.remote_key is not None:
+        return backends.RPMSignBackend(args.remote_key)
+    if args.key is not None:
+        return backends.LocalGPGBackend(args.key)
+    raise RuntimeError("Either 'remote_key' or 'key' must be set.")
+
+
+def sign(args: argparse.Namespace) -> int:
+    """Sign the playbook as requested on the command line.
+
+    :returns: Number of signed plays.
+    """
     # Configure YAML to handle None values
     yaml.add_representer(type(None), CustomYamlDumper.represent_none)
 
@@ -239,14 +245,16 @@ def run() -> None:
     if not raw_plays:
         raise lib.PreconditionError("Playbook contains no plays.")
 
-    if args.revocation_list:
-        logger.info("Signing revocation list.")
-        return sign_revocation_list(
-            raw_plays, local_key=args.key, remote_key=args.remote_key
-        )
+    with create_backend(args) as backend:
+        if args.revocation_list:
+            logger.info("Signing revocation list.")
+            signed: list[dict] = [sign_revocation_list(raw_plays, backend)]
+        else:
+            logger.debug("Playbook contains %s plays.", len(raw_plays))
+            signed = sign_playbook(raw_plays, backend, jobs=args.jobs)
 
-    logger.debug(f"Playbook contains {len(raw_plays)} plays.")
-    return sign_playbook(raw_plays, local_key=args.key, remote_key=args.remote_key)
+    yaml.dump(signed, sys.stdout, sort_keys=False)
+    return len(raw_plays)
 
 
 def main() -> None:
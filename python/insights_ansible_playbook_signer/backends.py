@@ -0,0 +1,144 @@
+"""Backends signing the digests of plays.
+
+A backend gets the digest of a play and returns its armored detached
+signature. The signer may call a backend from several threads at once.
+
+- `LocalGPGBackend` signs with a private key file.
+- `RPMSignBackend` requests the signature from the signing server through
+  `rpm-sign`.
+"""
+
+import abc
+import logging
+import pathlib
+import subprocess
+import tempfile
+import threading
+import typing
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import crypto, tracing
+
+
+logger = logging.getLogger(__name__)
+
+
+def send_signing_request(play_digest: bytes, key: str) -> bytes:
+    """Use remote signing server to sign the digest.
+
+    :param play_digest: Hash of a play.
+    :param key: Name of the GPG key to use on the remote signing server.
+    """
+    logger.info("Requesting play signature from a signing server.")
+
+    with tempfile.TemporaryDirectory(
+        prefix=lib.TEMPORARY_STASH_DIRECTORY_PREFIX,
+        dir=lib.TEMPORARY_STASH_DIRECTORY,
+    ) as temp_dir:
+        tracing.count("temp_directories")
+        temp_path = pathlib.Path(temp_dir)
+
+        digest_file = temp_path / "digest"
+        digest_file.write_bytes(play_digest)
+
+        tracing.count("subprocesses")
+        with tracing.span("rpm-sign"):
+            subprocess.run(
+                ["rpm-sign", "--detachsign", "--key", key, "--nat", str(digest_file)],
+                check=True,
+                capture_output=True,
+            )
+
+        return (temp_path / "digest.asc").read_bytes()
+
+
+class SigningBackend(abc.ABC):
+    """Signer of play digests.
+
+    Backends are context managers; `close` releases what the signatures
+    were sharing.
+    """
+
+    name: str = ""
+
+    @abc.abstractmethod
+    def sign(self, digest: bytes) -> bytes:
+        """Get the armored detached signature of the digest.
+
+        :raises RuntimeError: The digest could not be signed.
+        """
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "SigningBackend":
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.close()
+
+
+class LocalGPGBackend(SigningBackend):
+    """Sign with a private key file.
+
+    The key is imported into a GPG home directory on the first signature;
+    each signature then only spawns a single GPG process.
+
+    :param key: Path to the private GPG key.
+    """
+
+    name = "local-gpg"
+
+    def __init__(self, key: pathlib.Path):
+        self.key: pathlib.Path = key
+        self._keyring: typing.Optional[crypto.GPGKeyring] = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> crypto.GPGKeyring:
+        with self._lock:
+            if self._keyring is None:
+                if not self.key.is_file():
+                    raise RuntimeError(f"Key '{self.key}' does not exist.")
+                keyring = crypto.GPGKeyring(self.key)
+                result: crypto.GPGCommandResult = keyring.open()
+                if not result.ok:
+                    keyring.close()
+                    raise RuntimeError(f"Could not import the key: {result}")
+                self._keyring = keyring
+            return self._keyring
+
+    def sign(self, digest: bytes) -> bytes:
+        keyring: crypto.GPGKeyring = self._open()
+        with tempfile.TemporaryDirectory(
+            prefix=lib.TEMPORARY_STASH_DIRECTORY_PREFIX,
+            dir=lib.TEMPORARY_STASH_DIRECTORY,
+        ) as temp_dir:
+            tracing.count("temp_directories")
+            digest_file = pathlib.Path(temp_dir) / "digest"
+            digest_file.write_bytes(digest)
+
+            result: crypto.GPGCommandResult = keyring.sign(digest_file)
+            if not result.ok:
+                raise RuntimeError(f"Could not sign the digest: {result}")
+            return (pathlib.Path(temp_dir) / "digest.asc").read_bytes()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._keyring is not None:
+                self._keyring.close()
+                self._keyring = None
+
+
+class RPMSignBackend(SigningBackend):
+    """Request the signatures from the signing server through `rpm-sign`.
+
+    :param key: Name of the GPG key on the signing server.
+    """
+
+    name = "rpm-sign"
+
+    def __init__(self, key: str):
+        self.key: str = key
+
+    def sign(self, digest: bytes) -> bytes:
+        return send_signing_request(digest, key=self.key)
@@ -1,20 +1,35 @@
 import argparse
 import contextlib
+import dataclasses
 import logging
 import pathlib
-import pkgutil
 import sys
 import traceback
-
-import importlib.metadata
+import typing
 
 import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import artifacts, tracing
+from insights_ansible_playbook_lib.cli import (
+    VersionAction,
+    add_instrumentation_arguments,
+    start_metrics,
+    start_trace,
+)
+
+if typing.TYPE_CHECKING:
+    from insights_ansible_playbook_lib import metrics
 
 logger = logging.getLogger(__name__)
 
 
+# Suffixes of keys found in key directories.
+KEY_SUFFIXES: tuple[str, ...] = (".gpg", ".asc")
+
+
 def read_revocation_playbook_from_package() -> str:
     """Read revocation playbook content saved in the package."""
+    import pkgutil
+
     data: str = pkgutil.get_data(
         "insights_ansible_playbook_verifier",
         "data/revoked_playbooks.yml",
@@ -24,6 +39,8 @@ def read_revocation_playbook_from_package() -> str:
 
 def get_gpg_key_from_package() -> bytes:
     """Read the public GPG key to verify the plays with."""
+    import pkgutil
+
     data: bytes = pkgutil.get_data(
         "insights_ansible_playbook_verifier",
         "data/public.gpg",
@@ -31,99 +48,382 @@ def get_gpg_key_from_package() -> bytes:
     return data
 
 
-def get_version_from_package() -> str:
-    """Read the package metadata to obtain version."""
-    try:
-        version = importlib.metadata.version("insights-ansible-playbook-verifier")
-    except ImportError:
-        version = "unknown"
-    return version
+def collect_key_files(paths: typing.Iterable[pathlib.Path]) -> list[pathlib.Path]:
+    """List the files of the trusted keys.
+
+    :param paths: Paths to public GPG keys, or to directories containing them.
+    """
+    result: list[pathlib.Path] = []
+    for path in paths:
+        if path.is_dir():
+            result.extend(
+                sorted(
+                    file
+                    for file in path.iterdir()
+                    if file.suffix in KEY_SUFFIXES and file.is_file()
+                )
+            )
+        else:
+            result.append(path)
+    return result
+
+
+def read_keys(paths: typing.Iterable[pathlib.Path]) -> lib.KeyIndex:
+    """Read the trusted public GPG keys.
+
+    :param paths: Paths to keys or to directories containing them; when
+        empty, the key saved in the package is used.
+    :raises RuntimeError: The directories do not contain any key.
+    """
+    paths = list(paths)
+    if not paths:
+        return lib.KeyIndex([get_gpg_key_from_package()])
+
+    with tracing.span("read_keys"):
+        files: list[pathlib.Path] = collect_key_files(paths)
+        if not files:
+            raise RuntimeError("No GPG keys were found.")
+        for file in files:
+            logger.debug("Trusting GPG key '%s'.", file)
+        return lib.KeyIndex(file.read_bytes() for file in files)
+
+
+def read_revocation_list(revocation_list: typing.Optional[pathlib.Path]) -> str:
+    """Read the playbook containing digests of revoked plays.
+
+    :param revocation_list: Path to custom revocation list, or None to use the packaged one.
+    """
+    if revocation_list is None:
+        logger.debug("Using packaged play revocation list.")
+        return read_revocation_playbook_from_package()
+    logger.debug("Using revocation list '%s'.", revocation_list.absolute())
+    return revocation_list.read_text()
+
+
+def read_playbook(args: argparse.Namespace, limits: lib.Limits) -> str:
+    """Read the playbook with plays to verify.
+
+    Do not read more than the limit allows, the input is not trusted yet.
+
+    :raises LimitExceededError: The playbook is too large.
+    :raises RuntimeError: The playbook is empty.
+    """
+    raw_playbook: str
+    if args.stdin:
+        # Read bytes, characters may take up to four bytes each
+        data: bytes = b""
+        with contextlib.suppress(KeyboardInterrupt):
+            data = sys.stdin.buffer.read(limits.max_input_bytes + 1)
+        limits.check_input(data)
+        raw_playbook = data.decode("utf-8")
+    else:
+        playbook_path: pathlib.Path = args.playbook[0]
+        if playbook_path.stat().st_size > limits.max_input_bytes:
+            raise lib.LimitExceededError(
+                f"Playbook is larger than {limits.max_input_bytes} bytes."
+            )
+        raw_playbook = playbook_path.read_text()
+    limits.check_input(raw_playbook)
+    if len(raw_playbook) == 0:
+        logger.error("Received empty playbook.")
+        raise RuntimeError("Received empty playbook.")
+    return raw_playbook
+
+
+def explain_playbook_cost(
+    raw_playbook: str, limits: lib.Limits, output_format: str = "text"
+) -> None:
+    """Print the canonicalization cost of each play of the playbook.
+
+    :param output_format: Either 'text' or 'json'.
+    """
+    import json
+
+    from insights_ansible_playbook_lib import cost
+
+    costs: list[cost.PlayCost] = [
+        lib.explain_cost(play, limits=limits)
+        for play in lib.iter_playbook(raw_playbook, limits=limits)
+    ]
+    if output_format == "json":
+        print(json.dumps([dataclasses.asdict(item) for item in costs], indent=2))
+    else:
+        print("\n\n".join(cost.format_cost(item) for item in costs))
+
+
+def create_limits(args: argparse.Namespace) -> lib.Limits:
+    """Build the limits from command line arguments."""
+    return lib.Limits(
+        max_input_bytes=args.max_input_bytes,
+        max_alias_expansions=args.max_alias_expansions,
+        max_depth=args.max_depth,
+        max_nodes=args.max_nodes,
+        max_scalar_length=args.max_scalar_length,
+        max_serialized_length=args.max_serialized_length,
+    )
 
 
 def run() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument(
         "--version",
-        action="version",
-        version=get_version_from_package(),
+        action=VersionAction,
     )
     parser.add_argument(
         "--debug",
         action="store_true",
         help="Display logs",
     )
+    parser.add_argument(
+        "--explain-cost",
+        nargs="?",
+        const="text",
+        choices=("text", "json"),
+        metavar="FORMAT",
+        help=(
+            "Print the canonicalization cost of each play instead of verifying "
+            "the playbook, as 'text' (the default) or 'json'"
+        ),
+    )
+    parser.add_argument(
+        "--artifacts-dir",
+        type=pathlib.Path,
+        metavar="DIR",
+        help="Save the full content of plays failing the verification to the directory",
+    )
     parser.add_argument(
         "--key",
         type=pathlib.Path,
-        help="Path to custom GPG key to verify against",
+        action="append",
+        help=(
+            "Path to custom GPG key, or directory of keys, to verify against; "
+            "may be used repeatedly to trust several keys"
+        ),
     )
     playbook = parser.add_mutually_exclusive_group(required=True)
     playbook.add_argument(
         "--playbook",
         type=pathlib.Path,
-        help="Path to playbook to load",
+        action="append",
+        help=(
+            "Path to playbook to load; when used repeatedly, "
+            "a JSON Lines report of all playbooks is printed"
+        ),
+    )
+    playbook.add_argument(
+        "--input-dir",
+        type=pathlib.Path,
+        metavar="DIR",
+        help="Verify all playbooks in the directory, printing a JSON Lines report",
     )
     playbook.add_argument(
         "--stdin",
         action="store_true",
         help="Load playbook from stdin (the default)",
     )
+    playbook.add_argument(
+        "--serve",
+        type=pathlib.Path,
+        metavar="SOCKET",
+        help="Run as a daemon verifying playbooks sent to the Unix socket",
+    )
+    parser.add_argument(
+        "--socket",
+        type=pathlib.Path,
+        help="Verify the playbook using the daemon listening on the socket, if it exists",
+    )
     parser.add_argument(
         "--revocation-list",
         type=pathlib.Path,
         help=argparse.SUPPRESS,
     )
+    bulk_group = parser.add_argument_group("bulk verification")
+    bulk_group.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of processes parsing the playbooks (default: %(default)s)",
+    )
+    bulk_group.add_argument(
+        "--chunk-size",
+        type=int,
+        default=16,
+        metavar="N",
+        help="Number of playbooks sent to a process at once (default: %(default)s)",
+    )
+    limit_group = parser.add_argument_group("limits")
+    limit_group.add_argument(
+        "--max-input-bytes",
+        type=int,
+        default=lib.DEFAULT_LIMITS.max_input_bytes,
+        metavar="N",
+        help="Maximal size of the playbook (default: %(default)s)",
+    )
+    limit_group.add_argument(
+        "--max-alias-expansions",
+        type=int,
+        default=lib.DEFAULT_LIMITS.max_alias_expansions,
+        metavar="N",
+        help="Maximal number of expanded YAML aliases (default: %(default)s)",
+    )
+    limit_group.add_argument(
+        "--max-depth",
+        type=int,
+        default=lib.DEFAULT_LIMITS.max_depth,
+        metavar="N",
+        help="Maximal nesting of the playbook (default: %(default)s)",
+    )
+    limit_group.add_argument(
+        "--max-nodes",
+        type=int,
+        default=lib.DEFAULT_LIMITS.max_nodes,
+        metavar="N",
+        help="Maximal number of YAML nodes, including expanded aliases (default: %(default)s)",
+    )
+    limit_group.add_argument(
+        "--max-scalar-length",
+        type=int,
+        default=lib.DEFAULT_LIMITS.max_scalar_length,
+        metavar="N",
+        help="Maximal length of a single value (default: %(default)s)",
+    )
+    limit_group.add_argument(
+        "--max-serialized-length",
+        type=int,
+        default=lib.DEFAULT_LIMITS.max_serialized_length,
+        metavar="N",
+        help=(
+            "Maximal length of the values of a play, including expanded YAML "
+            "aliases (default: %(default)s)"
+        ),
+    )
+    add_instrumentation_arguments(parser)
     args = parser.parse_args()
+    if args.explain_cost is not None and (
+        args.input_dir is not None
+        or args.serve is not None
+        or len(args.playbook or []) > 1
+    ):
+        parser.error(
+            "--explain-cost needs a single playbook, from --playbook or --stdin"
+        )
+    if args.socket is not None and (
+        args.key is not None or args.revocation_list is not None
+    ):
+        # The daemon verifies with the key and revocation list it was started with
+        parser.error("--socket cannot be combined with --key or --revocation-list")
+    if args.socket is not None and (
+        args.input_dir is not None or len(args.playbook or []) > 1
+    ):
+        parser.error("--socket needs a single playbook, from --playbook or --stdin")
+    start_trace(args)
+    if args.artifacts_dir is not None:
+        artifacts.ARTIFACTS_DIRECTORY = str(args.artifacts_dir)
+    collector: typing.Optional["metrics.Metrics"] = start_metrics(
+        args, "insights_ansible_playbook_verifier"
+    )
+    limits: lib.Limits = create_limits(args)
 
-    # Load public GPG key
-    gpg_key: bytes = args.key.read_bytes() if args.key else get_gpg_key_from_package()
+    try:
+        verify(args, limits, collector)
+    except Exception:
+        # Rejected playbooks have been recorded already
+        if collector is not None and not collector.playbooks:
+            collector.observe_playbook("error")
+        raise
 
-    digests: set[bytes]
-    # Load digests of revoked plays
-    if args.revocation_list is None:
-        logger.debug("Using packaged play revocation list.")
-        digests = lib.get_revocation_digests(
-            playbook=read_revocation_playbook_from_package(),
-            gpg_key=gpg_key,
-        )
-    else:
-        logger.debug(
-            f"Using custom revocation list '{args.revocation_list.absolute()}'."
-        )
-        digests = lib.get_revocation_digests(
-            playbook=args.revocation_list.read_text(),
-            gpg_key=gpg_key,
+
+def verify(
+    args: argparse.Namespace,
+    limits: lib.Limits,
+    collector: typing.Optional["metrics.Metrics"] = None,
+) -> None:
+    """Verify the playbooks as requested on the command line.
+
+    :param collector: Metrics to record the verified playbooks in.
+    """
+    if args.serve is not None:
+        from insights_ansible_playbook_verifier import server
+
+        server.serve(
+            args.serve,
+            key_paths=args.key or [server.get_package_file("public.gpg")],
+            revocation_path=(
+                args.revocation_list or server.get_package_file("revoked_playbooks.yml")
+            ),
+            limits=limits,
         )
-    logger.debug("Revocation digests obtained, can proceed to verification.")
+        return
 
-    # Load playbook with plays to verify
-    raw_playbook: str
-    if args.stdin:
-        with contextlib.suppress(KeyboardInterrupt):
-            raw_playbook = sys.stdin.read()
-    else:
-        raw_playbook = pathlib.Path(args.playbook).read_text()
-    if len(raw_playbook) == 0:
-        logger.error("Received empty playbook.")
-        raise RuntimeError("Received empty playbook.")
+    if args.explain_cost is not None:
+        explain_playbook_cost(read_playbook(args, limits), limits, args.explain_cost)
+        return
 
-    # Load plays
-    plays: list[dict] = lib.parse_playbook(raw_playbook)
-    if not plays:
-        raise lib.PreconditionError("Playbook contains no plays.")
-    logger.debug(f"Playbook contains {len(plays)} play(s).")
-
-    # Verify plays
-    for i, play in enumerate(plays, 1):
-        play_name: str = play.get("name", "???")
-        digest: bytes = lib.verify_play(play, gpg_key=gpg_key)
-        if digest in digests:
-            raise RuntimeError(
-                f"Digest of play '{play_name}' is on revocation list: '{bytearray(digest).hex()}'."
-            )
+    raw_playbook: typing.Optional[str] = None
+    if args.socket is not None and args.socket.exists():
+        from insights_ansible_playbook_verifier import server
+
+        raw_playbook = read_playbook(args, limits)
+        try:
+            plays: list[dict] = server.verify_remotely(args.socket, raw_playbook)
+        except server.DaemonUnavailableError as exc:
+            logger.warning("%s Verifying the playbook locally.", exc)
+        except RuntimeError:
+            if collector is not None:
+                collector.observe_playbook("rejected")
+            raise
         else:
-            logger.debug(f"Play {i}/{len(plays)} ('{play_name}'): OK.")
+            if collector is not None:
+                collector.observe_playbook("ok", len(plays))
+            logger.info("All plays are OK.")
+            print(raw_playbook)
+            return
+
+    # Load public GPG keys
+    keys: lib.KeyIndex = read_keys(args.key or [])
+
+    if args.input_dir is not None or len(args.playbook or []) > 1:
+        from insights_ansible_playbook_verifier import bulk
+
+        paths: list[pathlib.Path] = bulk.collect_paths(
+            args.playbook or [], args.input_dir
+        )
+        with lib.Verifier(
+            keys.gpg_keys,
+            revocation_list=read_revocation_list(args.revocation_list),
+            limits=limits,
+            jobs=bulk.BULK_JOBS,
+        ) as bulk_verifier:
+            ok: bool = bulk.run(
+                paths,
+                bulk_verifier,
+                output=sys.stdout,
+                processes=args.processes,
+                chunk_size=args.chunk_size,
+                collector=collector,
+            )
+        if not ok:
+            sys.exit(1)
+        return
+
+    # The revocation list is verified while the playbook is being read and parsed
+    with lib.Verifier(
+        keys.gpg_keys,
+        revocation_list=read_revocation_list(args.revocation_list),
+        limits=limits,
+    ) as playbook_verifier:
+        if raw_playbook is None:
+            raw_playbook = read_playbook(args, limits)
+        verdict: lib.PlaybookVerdict = playbook_verifier.verify_playbook(raw_playbook)
+    if collector is not None:
+        collector.observe_playbook(
+            "ok" if verdict.ok else "rejected", len(verdict.plays)
+        )
+    verdict.raise_for_error()
 
+    for play in verdict.plays:
+        logger.debug("Play %s ('%s'): OK.", play.index + 1, play.name)
     logger.info("All plays are OK.")
     print(raw_playbook)
 
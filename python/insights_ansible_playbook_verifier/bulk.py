@@ -0,0 +1,191 @@
+"""Verification of many playbooks in a single process.
+
+All playbooks are verified by a single `Verifier`, which shares the trusted
+keys, the verified revocation list and the GPG keyring. Unlike the single
+playbook verification, every play is verified even when another one fails,
+and the result is reported as JSON Lines, one record per play followed by
+one record per file:
+
+    {"type": "play", "file": "a.yml", "index": 0, "name": "...",
+     "status": "ok", "digest": "<hex>", "revoked": false, "reason": null,
+     "seconds": 0.01}
+    {"type": "file", "file": "a.yml", "status": "ok", "plays": 1,
+     "reason": null, "seconds": 0.02}
+
+The seconds of a play are spent canonicalizing it, those of a file also
+include the verification of its plays.
+"""
+
+import collections
+import concurrent.futures
+import json
+import logging
+import pathlib
+import time
+import typing
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import parallel
+from insights_ansible_playbook_lib import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+# Number of plays, and of playbooks, verified at once.
+BULK_JOBS: int = 8
+
+# Suffixes of playbooks found in input directories.
+PLAYBOOK_SUFFIXES: tuple[str, ...] = (".yml", ".yaml")
+
+
+def collect_paths(
+    playbooks: typing.Iterable[pathlib.Path],
+    input_dir: typing.Optional[pathlib.Path] = None,
+) -> list[pathlib.Path]:
+    """List the playbooks to verify.
+
+    :param playbooks: Paths to playbooks.
+    :param input_dir: Directory searched recursively for playbooks.
+    """
+    paths: list[pathlib.Path] = list(playbooks)
+    if input_dir is not None:
+        if not input_dir.is_dir():
+            raise RuntimeError(f"Input directory '{input_dir}' does not exist.")
+        paths.extend(
+            sorted(
+                path
+                for path in input_dir.rglob("*")
+                if path.suffix in PLAYBOOK_SUFFIXES and path.is_file()
+            )
+        )
+    return paths
+
+
+def _verify_file(result: parallel.PlaybookResult, verifier: lib.Verifier) -> list[dict]:
+    """Verify the canonicalized plays, describing the results as records."""
+    start: float = time.perf_counter()
+    verdict: typing.Optional[lib.PlaybookVerdict] = None
+    if result.plays:
+        verdict = verifier.verify_canonical_plays(
+            [
+                play.play
+                if play.play is not None
+                else lib.PlayVerdict(
+                    index=play.index,
+                    name=play.name,
+                    error=lib.PreconditionError(play.error),
+                )
+                for play in result.plays
+            ],
+            verify_all=True,
+        )
+    records: list[dict] = [
+        {
+            "type": "play",
+            "file": str(result.path),
+            "index": play.index,
+            "name": play.name,
+            "status": "ok" if play.ok else "failed",
+            "digest": None
+            if play_result.play is None
+            else play_result.play.digest.hex(),
+            "revoked": play.revoked,
+            "reason": None if play.error is None else str(play.error),
+            "seconds": round(play_result.seconds, 6),
+        }
+        for play, play_result in zip(
+            verdict.plays if verdict is not None else (), result.plays
+        )
+    ]
+    reason: typing.Optional[str] = result.error
+    if reason is None and verdict is not None and not verdict.ok:
+        reason = "Some plays failed the verification."
+    records.append(
+        {
+            "type": "file",
+            "file": str(result.path),
+            "status": "ok" if reason is None else "failed",
+            "plays": len(records),
+            "reason": reason,
+            "seconds": round(result.seconds + time.perf_counter() - start, 6),
+        }
+    )
+    return records
+
+
+def verify_files(
+    paths: list[pathlib.Path],
+    verifier: lib.Verifier,
+    jobs: int = BULK_JOBS,
+    processes: int = 1,
+    chunk_size: int = parallel.CHUNK_SIZE,
+) -> typing.Iterator[dict]:
+    """Verify the playbooks.
+
+    The playbooks are canonicalized in worker processes, if requested, while
+    their signatures are verified by the verifier in the current process.
+
+    :param verifier: Verifier of all playbooks; its limits apply to them.
+    :param jobs: Number of playbooks verified concurrently.
+    :param processes: Number of processes canonicalizing the playbooks.
+    :param chunk_size: Number of playbooks sent to a worker process at once.
+    :raises Exception: The key or the revocation list could not be loaded.
+    :returns: Records of the plays and files, in order of the paths.
+    """
+    # Problems with the key or the revocation list are reported first
+    verifier.wait()
+    pending: collections.deque[concurrent.futures.Future[list[dict]]] = (
+        collections.deque()
+    )
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=jobs, thread_name_prefix="bulk"
+    ) as executor:
+        for result in parallel.canonicalize_files(
+            paths, processes=processes, chunk_size=chunk_size, limits=verifier.limits
+        ):
+            logger.debug("Verifying playbook '%s'.", result.path)
+            pending.append(executor.submit(_verify_file, result, verifier))
+            # Keep the verification busy, but do not queue the whole corpus
+            while len(pending) > jobs * 4:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def run(
+    paths: list[pathlib.Path],
+    verifier: lib.Verifier,
+    output: typing.TextIO,
+    processes: int = 1,
+    chunk_size: int = parallel.CHUNK_SIZE,
+    collector: typing.Optional[metrics.Metrics] = None,
+) -> bool:
+    """Write the report of the playbooks as JSON Lines.
+
+    :param collector: Metrics to record the verified playbooks in.
+    :returns: `True` if all playbooks were verified.
+    """
+    files: int = 0
+    failed: int = 0
+    for record in verify_files(
+        paths,
+        verifier,
+        processes=processes,
+        chunk_size=chunk_size,
+    ):
+        output.write(json.dumps(record) + "\n")
+        if record["type"] == "file":
+            files += 1
+            failed += record["status"] != "ok"
+            if collector is not None:
+                collector.observe_playbook(
+                    "ok" if record["status"] == "ok" else "rejected", record["plays"]
+                )
+    output.flush()
+
+    if failed:
+        logger.error("%s of %s playbooks failed the verification.", failed, files)
+    else:
+        logger.info("All %s playbooks are OK.", files)
+    return failed == 0
@@ -0,0 +1,359 @@
+"""Verification daemon listening on a local Unix socket.
+
+The daemon keeps a `Verifier`, with the verified revocation list and a
+keyring with the key imported, in memory, so a request only pays for
+parsing the playbook and for a single GPG process per play.
+
+Messages are framed by `insights_ansible_playbook_lib.protocol`.
+The client sends the playbook encoded in UTF-8 and receives a JSON object:
+
+    {
+        "ok": true,
+        "plays": [{"name": "...", "digest": "<hex>"}],
+        "error": null
+    }
+
+`plays` lists the plays verified before the first failure; `error` is the
+message the command line verifier would have printed.
+"""
+
+import contextlib
+import dataclasses
+import json
+import logging
+import os
+import pathlib
+import socket
+import socketserver
+import struct
+import threading
+import typing
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import protocol
+from insights_ansible_playbook_verifier import app
+
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds the client waits for the daemon to verify the playbook.
+CLIENT_TIMEOUT: float = 60.0
+
+# Permissions of the socket; only the owner and its group may send playbooks.
+SOCKET_MODE: int = 0o660
+
+# Credentials of the peer of a Unix socket: process, user and group IDs.
+PEER_CREDENTIALS = struct.Struct("3i")
+
+
+class DaemonUnavailableError(RuntimeError):
+    pass
+
+
+def get_package_file(name: str) -> pathlib.Path:
+    """Get the path of a data file saved in the package."""
+    return pathlib.Path(__file__).parent / "data" / name
+
+
+@dataclasses.dataclass
+class _Snapshot:
+    """Key and revocation list loaded at one point in time.
+
+    :param stamp: Identification of the key and revocation list files.
+    :param verifier: Verifier with the key and the revocation list loaded.
+    :param users: Number of requests using the snapshot.
+    :param retired: The files have changed, the snapshot is not used by new requests.
+    """
+
+    stamp: tuple
+    verifier: lib.Verifier
+    users: int = 0
+    retired: bool = False
+
+
+class VerificationState:
+    """Key and revocation list shared by the requests.
+
+    Both are reloaded when their files change on disk, or when keys are
+    added to or removed from a key directory. Requests still
+    using the previous verifier keep it until they finish.
+
+    :param key_paths: Paths to the public GPG keys or to directories containing them.
+    :param revocation_path: Path to the revocation list.
+    :param limits: Limits of parsing and serialization.
+    """
+
+    def __init__(
+        self,
+        key_paths: list[pathlib.Path],
+        revocation_path: pathlib.Path,
+        limits: lib.Limits,
+    ):
+        self.key_paths: list[pathlib.Path] = key_paths
+        self.revocation_path: pathlib.Path = revocation_path
+        self.limits: lib.Limits = limits
+        self._lock = threading.Lock()
+        # Held while the files are loaded, so that they are loaded only once
+        self._reload_lock = threading.Lock()
+        self._snapshot: typing.Optional[_Snapshot] = None
+
+    def _stamp(self) -> tuple:
+        result = []
+        for path in [*app.collect_key_files(self.key_paths), self.revocation_path]:
+            stat: os.stat_result = path.stat()
+            result.append((path, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        return tuple(result)
+
+    def _load(self, stamp: tuple) -> _Snapshot:
+        logger.info("Loading the GPG key and the revocation list.")
+        verifier = lib.Verifier(
+            app.read_keys(self.key_paths).gpg_keys,
+            revocation_list=self.revocation_path.read_text(),
+            limits=self.limits,
+        )
+        try:
+            verifier.wait()
+        except Exception:
+            verifier.close()
+            raise
+        return _Snapshot(stamp=stamp, verifier=verifier)
+
+    def _retire(self, snapshot: _Snapshot) -> None:
+        snapshot.retired = True
+        if snapshot.users == 0:
+            snapshot.verifier.close()
+
+    def _current(self) -> _Snapshot:
+        """Get the snapshot matching the files on disk, loading it if needed.
+
+        The files are examined and loaded outside of the lock, so requests
+        using the current snapshot never wait for a reload.
+        """
+        stamp: tuple = self._stamp()
+        with self._lock:
+            if self._snapshot is not None and self._snapshot.stamp == stamp:
+                self._snapshot.users += 1
+                return self._snapshot
+
+        with self._reload_lock:
+            # Another request may have loaded the files in the meantime
+            stamp = self._stamp()
+            with self._lock:
+                if self._snapshot is not None and self._snapshot.stamp == stamp:
+                    self._snapshot.users += 1
+                    return self._snapshot
+                if self._snapshot is not None:
+                    logger.info("The GPG key or the revocation list has changed.")
+
+            snapshot: _Snapshot = self._load(stamp)
+            with self._lock:
+                if self._snapshot is not None:
+                    self._retire(self._snapshot)
+                self._snapshot = snapshot
+                snapshot.users += 1
+            return snapshot
+
+    @contextlib.contextmanager
+    def acquire(self) -> typing.Iterator[_Snapshot]:
+        """Get the current key and revocation list, reloading them if needed.
+
+        :raises Exception: The changed files could not be loaded.
+        """
+        snapshot: _Snapshot = self._current()
+        try:
+            yield snapshot
+        finally:
+            with self._lock:
+                snapshot.users -= 1
+                if snapshot.retired and snapshot.users == 0:
+                    snapshot.verifier.close()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._snapshot is not None:
+                self._retire(self._snapshot)
+                self._snapshot = None
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    server: "VerificationServer"
+
+    def handle(self) -> None:
+        try:
+            payload: bytes = protocol.receive_message(
+                self.request, max_size=self.server.state.limits.max_input_bytes
+            )
+        except protocol.ProtocolError as exc:
+            logger.warning("Rejecting request: %s", exc)
+            response: dict = {"ok": False, "plays": [], "error": str(exc)}
+        else:
+            response = self.server.verify(payload)
+        try:
+            protocol.send_message(self.request, json.dumps(response).encode("utf-8"))
+        except OSError as exc:
+            # The client has gone away, e.g. a daemon checking the socket is in use
+            logger.debug("Could not answer the request: %s", exc)
+
+
+class VerificationServer(socketserver.ThreadingUnixStreamServer):
+    """Server verifying playbooks concurrently, one thread per connection.
+
+    :param socket_path: Path of the Unix socket to listen on.
+    :param state: Key and revocation list to verify the playbooks with.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: pathlib.Path, state: VerificationState):
+        self.state: VerificationState = state
+        self.socket_path: pathlib.Path = socket_path
+        super().__init__(str(socket_path), _Handler)
+
+    def server_bind(self) -> None:
+        super().server_bind()
+        # Do not depend on the umask of the daemon
+        self.socket_path.chmod(SOCKET_MODE)
+
+    def verify(self, payload: bytes) -> dict:
+        """Verify the playbook, describing the result of each play."""
+        plays: list[dict] = []
+        try:
+            with self.state.acquire() as snapshot:
+                verdict: lib.PlaybookVerdict = snapshot.verifier.verify_playbook(
+                    payload
+                )
+            for play in verdict.plays:
+                if not play.ok or play.digest is None:
+                    break
+                plays.append({"name": play.name, "digest": play.digest.hex()})
+            verdict.raise_for_error()
+        except Exception as exc:
+            logger.debug("Playbook was rejected: %s", exc)
+            return {"ok": False, "plays": plays, "error": str(exc)}
+        return {"ok": True, "plays": plays, "error": None}
+
+
+def _is_listening(socket_path: pathlib.Path) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            return False
+    return True
+
+
+def serve(
+    socket_path: pathlib.Path,
+    key_paths: list[pathlib.Path],
+    revocation_path: pathlib.Path,
+    limits: lib.Limits,
+) -> None:
+    """Verify playbooks sent to the Unix socket until interrupted.
+
+    The key and the revocation list are loaded before the socket is
+    created, so that clients never connect to a daemon that cannot verify.
+    """
+    state = VerificationState(key_paths, revocation_path, limits)
+    with state.acquire():
+        pass
+
+    if socket_path.is_socket():
+        if _is_listening(socket_path):
+            raise RuntimeError(f"A daemon is already listening on '{socket_path}'.")
+        logger.debug("Removing stale socket '%s'.", socket_path)
+        socket_path.unlink()
+
+    try:
+        with VerificationServer(socket_path, state) as server:
+            logger.info("Listening on '%s'.", socket_path)
+            with contextlib.suppress(KeyboardInterrupt):
+                server.serve_forever()
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            socket_path.unlink()
+        state.close()
+
+
+def _trusted_uids() -> set[int]:
+    """Get the users whose daemon may verify playbooks of this process."""
+    return {0, os.geteuid()}
+
+
+def _check_daemon(sock: socket.socket, socket_path: pathlib.Path) -> None:
+    """Ensure the daemon is run by root or by the current user.
+
+    :raises DaemonUnavailableError: The socket or the daemon belongs to
+        another user.
+    """
+    trusted: set[int] = _trusted_uids()
+    owner: int = socket_path.stat().st_uid
+    if owner not in trusted:
+        raise DaemonUnavailableError(
+            f"Socket '{socket_path}' is owned by an untrusted user {owner}."
+        )
+    _, uid, _ = PEER_CREDENTIALS.unpack(
+        sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEER_CREDENTIALS.size)
+    )
+    if uid not in trusted:
+        raise DaemonUnavailableError(
+            f"Daemon at '{socket_path}' is run by an untrusted user {uid}."
+        )
+
+
+def _parse_response(payload: bytes) -> dict:
+    """Parse the response of the daemon, ensuring it has the expected shape.
+
+    :raises ValueError: The response is not valid.
+    """
+    response: typing.Any = json.loads(payload)
+    if not isinstance(response, dict) or not isinstance(response.get("ok"), bool):
+        raise ValueError("Response does not contain the result.")
+    if not response["ok"] and not isinstance(response.get("error"), str):
+        raise ValueError("Response does not contain the error.")
+    plays: typing.Any = response.get("plays")
+    if not isinstance(plays, list) or not all(
+        isinstance(play, dict)
+        and isinstance(play.get("name"), str)
+        and isinstance(play.get("digest"), str)
+        for play in plays
+    ):
+        raise ValueError("Response does not contain the plays.")
+    return response
+
+
+def verify_remotely(
+    socket_path: pathlib.Path, raw_playbook: str, timeout: float = CLIENT_TIMEOUT
+) -> list[dict]:
+    """Verify the playbook using the daemon.
+
+    :raises DaemonUnavailableError: The daemon cannot be reached, is not run
+        by root or by the current user, or its answer is not valid.
+    :raises RuntimeError: The daemon rejected the playbook.
+    :returns: Name and digest of each play.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(socket_path))
+        except OSError as exc:
+            raise DaemonUnavailableError(
+                f"Could not connect to the daemon at '{socket_path}': {exc}."
+            ) from exc
+
+        logger.debug("Sending playbook to the daemon at '%s'.", socket_path)
+        try:
+            _check_daemon(sock, socket_path)
+            protocol.send_message(sock, raw_playbook.encode("utf-8"))
+            response: dict = _parse_response(
+                protocol.receive_message(sock, max_size=2**32 - 1)
+            )
+        except (OSError, protocol.ProtocolError, ValueError) as exc:
+            raise DaemonUnavailableError(
+                f"The daemon at '{socket_path}' did not answer: {exc}."
+            ) from exc
+
+    if not response["ok"]:
+        raise RuntimeError(response["error"])
+    plays: list[dict] = response["plays"]
+    return plays
@@ -3,84 +3,35 @@ import pathlib
 import shutil
 import subprocess
 import tempfile
+import typing
 
 import pytest
 
-DATA_DIRECTORY = pathlib.Path(__file__).parents[2].absolute() / "data"
+from insights_ansible_playbook_lib import _keygen
 
-_GPG_INSTRUCTIONS = """
-Key-Type: EDDSA
-  Key-Curve: ed25519
-Subkey-Type: ECDH
-  Subkey-Curve: cv25519
-Name-Real: Integration test key
-Expire-Date: 0
-%no-protection
-%commit
-"""
+DATA_DIRECTORY = pathlib.Path(__file__).parents[2].absolute() / "data"
 
 
 @pytest.fixture
-def ephemeral_gpg_keys(tmp_path: pathlib.Path) -> None:
-    """Generate public and private GPG keys.
+def ephemeral_gpg_keys(
+    tmp_path: pathlib.Path, request: pytest.FixtureRequest
+) -> typing.Iterator[tuple[pathlib.Path, pathlib.Path]]:
+    """Save throwaway public and private GPG keys.
+
+    The key pair is generated once and reused by later runs from the pytest
+    cache, if the cache plugin is enabled.
 
     :yields: Tuple of paths to private and public GPG key.
     """
-    # Create fresh GPG keys
-    instructions_file = tmp_path / "instructions"
-    instructions_file.write_text(_GPG_INSTRUCTIONS)
-    genkey = subprocess.run(
-        [
-            "gpg",
-            "--batch",
-            "--generate-key",
-            "--pinentry-mode",
-            "loopback",
-            instructions_file,
-        ],
-        input=os.devnull,
-        capture_output=True,
-        check=False,
-        text=True,
-        env={"GNUPGHOME": str(tmp_path)},
+    cache: typing.Optional[pytest.Cache] = getattr(request.config, "cache", None)
+    directory: pathlib.Path = (
+        tmp_path / "gpg-keys"
+        if cache is None
+        else pathlib.Path(cache.mkdir("gpg-keys"))
     )
-    print(genkey.stderr)
-    genkey.check_returncode()
-
-    # Save the public key
-    pubkey = subprocess.run(
-        ["gpg", "--export", "--armor"],
-        capture_output=True,
-        check=False,
-        text=True,
-        env={"GNUPGHOME": str(tmp_path)},
-    )
-    print(pubkey.stderr)
-    pubkey.check_returncode()
-    gpg_public = tmp_path / "public.gpg"
-    gpg_public.write_text(pubkey.stdout)
-
-    # Save the private key
-    privkey = subprocess.run(
-        [
-            "gpg",
-            "--export-secret-keys",
-            "--pinentry-mode",
-            "loopback",
-            "--yes",
-            "--armor",
-        ],
-        capture_output=True,
-        check=False,
-        text=True,
-        env={"GNUPGHOME": str(tmp_path)},
-    )
-    print(privkey.stderr)
-    privkey.check_returncode()
-    gpg_private = tmp_path / "private.gpg"
-    gpg_private.write_text(privkey.stdout)
-
-    yield gpg_private, gpg_public
+    (key_pair,) = _keygen.cached_key_pairs(directory, 1)
+    key_pair.write(tmp_path)
+    yield tmp_path / "key.private.gpg", tmp_path / "key.public.gpg"
 
 
 @pytest.mark.skipif(
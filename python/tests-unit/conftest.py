@@ -0,0 +1,28 @@
+import pathlib
+import typing
+
+import pytest
+
+from insights_ansible_playbook_lib import _keygen
+
+
+@pytest.fixture(scope="session")
+def key_cache(
+    request: pytest.FixtureRequest, tmp_path_factory: pytest.TempPathFactory
+) -> pathlib.Path:
+    """Get the directory of key pairs reused across runs, in the pytest cache.
+
+    Without the cache plugin (`-p no:cacheprovider`), the key pairs are only
+    reused within the run.
+    """
+    cache: typing.Optional[pytest.Cache] = getattr(request.config, "cache", None)
+    if cache is None:
+        return tmp_path_factory.mktemp("gpg-keys")
+    return pathlib.Path(cache.mkdir("gpg-keys"))
+
+
+@pytest.fixture(scope="session")
+def key_pair(key_cache: pathlib.Path) -> _keygen.KeyPair:
+    """Get a throwaway key pair."""
+    (result,) = _keygen.cached_key_pairs(key_cache, 1)
+    return result
@@ -0,0 +1,87 @@
+import logging
+import pathlib
+import unittest.mock
+
+import pytest
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import artifacts
+
+
+DATA = pathlib.Path(__file__).parents[2].absolute() / "data"
+GPG_KEY = (DATA / "public.gpg").read_bytes()
+REVOKED = (DATA / "revoked_playbooks.yml").read_text()
+
+
+class TestPayload:
+    def test_short(self):
+        assert str(artifacts.Payload(b"short")) == "b'short'"
+        assert "%r" % artifacts.Payload(b"short") == "b'short'"
+
+    def test_long(self):
+        data = b"x" * (artifacts.LOG_PAYLOAD_LIMIT + 1)
+
+        text = str(artifacts.Payload(data))
+
+        assert len(text) < artifacts.LOG_PAYLOAD_LIMIT + 120
+        assert f"({len(data)} bytes, sha256 " in text
+
+    def test_missing(self):
+        assert str(artifacts.Payload(None)) == "<not kept>"
+
+
+class TestSave:
+    def test_disabled(self):
+        assert artifacts.save("play", b"data") is None
+
+    def test_enabled(self, tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch):
+        monkeypatch.setattr(artifacts, "ARTIFACTS_DIRECTORY", str(tmp_path / "dir"))
+
+        path = artifacts.save("play", b"data")
+
+        assert path == tmp_path / "dir" / "play"
+        assert path.read_bytes() == b"data"
+
+
+class TestLogging:
+    @pytest.mark.parametrize("level,formatted", ((logging.INFO, 0), (logging.DEBUG, 1)))
+    def test_canonicalize_play(
+        self, caplog: pytest.LogCaptureFixture, level: int, formatted: int
+    ):
+        """The serialized play is only formatted when it is logged."""
+        play = lib.parse_playbook(REVOKED)[0]
+        caplog.set_level(level, logger="insights_ansible_playbook_lib")
+
+        with unittest.mock.patch.object(
+            artifacts, "Payload", wraps=artifacts.Payload
+        ) as payload:
+            lib.canonicalize_play(play)
+
+        assert payload.call_count == formatted
+
+    @unittest.mock.patch(
+        "insights_ansible_playbook_lib.crypto.verify_gpg_signed_file",
+        return_value=unittest.mock.MagicMock(ok=False),
+    )
+    def test_mismatch(
+        self,
+        _,
+        caplog: pytest.LogCaptureFixture,
+        tmp_path: pathlib.Path,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        """Failures show the beginning of the play, and save all of it."""
+        monkeypatch.setattr(artifacts, "LOG_PAYLOAD_LIMIT", 16)
+        monkeypatch.setattr(artifacts, "ARTIFACTS_DIRECTORY", str(tmp_path))
+        play = lib.parse_playbook(REVOKED)[0]
+        canonical = lib.canonicalize_play(play)
+
+        with pytest.raises(lib.GPGValidationError):
+            lib.verify_play(play, gpg_key=GPG_KEY)
+
+        (record,) = [r for r in caplog.records if r.levelno == logging.ERROR]
+        assert repr(canonical.serialized_play) not in record.getMessage()
+        assert f"({len(canonical.serialized_play)} bytes" in record.getMessage()  # type: ignore
+        saved = tmp_path / f"{canonical.digest.hex()}.play"
+        assert str(saved) in record.getMessage()
+        assert saved.read_bytes() == canonical.serialized_play
@@ -0,0 +1,145 @@
+import io
+import json
+import pathlib
+import shutil
+import typing
+import unittest.mock
+
+import pytest
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_verifier import bulk
+
+
+DATA = pathlib.Path(__file__).parents[2].absolute() / "data"
+GPG_KEY = (DATA / "public.gpg").read_bytes()
+PLAYBOOKS = DATA / "playbooks"
+
+
+@pytest.fixture
+def verifier() -> typing.Iterator[lib.Verifier]:
+    with lib.Verifier(GPG_KEY) as result:
+        yield result
+
+
+@pytest.fixture
+def input_dir(tmp_path: pathlib.Path) -> pathlib.Path:
+    shutil.copy(PLAYBOOKS / "insights_remove.yml", tmp_path / "insights_remove.yml")
+    (tmp_path / "nested").mkdir()
+    shutil.copy(PLAYBOOKS / "bugs.yml", tmp_path / "nested" / "bugs.yaml")
+    (tmp_path / "nested" / "tagged.yml").write_text("- name: !!str play\n")
+    (tmp_path / "README.md").write_text("Not a playbook.\n")
+    return tmp_path
+
+
+class TestCollectPaths:
+    def test_input_dir(self, input_dir: pathlib.Path):
+        actual = bulk.collect_paths([], input_dir)
+
+        assert actual == [
+            input_dir / "insights_remove.yml",
+            input_dir / "nested" / "bugs.yaml",
+            input_dir / "nested" / "tagged.yml",
+        ]
+
+    def test_playbooks_first(self, input_dir: pathlib.Path):
+        playbook = PLAYBOOKS / "unicode.yml"
+
+        actual = bulk.collect_paths([playbook], input_dir)
+
+        assert actual[0] == playbook
+        assert len(actual) == 4
+
+    def test_missing_dir(self, tmp_path: pathlib.Path):
+        with pytest.raises(RuntimeError, match="does not exist"):
+            bulk.collect_paths([], tmp_path / "missing")
+
+
+class TestVerifyFiles:
+    def test_report(self, input_dir: pathlib.Path, verifier: lib.Verifier):
+        paths = bulk.collect_paths([], input_dir)
+
+        records = list(bulk.verify_files(paths, verifier))
+
+        files = [record for record in records if record["type"] == "file"]
+        plays = [record for record in records if record["type"] == "play"]
+        assert [(r["file"], r["status"], r["plays"]) for r in files] == [
+            (str(paths[0]), "ok", 1),
+            (str(paths[1]), "ok", 4),
+            (str(paths[2]), "failed", 0),
+        ]
+        assert "Tags are not allowed" in files[2]["reason"]
+        assert [record["index"] for record in plays] == [0, 0, 1, 2, 3]
+        assert all(record["status"] == "ok" for record in plays)
+
+    def test_revoked(self):
+        digest: bytes = (PLAYBOOKS / "insights_remove.digest.bin").read_bytes()
+        paths = [PLAYBOOKS / "insights_remove.yml"]
+
+        with lib.Verifier(GPG_KEY, revoked=[digest]) as verifier:
+            play, file = bulk.verify_files(paths, verifier)
+
+        assert play["revoked"] is True
+        assert play["status"] == "failed"
+        assert play["digest"] == digest.hex()
+        assert "is on revocation list" in play["reason"]
+        assert file["status"] == "failed"
+
+    def test_every_play_verified(self, tmp_path: pathlib.Path, verifier: lib.Verifier):
+        raw: str = (PLAYBOOKS / "bugs.yml").read_text()
+        path = tmp_path / "bugs.yml"
+        path.write_text(raw.replace("Test a play with an empty map", "Modified"))
+
+        records = list(bulk.verify_files([path], verifier))
+
+        assert [record["status"] for record in records] == [
+            "ok",
+            "ok",
+            "failed",
+            "ok",
+            "failed",
+        ]
+        assert records[2]["reason"] == "Play digest does not match its signature."
+
+    def test_not_a_mapping(self, tmp_path: pathlib.Path, verifier: lib.Verifier):
+        path = tmp_path / "list.yml"
+        path.write_text("- [a, b]\n")
+
+        play, _ = bulk.verify_files([path], verifier)
+
+        assert play["reason"] == "Play is not a mapping."
+
+
+def test_shared_verifier(verifier: lib.Verifier):
+    """Plays verified before are not verified again."""
+    paths = [PLAYBOOKS / "unicode.yml"] * 2
+
+    with unittest.mock.patch.object(
+        lib, "verify_canonical_play", wraps=lib.verify_canonical_play
+    ) as verify:
+        records = list(bulk.verify_files(paths, verifier, jobs=1))
+
+    assert all(record["status"] == "ok" for record in records)
+    assert verify.call_count == 1
+
+
+def test_run(input_dir: pathlib.Path, verifier: lib.Verifier):
+    output = io.StringIO()
+
+    ok = bulk.run(bulk.collect_paths([], input_dir), verifier, output=output)
+
+    assert ok is False
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert len(records) == 8
+
+
+def test_processes(input_dir: pathlib.Path, verifier: lib.Verifier):
+    paths = bulk.collect_paths([], input_dir)
+    expected = list(bulk.verify_files(paths, verifier))
+
+    actual = list(bulk.verify_files(paths, verifier, processes=2, chunk_size=1))
+
+    def without_timings(records: list[dict]) -> list[dict]:
+        return [{**record, "seconds": None} for record in records]
+
+    assert without_timings(actual) == without_timings(expected)
@@ -0,0 +1,74 @@
+import pathlib
+
+import pytest
+
+import insights_ansible_playbook_lib as lib
+from benchmarks import corpus, inputs
+
+
+SPEC = corpus.CorpusSpec(
+    playbooks=8,
+    plays=(1, 2),
+    tasks=(1, 4),
+    scalar_size=(8, 64),
+    unicode_ratio=0.5,
+    alias_ratio=0.5,
+    tampered_ratio=0.25,
+    revoked_ratio=0.25,
+    seed=7,
+)
+
+
+@pytest.fixture(scope="module")
+def manifest(
+    tmp_path_factory: pytest.TempPathFactory, key_cache: pathlib.Path
+) -> corpus.Manifest:
+    return corpus.generate_corpus(
+        tmp_path_factory.mktemp("corpus"), SPEC, jobs=4, key_cache=key_cache
+    )
+
+
+class TestCorpus:
+    def test_manifest(self, manifest: corpus.Manifest):
+        loaded = corpus.Manifest.load(manifest.directory)
+
+        assert loaded == manifest
+        assert len(loaded.playbooks) == SPEC.playbooks
+        verdicts = {play.verdict for item in loaded.playbooks for play in item.plays}
+        assert verdicts == {corpus.OK, corpus.TAMPERED, corpus.REVOKED}
+
+    def test_verdicts(self, manifest: corpus.Manifest):
+        """The verifier reaches the expected verdict of every play."""
+        directory: pathlib.Path = manifest.directory
+        gpg_key = (directory / manifest.public_key).read_bytes()
+        revocation_list = (directory / manifest.revocation_list).read_text()
+
+        with lib.Verifier(gpg_key, revocation_list=revocation_list) as verifier:
+            for playbook in manifest.playbooks:
+                verdict = verifier.verify_playbook(
+                    (directory / playbook.path).read_text()
+                )
+
+                assert verdict.ok == playbook.ok
+                for expected, play in zip(playbook.plays, verdict.plays):
+                    assert play.digest is None or play.digest.hex() == expected.digest
+                    if expected.verdict == corpus.REVOKED:
+                        assert play.revoked
+                    elif expected.verdict == corpus.TAMPERED:
+                        assert isinstance(play.error, lib.GPGValidationError)
+                    else:
+                        # Plays are not verified when other plays fail
+                        assert play.error is None and not play.revoked
+
+    def test_deterministic(self, manifest: corpus.Manifest, tmp_path: pathlib.Path):
+        """Equal specs generate equal plays, regardless of the signatures."""
+        other = corpus.generate_corpus(tmp_path, SPEC, jobs=1, algorithm="rsa2048")
+
+        assert [item.plays for item in other.playbooks] == [
+            item.plays for item in manifest.playbooks
+        ]
+
+    def test_inputs(self, manifest: corpus.Manifest):
+        passing = inputs.corpus_inputs(manifest.directory)
+
+        assert len(passing) == sum(item.ok for item in manifest.playbooks)
@@ -0,0 +1,104 @@
+import pathlib
+
+import pytest
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import cost
+from insights_ansible_playbook_lib.serialization import Serializer, _Pass
+
+
+PLAYBOOKS = pathlib.Path(__file__).parents[2].absolute() / "data" / "playbooks"
+
+
+def _play(tasks: str) -> dict:
+    (play,) = lib.parse_playbook(
+        "- name: play\n"
+        "  hosts: all\n"
+        "  vars:\n"
+        "    insights_signature_exclude: /hosts,/vars/insights_signature\n"
+        "    insights_signature: !!binary c2lnbmF0dXJl\n"
+        f"  tasks:\n{tasks}"
+    )
+    return play
+
+
+class TestExplainCost:
+    @pytest.mark.parametrize(
+        "file", sorted(path.name for path in PLAYBOOKS.glob("*.yml"))
+    )
+    def test_matches_serializer(self, file: str):
+        """The parts add up to the canonical form of the play."""
+        for play in lib.parse_playbook((PLAYBOOKS / file).read_text()):
+            if not isinstance(play, dict):
+                continue
+            exclude = lib.get_excluded_fields(play)
+            state = _Pass(play, exclude)
+            serialized: str = Serializer._obj(play, state)
+
+            result = lib.explain_cost(play)
+
+            assert result.total.bytes == len(serialized.encode("utf-8"))
+            assert result.total.nodes == state.nodes
+            assert result.total.aliases == state.aliases
+            assert result.excluded == ("/hosts", "/vars/insights_signature")
+
+    def test_breakdown(self):
+        play = _play(
+            "    - name: small\n"
+            "      debug: {msg: hi}\n"
+            "    - name: large\n"
+            '      copy: {content: "a\\nb\\tc\'d\\"e"}\n'
+        )
+
+        result = lib.explain_cost(play)
+
+        paths = [entry.path for entry in result.total.children]
+        assert paths[0] == "/tasks"
+        assert "/hosts" not in paths
+        tasks = result.total.children[0]
+        assert [(task.path, task.name) for task in tasks.children] == [
+            ("/tasks/1", "large"),
+            ("/tasks/0", "small"),
+        ]
+        # Newline, tab and the single quote next to a double quote
+        assert tasks.children[0].escapes == 3
+        assert result.total.escapes == 3
+
+    def test_aliases(self):
+        play = _play(
+            "    - name: first\n"
+            "      dnf: &packages {name: [a, b, c]}\n"
+            "    - name: second\n"
+            "      dnf: *packages\n"
+        )
+
+        tasks = lib.explain_cost(play).total.children[0]
+
+        by_path = {task.path: task for task in tasks.children}
+        assert by_path["/tasks/0"].aliases == 0
+        assert by_path["/tasks/1"].aliases == 1
+        assert by_path["/tasks/1"].nodes == by_path["/tasks/0"].nodes
+
+    def test_not_a_mapping(self):
+        with pytest.raises(lib.PreconditionError, match="not a mapping"):
+            lib.explain_cost("play")  # type: ignore
+
+    def test_limits(self):
+        play = _play("    - name: first\n      debug: {msg: hi}\n")
+
+        with pytest.raises(lib.LimitExceededError):
+            lib.explain_cost(play, limits=lib.Limits(max_nodes=5))
+
+
+class TestFormatCost:
+    def test_top(self):
+        tasks = "".join(f"    - name: task {index}\n" for index in range(5))
+        result = lib.explain_cost(_play(tasks))
+
+        text = cost.format_cost(result, top=2)
+
+        lines = text.splitlines()
+        assert lines[0] == "Play 'play'"
+        assert lines[2].startswith("/ (play)")
+        assert "    ... 3 more" in lines
+        assert lines[-1] == "Excluded: /hosts, /vars/insights_signature"
@@ -14,7 +14,7 @@ from insights_ansible_playbook_lib import _keygen
 GPG_OWNER = "insights-ansible-playbook-verifier test"
 
 
-def _initialize_gpg_environment(home):
+def _initialize_gpg_environment(home, key_pair):
     """Save GPG keys and sign a file with them.
 
     The home directory is populated with the following files:
@@ -24,9 +24,8 @@ def _initialize_gpg_environment(home):
     - file.txt
     - file.txt.asc
     """
-    # Generate the keys and save them
-    gpg_tmp_dir = _keygen._generate_keys()
-    _keygen._export_key_pair(gpg_tmp_dir, home)
+    # Save the keys
+    key_pair.write(pathlib.Path(home))
 
     # Import the public key
     # It is strictly not necessary to import both public and private keys,
@@ -52,7 +51,7 @@ def _initialize_gpg_environment(home):
     assert process.returncode == 0
 
     # Get the fingerprint of the key
-    gpg_fingerprint = _keygen._get_fingerprint(gpg_tmp_dir, home)
+    gpg_fingerprint = _keygen.format_fingerprint(key_pair.fingerprint)
     assert os.path.exists(home + "/key.fingerprint.txt")
 
     # Create a file and sign it
@@ -78,10 +77,10 @@ def _initialize_gpg_environment(home):
     "insights_ansible_playbook_lib.crypto.TEMPORARY_GPG_HOME_PARENT_DIRECTORY",
     "/tmp/",
 )
-def test_valid_signature():
+def test_valid_signature(key_pair):
     """A detached file signature can be verified."""
     home = tempfile.mkdtemp()
-    gpg_fingerprint = _initialize_gpg_environment(home)
+    gpg_fingerprint = _initialize_gpg_environment(home, key_pair)
 
     # Run the test
     result = crypto.verify_gpg_signed_file(
@@ -105,10 +104,10 @@ def test_valid_signature():
     "insights_ansible_playbook_lib.crypto.TEMPORARY_GPG_HOME_PARENT_DIRECTORY",
     "/tmp/",
 )
-def test_invalid_signature():
+def test_invalid_signature(key_pair):
     """A bad detached file signature can be detected."""
     home = tempfile.mkdtemp()
-    gpg_fingerprint = _initialize_gpg_environment(home)
+    gpg_fingerprint = _initialize_gpg_environment(home, key_pair)
 
     # Change the contents of the file, making the signature incorrect
     with open(home + "/file.txt", "w") as f:
@@ -165,10 +164,10 @@ def test_invalid_gpg_setup(
     "insights_ansible_playbook_lib.crypto.TEMPORARY_GPG_HOME_PARENT_DIRECTORY",
     "/tmp/",
 )
-def test_missing_public_key():
+def test_missing_public_key(key_pair):
     """A missing public key can be detected."""
     home = tempfile.mkdtemp()
-    _initialize_gpg_environment(home)
+    _initialize_gpg_environment(home, key_pair)
 
     # Remove the public key
     os.remove(home + "/key.public.gpg")
@@ -195,10 +194,10 @@ def test_missing_public_key():
     "insights_ansible_playbook_lib.crypto.TEMPORARY_GPG_HOME_PARENT_DIRECTORY",
     "/tmp/",
 )
-def test_invalid_public_key():
+def test_invalid_public_key(key_pair):
     """An invalid public key can be detected."""
     home = tempfile.mkdtemp()
-    _initialize_gpg_environment(home)
+    _initialize_gpg_environment(home, key_pair)
 
     # Change the contents of the public key
     with open(home + "/key.public.gpg", "w") as f:
@@ -245,10 +244,10 @@ def test_missing_signed_file():
     "insights_ansible_playbook_lib.crypto.TEMPORARY_GPG_HOME_PARENT_DIRECTORY",
     "/tmp/",
 )
-def test_missing_signature_file():
+def test_missing_signature_file(key_pair):
     """A missing signature file can be detected."""
     home = tempfile.mkdtemp()
-    _initialize_gpg_environment(home)
+    _initialize_gpg_environment(home, key_pair)
 
     # Remove the signature file
     os.remove(home + "/file.txt.asc")
@@ -267,3 +266,36 @@ def test_missing_signature_file():
     assert not os.path.isfile(pathlib.Path(home) / "file.txt.asc")
 
     shutil.rmtree(home, ignore_errors=True)
+
+
+@mock.patch(
+    "insights_ansible_playbook_lib.crypto.TEMPORARY_GPG_HOME_PARENT_DIRECTORY",
+    "/tmp/",
+)
+def test_keyring_sign(key_pair):
+    """A keyring with a private key signs several files."""
+    home = tempfile.mkdtemp()
+    _initialize_gpg_environment(home, key_pair)
+    files = [pathlib.Path(home) / f"message{i}.txt" for i in range(2)]
+    for i, file in enumerate(files):
+        file.write_text(f"message {i}")
+
+    keyring = crypto.GPGKeyring(pathlib.Path(home) / "key.private.gpg")
+    assert keyring.open().ok
+    gpg_home = keyring._home
+    try:
+        results = [keyring.sign(file) for file in files]
+    finally:
+        keyring.close()
+
+    assert all(result.ok for result in results)
+    for file in files:
+        result = crypto.verify_gpg_signed_file(
+            file=file,
+            signature=file.with_name(file.name + ".asc"),
+            key=pathlib.Path(home) / "key.public.gpg",
+        )
+        assert result.ok
+    assert not os.path.isdir(gpg_home)
+
+    shutil.rmtree(home, ignore_errors=True)
@@ -3,6 +3,7 @@ import unittest.mock
 
 import insights_ansible_playbook_lib as lib
 import pytest
+import yaml
 
 
 DATA = pathlib.Path(__file__).parents[2].absolute() / "data"
@@ -67,6 +68,44 @@ class TestParsePlaybook:
         assert actual == expected
 
 
+class TestIterPlaybook:
+    @pytest.mark.parametrize(
+        "file", ("insights_remove", "document-from-hell", "unicode", "bugs")
+    )
+    def test_matches_parse_playbook(self, file: str):
+        raw: str = (PLAYBOOKS / f"{file}.yml").read_text()
+
+        actual: list[dict] = list(lib.iter_playbook(raw))
+
+        assert actual == lib.parse_playbook(raw)
+
+    def test_alias_across_plays(self):
+        raw = "- name: first\n  tasks: &tasks [a]\n- name: second\n  tasks: *tasks"
+        expected = [
+            {"name": "first", "tasks": ["a"]},
+            {"name": "second", "tasks": ["a"]},
+        ]
+
+        actual: list[dict] = list(lib.iter_playbook(raw))
+
+        assert actual == expected
+
+    def test_yields_before_parsing_rest(self):
+        raw = "- name: first\n- name: second\n  key: [unclosed"
+        plays = lib.iter_playbook(raw)
+
+        assert next(plays) == {"name": "first"}
+        with pytest.raises(yaml.YAMLError):
+            next(plays)
+
+    def test_multiple_documents(self):
+        with pytest.raises(yaml.YAMLError, match="expected a single document"):
+            list(lib.iter_playbook("- name: first\n---\n- name: second"))
+
+    def test_empty(self):
+        assert list(lib.iter_playbook("")) == []
+
+
 class TestCleanPlaybook:
     def test_ok(self):
         raw = {
@@ -132,6 +171,78 @@ class TestCleanPlaybook:
         ):
             lib.clean_play(raw)
 
+    def test_original_unchanged(self):
+        raw = {
+            "name": "good playbook",
+            "hosts": "localhost",
+            "vars": {
+                "insights_signature_exclude": "/hosts,/vars/insights_signature",
+                "insights_signature": b"data",
+            },
+        }
+        expected = {
+            "name": "good playbook",
+            "hosts": "localhost",
+            "vars": {
+                "insights_signature_exclude": "/hosts,/vars/insights_signature",
+                "insights_signature": b"data",
+            },
+        }
+
+        lib.clean_play(raw)
+        assert raw == expected
+
+    def test_excluded_twice(self):
+        raw = {
+            "hosts": "localhost",
+            "vars": {"insights_signature_exclude": "/hosts,/hosts"},
+        }
+
+        with pytest.raises(
+            lib.PreconditionError,
+            match="Variable field '/hosts' is not present in the play.",
+        ):
+            lib.clean_play(raw)
+
+
+class TestSerializeExcluded:
+    @pytest.mark.parametrize("file", ("insights_remove", "document-from-hell"))
+    def test_matches_cleaned_play(self, file: str):
+        raw: str = (PLAYBOOKS / f"{file}.yml").read_text()
+        expected: bytes = (PLAYBOOKS / f"{file}.serialized.bin").read_bytes()
+
+        play: dict = lib.parse_playbook(raw)[0]
+        excluded: list[tuple[str, ...]] = lib.get_excluded_fields(play)
+        actual: bytes = lib.serialize_play(play, exclude=excluded).encode("utf-8")
+
+        assert actual == expected
+        assert lib.serialize_play(lib.clean_play(play)).encode("utf-8") == expected
+        assert "hosts" in play
+        assert "insights_signature" in play["vars"]
+
+    def test_aliased_vars(self):
+        """Exclusions apply to every reference of an aliased dictionary."""
+        raw = "\n".join(
+            [
+                "- name: aliased vars",
+                "  hosts: localhost",
+                "  vars: &vars",
+                "    insights_signature_exclude: /hosts,/vars/insights_signature",
+                "    insights_signature: data",
+                "  tasks:",
+                "    - vars: *vars",
+            ]
+        )
+        play: dict = lib.parse_playbook(raw)[0]
+        excluded: list[tuple[str, ...]] = lib.get_excluded_fields(play)
+
+        actual: str = lib.serialize_play(play, exclude=excluded)
+        expected: str = lib.serialize_play(lib.clean_play(play))
+
+        assert actual == expected
+        assert "'insights_signature'" not in actual
+        assert actual.count("insights_signature_exclude") == 2
+
 
 class TestCreatePlayDigest:
     @pytest.mark.parametrize("file", ("insights_remove", "document-from-hell"))
@@ -0,0 +1,168 @@
+import concurrent.futures
+import pathlib
+import unittest.mock
+
+import pytest
+import yaml
+
+import insights_ansible_playbook_lib as lib
+
+
+DATA = pathlib.Path(__file__).parents[2].absolute() / "data"
+GPG_KEY = (DATA / "public.gpg").read_bytes()
+PLAYBOOKS = DATA / "playbooks"
+REVOCATION_LIST = (DATA / "revoked_playbooks.yml").read_text()
+
+
+@pytest.fixture
+def verifier():
+    with lib.Verifier(GPG_KEY, revocation_list=REVOCATION_LIST) as result:
+        yield result
+
+
+class TestVerifier:
+    def test_ok(self, verifier: lib.Verifier):
+        playbook = (PLAYBOOKS / "bugs.yml").read_bytes()
+
+        verdict = verifier.verify_playbook(playbook)
+
+        assert verdict.ok
+        assert len(verdict.plays) == 4
+        assert [play.index for play in verdict.plays] == [0, 1, 2, 3]
+        assert all(play.verified and play.digest for play in verdict.plays)
+
+    def test_concurrent(self, verifier: lib.Verifier):
+        playbooks = [
+            (PLAYBOOKS / name).read_text()
+            for name in ("bugs.yml", "unicode.yml", "insights_remove.yml")
+        ] * 4
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            verdicts = list(executor.map(verifier.verify_playbook, playbooks))
+
+        assert all(verdict.ok for verdict in verdicts)
+
+    def test_cache(self, verifier: lib.Verifier):
+        playbook = (PLAYBOOKS / "unicode.yml").read_text()
+        assert verifier.verify_playbook(playbook).ok
+
+        with unittest.mock.patch.object(lib, "verify_canonical_play") as verify:
+            verdict = verifier.verify_playbook(playbook)
+
+        assert verdict.ok
+        verify.assert_not_called()
+
+    def test_invalid_playbook(self, verifier: lib.Verifier):
+        verdict = verifier.verify_playbook("- name: !!str play\n")
+
+        assert not verdict.ok
+        assert verdict.plays == ()
+        with pytest.raises(lib.PreconditionError, match="Tags are not allowed"):
+            verdict.raise_for_error()
+
+    def test_no_plays(self, verifier: lib.Verifier):
+        verdict = verifier.verify_playbook("[]\n")
+
+        with pytest.raises(lib.PreconditionError, match="contains no plays"):
+            verdict.raise_for_error()
+
+    def test_invalid_play(self, verifier: lib.Verifier):
+        """Signatures are not verified when a play fails the cheap checks."""
+        playbook = (PLAYBOOKS / "unicode.yml").read_text() + "- name: unsigned\n"
+        verifier.wait()
+
+        with unittest.mock.patch.object(lib, "verify_canonical_play") as verify:
+            verdict = verifier.verify_playbook(playbook)
+
+        verify.assert_not_called()
+        first, second = verdict.plays
+        assert first.error is None and not first.verified
+        assert second.name == "unsigned"
+        assert isinstance(second.error, lib.PreconditionError)
+
+    def test_streaming(self):
+        """Each play is canonicalized before the next one is parsed."""
+        plays = lib.parse_playbook((PLAYBOOKS / "bugs.yml").read_text())
+        events: list[str] = []
+
+        def parse():
+            for play in plays:
+                events.append(f"parse {play['name']}")
+                yield play
+
+        def canonicalize(play, **kwargs):
+            events.append(f"canonicalize {play['name']}")
+            return canonicalize_play(play, **kwargs)
+
+        canonicalize_play = lib.canonicalize_play
+        with (
+            lib.Verifier(GPG_KEY) as verifier,
+            unittest.mock.patch.object(lib, "canonicalize_play", canonicalize),
+        ):
+            verdict = verifier.verify_plays(parse())
+
+        assert verdict.ok
+        assert events == [
+            f"{event} {play['name']}"
+            for play in plays
+            for event in ("parse", "canonicalize")
+        ]
+
+    def test_parsing_error_first(self, verifier: lib.Verifier):
+        """A playbook that fails to parse does not verify any signature."""
+        playbook = (PLAYBOOKS / "unicode.yml").read_text() + "- name: [broken\n"
+        verifier.wait()
+
+        with unittest.mock.patch.object(lib, "verify_canonical_play") as verify:
+            verdict = verifier.verify_playbook(playbook)
+
+        verify.assert_not_called()
+        assert verdict.plays == ()
+        with pytest.raises(yaml.YAMLError):
+            verdict.raise_for_error()
+
+    def test_revoked(self, verifier: lib.Verifier):
+        playbook = (PLAYBOOKS / "unicode.yml").read_text()
+        digest = verifier.verify_playbook(playbook).plays[0].digest
+        assert digest is not None
+
+        with lib.Verifier(GPG_KEY, revoked=[digest]) as revoking:
+            verdict = revoking.verify_playbook(playbook)
+
+        (play,) = verdict.plays
+        assert play.revoked
+        with pytest.raises(lib.PreconditionError, match="is on revocation list"):
+            verdict.raise_for_error()
+
+    def test_bad_signature(self, verifier: lib.Verifier):
+        playbook = (PLAYBOOKS / "unicode.yml").read_text()
+        playbook = playbook.replace("name:", "name: Changed", 1)
+
+        verdict = verifier.verify_playbook(playbook)
+
+        (play,) = verdict.plays
+        assert not play.verified
+        assert isinstance(play.error, lib.GPGValidationError)
+
+    def test_invalid_revocation_list(self):
+        with lib.Verifier(
+            GPG_KEY, revocation_list="- name: revoked\n  vars: {}\n"
+        ) as verifier:
+            with pytest.raises(lib.PreconditionError, match="does not contain"):
+                verifier.wait()
+
+    def test_invalid_revocation_list_first(self):
+        """The revocation list is reported before problems of the playbook."""
+        with lib.Verifier(
+            GPG_KEY, revocation_list="- name: revoked\n  vars: {}\n"
+        ) as verifier:
+            with pytest.raises(lib.PreconditionError, match="does not contain"):
+                verifier.verify_playbook("- name: !!str play\n")
+
+    def test_bug(self, verifier: lib.Verifier):
+        """Errors not caused by the playbook are raised."""
+        with unittest.mock.patch.object(
+            lib, "iter_playbook", side_effect=TypeError("bug")
+        ):
+            with pytest.raises(TypeError, match="bug"):
+                verifier.verify_playbook("- name: play\n")
@@ -0,0 +1,116 @@
+import pytest
+
+import insights_ansible_playbook_lib as lib
+
+
+def _billion_laughs(levels: int = 9) -> str:
+    """Create a playbook expanding into 10^levels strings."""
+    lines = [
+        "- name: lol",
+        "  vars:",
+        "    insights_signature_exclude: /vars/insights_signature",
+        "    insights_signature: data",
+        '  lol0: &lol0 "lol"',
+    ]
+    for i in range(1, levels + 1):
+        references = ", ".join([f"*lol{i - 1}"] * 10)
+        lines.append(f"  lol{i}: &lol{i} [{references}]")
+    return "\n".join(lines)
+
+
+class TestParseLimits:
+    def test_input_bytes(self):
+        limits = lib.Limits(max_input_bytes=10)
+
+        with pytest.raises(lib.LimitExceededError, match="larger than 10 bytes"):
+            lib.parse_playbook("- name: a long play", limits=limits)
+
+    def test_input_bytes_unicode(self):
+        """The limit applies to encoded playbook, not to the characters."""
+        limits = lib.Limits(max_input_bytes=20)
+
+        with pytest.raises(lib.LimitExceededError, match="larger than 20 bytes"):
+            lib.parse_playbook("- name: 👨\u200d👩\u200d👦", limits=limits)
+
+    def test_depth(self):
+        with pytest.raises(lib.LimitExceededError, match="deeper than 64 levels"):
+            lib.parse_playbook("[" * 10_000 + "]" * 10_000)
+
+    def test_nodes(self):
+        limits = lib.Limits(max_nodes=10)
+
+        with pytest.raises(lib.LimitExceededError, match="more than 10 nodes"):
+            lib.parse_playbook(f"- {list(range(20))}", limits=limits)
+
+    def test_aliases(self):
+        limits = lib.Limits(max_alias_expansions=5)
+        raw = "- &a x\n" + "- *a\n" * 6
+
+        with pytest.raises(lib.LimitExceededError, match="more than 5 aliases"):
+            lib.parse_playbook(raw, limits=limits)
+
+    def test_scalar_length(self):
+        limits = lib.Limits(max_scalar_length=5)
+
+        with pytest.raises(
+            lib.LimitExceededError, match="Scalar at line 1, column 3 is longer"
+        ):
+            lib.parse_playbook("- long value", limits=limits)
+
+    def test_iter_playbook(self):
+        limits = lib.Limits(max_nodes=10)
+
+        with pytest.raises(lib.LimitExceededError, match="more than 10 nodes"):
+            list(lib.iter_playbook(f"- {list(range(20))}", limits=limits))
+
+    def test_defaults_allow_billion_laughs_parsing(self):
+        """The document is small, only its expansion is large."""
+        lib.parse_playbook(_billion_laughs())
+
+
+class TestSerializationLimits:
+    def test_billion_laughs(self):
+        play: dict = lib.parse_playbook(_billion_laughs())[0]
+
+        # The aliases inside the shared lists count as well
+        with pytest.raises(lib.LimitExceededError, match="more than 1000 aliases"):
+            lib.canonicalize_play(play)
+
+    def test_nested_aliases(self):
+        """Few aliases doubling a large scalar do not exhaust the memory."""
+        lines = [
+            "- name: doubled",
+            "  vars:",
+            "    insights_signature_exclude: /vars/insights_signature",
+            "    insights_signature: data",
+            f"  l0: &l0 {'x' * 1024 * 1024}",
+        ]
+        for i in range(1, 9):
+            lines.append(f"  l{i}: &l{i} [*l{i - 1}, *l{i - 1}]")
+        play: dict = lib.parse_playbook("\n".join(lines))[0]
+
+        with pytest.raises(lib.LimitExceededError, match="longer than 67108864"):
+            lib.canonicalize_play(play)
+
+    def test_recursive_play(self):
+        play: dict = lib.parse_playbook("- &play\n  self: *play")[0]
+
+        with pytest.raises(lib.LimitExceededError, match="deeper than 64 levels"):
+            lib.serialize_play(play, limits=lib.DEFAULT_LIMITS)
+
+    def test_aliases(self):
+        play: dict = lib.parse_playbook("- a: &a [x]\n  b: [*a, *a, *a]")[0]
+
+        with pytest.raises(lib.LimitExceededError, match="more than 2 aliases"):
+            lib.serialize_play(play, limits=lib.Limits(max_alias_expansions=2))
+
+    def test_scalar_length(self):
+        play = {"name": "x" * 10}
+
+        with pytest.raises(lib.LimitExceededError, match="longer than 5"):
+            lib.serialize_play(play, limits=lib.Limits(max_scalar_length=5))
+
+    def test_unlimited(self):
+        play = {"name": "x" * 10}
+
+        assert lib.serialize_play(play) == f"ordereddict([('name', '{'x' * 10}')])"
@@ -0,0 +1,113 @@
+import pathlib
+
+import pytest
+
+from insights_ansible_playbook_lib import lint
+import insights_ansible_playbook_lib as lib
+
+
+PLAYBOOKS = pathlib.Path(__file__).parents[2].absolute() / "data" / "playbooks"
+
+
+@pytest.mark.parametrize(
+    "file", ("insights_remove", "document-from-hell", "unicode", "bugs")
+)
+def test_playbooks(file: str):
+    raw: str = (PLAYBOOKS / f"{file}.yml").read_text()
+
+    assert list(lint.iter_violations(raw)) == []
+
+
+def test_anchors():
+    raw = "- name: &name play\n  tasks: [*name]\n"
+
+    assert list(lint.iter_violations(raw)) == []
+
+
+@pytest.mark.parametrize(
+    "raw,expected",
+    [
+        (
+            "- name: !!str 12",
+            lint.Violation(1, 9, "Tags are not allowed: '!!str'."),
+        ),
+        (
+            "- vars:\n    binary: !!binary ZGF0YQ==",
+            lint.Violation(2, 13, "Tags are not allowed: '!!binary'."),
+        ),
+        (
+            "- vars:\n    insights_signature: !custom ZGF0YQ==",
+            lint.Violation(2, 25, "Tags are not allowed: '!custom'."),
+        ),
+        (
+            "- name: !<tag:yaml.org,2002:str> 12",
+            lint.Violation(1, 9, "Tags are not allowed: 'tag:yaml.org,2002:str'."),
+        ),
+        (
+            "%TAG !e! tag:example.com,2000:\n---\n- name: play",
+            lint.Violation(1, 1, "Tag directives are not allowed."),
+        ),
+        (
+            "- serve:\n  - /robots.txt\n  - *.html",
+            lint.Violation(
+                3, 5, "Values starting with '*' are aliases, they have to be quoted."
+            ),
+        ),
+        (
+            "- serve: *robots",
+            lint.Violation(
+                1, 10, "Value '*robots' is an undefined alias, it has to be quoted."
+            ),
+        ),
+        (
+            "- name: &name a\n---\n- name: *name",
+            lint.Violation(
+                3, 9, "Value '*name' is an undefined alias, it has to be quoted."
+            ),
+        ),
+    ],
+)
+def test_violations(raw: str, expected: lint.Violation):
+    assert list(lint.iter_violations(raw)) == [expected]
+
+
+def test_all_violations_reported():
+    raw = "- name: !!str a\n  hosts: *b\n  tasks: !!seq []"
+
+    actual = [(v.line, v.column) for v in lint.iter_violations(raw)]
+
+    assert actual == [(1, 9), (2, 10), (3, 10)]
+
+
+def test_invalid_yaml():
+    raw = "- name: a\n\t- b"
+
+    actual = list(lint.iter_violations(raw))
+
+    assert len(actual) == 1
+    assert actual[0].line == 2
+    assert actual[0].message.startswith("Invalid YAML: found character")
+
+
+def test_check_playbook():
+    with pytest.raises(
+        lib.PreconditionError,
+        match=r"Tags are not allowed: '!!str'. \(line 1, column 9\)",
+    ):
+        lint.check_playbook("- name: !!str 12")
+
+
+def test_main(capsys, tmp_path: pathlib.Path, monkeypatch):
+    valid = tmp_path / "valid.yml"
+    valid.write_text("- name: play\n")
+    invalid = tmp_path / "invalid.yml"
+    invalid.write_text("- name: *play\n")
+    monkeypatch.setattr("sys.argv", ["lint", str(valid), str(invalid)])
+
+    with pytest.raises(SystemExit) as exc:
+        lint.main()
+
+    assert exc.value.code == 1
+    assert capsys.readouterr().out == (
+        f"{invalid}:1:9: Value '*play' is an undefined alias, it has to be quoted.\n"
+    )
@@ -0,0 +1,64 @@
+import pathlib
+
+import pytest
+
+from benchmarks import corpus, load
+
+
+def _manifest(count: int) -> corpus.Manifest:
+    return corpus.Manifest(
+        directory=pathlib.Path("/nonexistent"),
+        spec=corpus.CorpusSpec(playbooks=count),
+        public_key="keys/key.public.gpg",
+        revocation_list="revoked_playbooks.yml",
+        playbooks=[
+            corpus.PlaybookManifest(path=f"playbook-{i}.yml", plays=[])
+            for i in range(count)
+        ],
+    )
+
+
+class TestAssignments:
+    @pytest.mark.parametrize("requests", (0, 1, 7, 8, 30))
+    def test_requests(self, requests: int):
+        """Requests are split over the clients, covering the corpus round-robin."""
+        workload = load.Workload(manifest=_manifest(5), clients=4, requests=requests)
+
+        shares = [list(workload.assignments(client)) for client in range(4)]
+
+        assert sum(len(share) for share in shares) == requests
+        assert max(map(len, shares)) - min(map(len, shares)) <= 1
+        first = [share[0].path for share in shares if share]
+        assert len(set(first)) == len(first)
+
+    def test_duration(self):
+        workload = load.Workload(manifest=_manifest(3), clients=1, duration=0.0)
+
+        assert list(workload.assignments(0)) == []
+
+
+class TestSummary:
+    def test_percentile(self):
+        values = [float(value) for value in range(1, 101)]
+
+        assert load.percentile(values, 0.50) == 50.0
+        assert load.percentile(values, 0.99) == 99.0
+        assert load.percentile([3.0], 0.99) == 3.0
+        assert load.percentile([], 0.5) == 0.0
+
+    def test_summarize(self):
+        samples = [
+            load.Sample(0, "a.yml", 0.1, ok=True, expected=True, rss=1000),
+            load.Sample(1, "b.yml", 0.3, ok=False, expected=False, rss=3000),
+            load.Sample(1, "c.yml", 0.2, ok=False, expected=True, rss=2000),
+        ]
+
+        report = load.summarize("cli", 2, samples, 1.5, set(), set())
+
+        assert report.requests == 3
+        assert report.throughput == 2.0
+        assert report.latency["p50"] == 0.2
+        assert report.latency["max"] == 0.3
+        assert (report.failed, report.unexpected) == (2, 1)
+        assert report.peak_rss == 3000
+        assert not report.ok
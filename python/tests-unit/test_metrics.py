@@ -0,0 +1,128 @@
+import concurrent.futures
+import pathlib
+
+from insights_ansible_playbook_lib import tracing
+from insights_ansible_playbook_lib import metrics
+
+
+def _write(path: pathlib.Path) -> None:
+    collector = metrics.Metrics("test")
+    collector.observe_playbook("ok", 2)
+    collector.write(path)
+
+
+class TestFormat:
+    def test_round_trip(self):
+        family = metrics.Family(
+            name="test_total",
+            kind="counter",
+            description="Test.",
+            samples={("test_total", (("stage", 'gpg "--verify"\\\n'),)): 2.5},
+        )
+
+        text = metrics.format_metrics([family])
+        assert text == (
+            "# HELP test_total Test.\n"
+            "# TYPE test_total counter\n"
+            'test_total{stage="gpg \\"--verify\\"\\\\\\n"} 2.5\n'
+        )
+        assert metrics.parse_metrics(text) == {"test_total": family}
+
+    def test_unknown_samples(self):
+        families = metrics.parse_metrics(
+            "# Comment\nother_metric 3 1700000000\ninvalid line\nmetric nan-ish\n"
+        )
+
+        assert list(families) == ["other_metric"]
+        assert families["other_metric"].kind == "untyped"
+        assert families["other_metric"].samples == {("other_metric", ()): 3.0}
+
+    def test_histogram_order(self):
+        collector = metrics.Metrics("test")
+        collector.observe("duration", 0.3, (0.1, 1.0), stage="b")
+        collector.observe("duration", 2.0, (0.1, 1.0), stage="a")
+
+        lines = metrics.format_metrics(collector.families()).splitlines()
+        assert lines[1:] == [
+            'test_duration_bucket{stage="a",le="0.1"} 0',
+            'test_duration_bucket{stage="a",le="1"} 0',
+            'test_duration_bucket{stage="a",le="+Inf"} 1',
+            'test_duration_sum{stage="a"} 2',
+            'test_duration_count{stage="a"} 1',
+            'test_duration_bucket{stage="b",le="0.1"} 0',
+            'test_duration_bucket{stage="b",le="1"} 1',
+            'test_duration_bucket{stage="b",le="+Inf"} 1',
+            'test_duration_sum{stage="b"} 0.3',
+            'test_duration_count{stage="b"} 1',
+        ]
+
+
+class TestMetrics:
+    def test_tracing(self):
+        collector = metrics.Metrics("test")
+        with tracing.ChromeTrace():
+            collector.start()
+            try:
+                with tracing.span("load_revocation_list"):
+                    tracing.count("revoked_digests", 3)
+                tracing.count("subprocesses", 2)
+                tracing.count("subprocesses")
+            finally:
+                collector.stop()
+        tracing.count("subprocesses")
+
+        families = {family.name: family for family in collector.families()}
+        assert families["test_subprocesses_total"].samples == {
+            ("test_subprocesses_total", ()): 3
+        }
+        assert families["test_revocation_list_digests"].kind == "gauge"
+        assert families["test_revocation_list_digests"].samples == {
+            ("test_revocation_list_digests", ()): 3
+        }
+        assert "test_revocation_list_load_seconds" in families
+        stages = families["test_stage_duration_seconds"].samples
+        key = (
+            "test_stage_duration_seconds_count",
+            (("stage", "load_revocation_list"),),
+        )
+        assert stages[key] == 1
+
+    def test_merge(self, tmp_path: pathlib.Path):
+        path = tmp_path / "verifier.prom"
+        path.write_text("# TYPE other_metric gauge\nother_metric 7\n")
+        for digests in (5, 2):
+            collector = metrics.Metrics("test")
+            collector.observe_playbook("ok", 2)
+            collector.observe_playbook("rejected", 1)
+            collector.set("revocation_list_digests", digests)
+            collector.write(path)
+
+        families = metrics.parse_metrics(path.read_text())
+        assert families["other_metric"].samples == {("other_metric", ()): 7}
+        assert families["test_verifications_total"].samples == {
+            ("test_verifications_total", (("outcome", "ok"),)): 2,
+            ("test_verifications_total", (("outcome", "rejected"),)): 2,
+        }
+        plays = families["test_plays_per_playbook"].samples
+        assert plays[("test_plays_per_playbook_sum", ())] == 6
+        assert plays[("test_plays_per_playbook_bucket", (("le", "1"),))] == 2
+        # Gauges are replaced
+        assert families["test_revocation_list_digests"].samples == {
+            ("test_revocation_list_digests", ()): 2
+        }
+
+    def test_concurrent_writes(self, tmp_path: pathlib.Path):
+        path = tmp_path / "verifier.prom"
+        with concurrent.futures.ProcessPoolExecutor(max_workers=4) as executor:
+            list(executor.map(_write, [path] * 16))
+
+        families = metrics.parse_metrics(path.read_text())
+        assert families["test_verifications_total"].samples == {
+            ("test_verifications_total", (("outcome", "ok"),)): 16
+        }
+        # Only the lock is left next to the file
+        assert sorted(file.name for file in tmp_path.iterdir()) == [
+            "verifier.prom",
+            "verifier.prom.lock",
+        ]
+        assert oct(path.stat().st_mode & 0o777) == "0o644"
@@ -0,0 +1,311 @@
+import base64
+import pathlib
+import random
+import typing
+import unittest.mock
+
+import pytest
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import _keygen, openpgp
+from insights_ansible_playbook_signer import backends
+
+
+DATA = pathlib.Path(__file__).parents[2].absolute() / "data"
+GPG_KEY = (DATA / "public.gpg").read_bytes()
+KEY_ID = bytes.fromhex("cbf0e7c0fe8f9a4d")
+
+
+def _signature(name: str = "bugs.yml") -> bytes:
+    play: dict = lib.parse_playbook((DATA / "playbooks" / name).read_text())[0]
+    return base64.b64decode(play["vars"]["insights_signature"])
+
+
+@pytest.fixture(scope="module")
+def key_pair(
+    tmp_path_factory: pytest.TempPathFactory, key_pair: _keygen.KeyPair
+) -> typing.Iterator[pathlib.Path]:
+    """Save a second key pair, as if the signing key was rotated."""
+    home = tmp_path_factory.mktemp("keys")
+    key_pair.write(home)
+    yield home
+
+
+def _without_issuer(signature: bytes) -> bytes:
+    """Drop the unhashed subpackets, where GPG put the issuer of the signature."""
+    ((tag, body),) = openpgp.iter_packets(openpgp.dearmor(signature))
+    hashed_end: int = 6 + int.from_bytes(body[4:6], "big")
+    unhashed_end: int = (
+        hashed_end + 2 + int.from_bytes(body[hashed_end : hashed_end + 2], "big")
+    )
+    body = body[:hashed_end] + b"\x00\x00" + body[unhashed_end:]
+    # Old format header with a two-byte length
+    return bytes([0x80 | tag << 2 | 1]) + len(body).to_bytes(2, "big") + body
+
+
+def _signed_play(key_pair: pathlib.Path) -> dict:
+    play: dict = {
+        "name": "signed by the new key",
+        "hosts": "localhost",
+        "vars": {
+            "insights_signature_exclude": "/hosts,/vars/insights_signature",
+            "insights_signature": b"placeholder",
+        },
+        "tasks": [{"name": "task", "ansible.builtin.ping": None}],
+    }
+    digest: bytes = lib.canonicalize_play(play).digest
+    with backends.LocalGPGBackend(key_pair / "key.private.gpg") as backend:
+        signature: bytes = backend.sign(digest)
+    play["vars"]["insights_signature"] = base64.b64encode(signature)
+    return play
+
+
+class TestDearmor:
+    def test_binary(self):
+        assert openpgp.dearmor(b"\x99\x00") == b"\x99\x00"
+
+    def test_armored(self):
+        armored = (
+            b"-----BEGIN PGP SIGNATURE-----\n"
+            b"Version: GnuPG v1\n"
+            b"\n"
+            + base64.b64encode(b"\x88\x00")
+            + b"\n=abcd\n-----END PGP SIGNATURE-----\n"
+        )
+
+        assert openpgp.dearmor(armored) == b"\x88\x00"
+
+    def test_unterminated(self):
+        with pytest.raises(openpgp.PacketError, match="not terminated"):
+            openpgp.dearmor(b"-----BEGIN PGP SIGNATURE-----\n\niAA=\n")
+
+
+class TestIterPackets:
+    def test_old_format(self):
+        assert list(openpgp.iter_packets(b"\x88\x02ab\x99\x00\x01c")) == [
+            (2, b"ab"),
+            (6, b"c"),
+        ]
+
+    def test_new_format(self):
+        assert list(openpgp.iter_packets(b"\xc2\x02ab\xc2\xc0\x00" + b"x" * 192)) == [
+            (2, b"ab"),
+            (2, b"x" * 192),
+        ]
+
+    def test_truncated(self):
+        with pytest.raises(openpgp.PacketError, match="truncated"):
+            list(openpgp.iter_packets(b"\x88\x05ab"))
+
+    def test_not_a_packet(self):
+        with pytest.raises(openpgp.PacketError, match="Invalid packet header"):
+            list(openpgp.iter_packets(b"plain text"))
+
+
+class TestKeyIds:
+    def test_packaged_key(self):
+        assert openpgp.get_key_ids(GPG_KEY) == {KEY_ID}
+
+    def test_signature(self):
+        assert openpgp.get_issuer(_signature()) == KEY_ID
+
+    def test_no_key(self):
+        with pytest.raises(
+            openpgp.PacketError, match="does not contain any public key"
+        ):
+            openpgp.get_key_ids(b"")
+
+    def test_no_signature(self):
+        with pytest.raises(openpgp.PacketError, match="does not contain any signature"):
+            openpgp.get_issuer(b"\xc6\x01\x04")
+
+    def test_name_issuer(self):
+        signature: bytes = _without_issuer(_signature())
+
+        assert openpgp.get_issuer(openpgp.name_issuer(signature, GPG_KEY)) == KEY_ID
+        assert openpgp.name_issuer(_signature(), GPG_KEY) == _signature()
+
+
+def _canonical_play(name: str = "bugs.yml") -> lib.CanonicalPlay:
+    play: dict = lib.parse_playbook((DATA / "playbooks" / name).read_text())[0]
+    return lib.canonicalize_play(play)
+
+
+def _corrupt(data: bytes, rng: random.Random) -> bytes:
+    """Flip, drop, duplicate or truncate random bytes."""
+    result = bytearray(data)
+    for _ in range(rng.randint(1, 4)):
+        position: int = rng.randrange(len(result)) if result else 0
+        operation: int = rng.randrange(4)
+        if operation == 0 and result:
+            result[position] ^= 1 << rng.randrange(8)
+        elif operation == 1 and result:
+            del result[position]
+        elif operation == 2:
+            result[position:position] = bytes([rng.randrange(256)])
+        else:
+            del result[position:]
+    return bytes(result)
+
+
+class TestCheckSignature:
+    def test_ok(self):
+        play = _canonical_play()
+
+        openpgp.check_signature(base64.b64decode(play.signature), data=play.digest)
+
+    def test_other_data(self):
+        play = _canonical_play()
+
+        with pytest.raises(openpgp.SignatureMismatchError):
+            openpgp.check_signature(base64.b64decode(play.signature), data=b"x" * 32)
+
+    @pytest.mark.parametrize(
+        ("offset", "value", "message"),
+        (
+            (0, 5, "Signature version 5 is not supported"),
+            (1, 0x13, "Signature type 0x13 is not a detached signature"),
+            (2, 99, "Public key algorithm 99 is not supported"),
+            (3, 2, "Hash algorithm 2 is not allowed"),
+        ),
+    )
+    def test_invalid_field(self, offset: int, value: int, message: str):
+        (_, body), *_ = openpgp.iter_packets(
+            openpgp.dearmor(base64.b64decode(_canonical_play().signature))
+        )
+        body = body[:offset] + bytes([value]) + body[offset + 1 :]
+        packet = b"\xc2\xff" + len(body).to_bytes(4, "big") + body
+
+        with pytest.raises(openpgp.PacketError, match=message):
+            openpgp.check_signature(packet)
+
+    def test_trailing_data(self):
+        (_, body), *_ = openpgp.iter_packets(
+            openpgp.dearmor(base64.b64decode(_canonical_play().signature))
+        )
+        body += b"\x00"
+        packet = b"\xc2\xff" + len(body).to_bytes(4, "big") + body
+
+        with pytest.raises(openpgp.PacketError, match="Signature value has"):
+            openpgp.check_signature(packet)
+
+    def test_not_a_signature(self):
+        with pytest.raises(openpgp.PacketError, match="tag 6 is not a signature"):
+            openpgp.check_signature(GPG_KEY)
+
+    def test_garbage(self):
+        with pytest.raises(openpgp.PacketError):
+            openpgp.check_signature(b"not a signature at all")
+
+    @pytest.mark.parametrize("armored", (True, False))
+    def test_fuzz(self, armored: bool):
+        """Corrupted signatures are rejected by `PacketError` only."""
+        play = _canonical_play()
+        signature: bytes = base64.b64decode(play.signature)
+        if not armored:
+            signature = openpgp.dearmor(signature)
+        rng = random.Random(2024)
+
+        rejected: int = 0
+        for _ in range(2000):
+            corrupted: bytes = _corrupt(signature, rng)
+            try:
+                openpgp.check_signature(corrupted, data=play.digest)
+            except openpgp.PacketError:
+                rejected += 1
+
+        # Only corruptions of the ignored armor headers and of the signature
+        # value itself are left for GPG to reject
+        assert rejected > 1500
+
+    def test_play(self):
+        play = _canonical_play()
+        play = lib.CanonicalPlay(
+            name=play.name,
+            signature=base64.b64encode(b"\x88\x01\x04"),
+            digest=play.digest,
+            serialized_play=None,
+        )
+
+        with pytest.raises(openpgp.PacketError, match="Signature of play .* malformed"):
+            lib.decode_signature(play)
+
+    def test_play_mismatch(self):
+        play = _canonical_play()
+        play = lib.CanonicalPlay(
+            name=play.name,
+            signature=play.signature,
+            digest=b"x" * 32,
+            serialized_play=None,
+        )
+
+        with pytest.raises(lib.GPGValidationError):
+            lib.decode_signature(play)
+
+
+class TestKeyIndex:
+    def test_find(self, key_pair: pathlib.Path):
+        new_key = (key_pair / "key.public.gpg").read_bytes()
+        index = openpgp.KeyIndex([new_key, GPG_KEY])
+
+        assert len(index) == 2
+        assert index.find(_signature()) == GPG_KEY
+
+    def test_unknown_issuer(self, key_pair: pathlib.Path):
+        index = openpgp.KeyIndex([(key_pair / "key.public.gpg").read_bytes()])
+
+        with pytest.raises(openpgp.PacketError, match="unknown key 'cbf0e7c0fe8f9a4d'"):
+            index.find(_signature())
+
+    def test_no_issuer(self):
+        """Signatures without an issuer are matched to the only trusted key."""
+        signature: bytes = _without_issuer(_signature())
+        with pytest.raises(openpgp.PacketError, match="does not identify"):
+            openpgp.get_issuer(signature)
+
+        assert openpgp.KeyIndex([GPG_KEY]).find(signature) == GPG_KEY
+
+    def test_no_issuer_multiple_keys(self, key_pair: pathlib.Path):
+        index = openpgp.KeyIndex([(key_pair / "key.public.gpg").read_bytes(), GPG_KEY])
+
+        with pytest.raises(openpgp.PacketError, match="does not identify"):
+            index.find(_without_issuer(_signature()))
+
+    def test_no_issuer_verified(self):
+        play: dict = lib.parse_playbook((DATA / "playbooks" / "bugs.yml").read_text())[
+            0
+        ]
+        play["vars"]["insights_signature"] = base64.b64encode(
+            _without_issuer(_signature())
+        )
+
+        with lib.Verifier(GPG_KEY) as verifier:
+            verdict = verifier.verify_plays([play])
+
+        assert verdict.ok, verdict
+
+    def test_empty(self):
+        with pytest.raises(ValueError):
+            openpgp.KeyIndex([])
+
+
+class TestRotation:
+    def test_both_keys(self, key_pair: pathlib.Path):
+        new_key = (key_pair / "key.public.gpg").read_bytes()
+        old_play = lib.parse_playbook((DATA / "playbooks" / "unicode.yml").read_text())
+
+        with lib.Verifier([GPG_KEY, new_key]) as verifier:
+            verdict = verifier.verify_plays([*old_play, _signed_play(key_pair)])
+
+        assert verdict.ok, verdict
+
+    def test_unknown_key(self, key_pair: pathlib.Path):
+        """Signatures of untrusted keys are rejected without running GPG."""
+        with lib.Verifier(GPG_KEY) as verifier:
+            verifier.wait()
+            with unittest.mock.patch.object(lib, "verify_canonical_play") as verify:
+                verdict = verifier.verify_plays([_signed_play(key_pair)])
+
+        verify.assert_not_called()
+        (play,) = verdict.plays
+        assert isinstance(play.error, openpgp.PacketError)
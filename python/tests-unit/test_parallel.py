@@ -0,0 +1,93 @@
+import pathlib
+import unittest.mock
+
+import pytest
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import parallel
+
+
+PLAYBOOKS = pathlib.Path(__file__).parents[2].absolute() / "data" / "playbooks"
+FILES = ("insights_remove", "document-from-hell", "unicode", "bugs")
+
+
+@pytest.fixture
+def paths(tmp_path: pathlib.Path) -> list[pathlib.Path]:
+    (tmp_path / "tagged.yml").write_text("- name: !!str play\n")
+    (tmp_path / "empty.yml").write_text("")
+    (tmp_path / "no_plays.yml").write_text("[]\n")
+    (tmp_path / "mixed.yml").write_text(
+        (PLAYBOOKS / "insights_remove.yml").read_text() + "- [not, a, play]\n"
+    )
+    return [PLAYBOOKS / f"{file}.yml" for file in FILES] + [
+        tmp_path / name
+        for name in ("tagged.yml", "empty.yml", "no_plays.yml", "mixed.yml")
+    ]
+
+
+def _comparable(result: parallel.PlaybookResult) -> tuple:
+    """Drop the timings, which differ between runs."""
+    return (
+        result.path,
+        result.error,
+        [(play.index, play.name, play.play, play.error) for play in result.plays],
+    )
+
+
+class TestCanonicalizeFile:
+    @pytest.mark.parametrize("file", FILES)
+    def test_matches_canonicalize_play(self, file: str):
+        path = PLAYBOOKS / f"{file}.yml"
+        expected = [
+            lib.canonicalize_play(play) for play in lib.parse_playbook(path.read_text())
+        ]
+
+        actual = parallel.canonicalize_file(path)
+
+        assert actual.error is None
+        assert [play.play.digest for play in actual.plays] == [
+            play.digest for play in expected
+        ]
+        # Serialized plays are not sent back to the parent
+        assert all(play.play.serialized_play is None for play in actual.plays)
+
+    def test_errors(self, paths: list[pathlib.Path]):
+        tagged, empty, no_plays, mixed = (
+            parallel.canonicalize_file(path) for path in paths[-4:]
+        )
+
+        assert "Tags are not allowed" in tagged.error
+        assert empty.error == "Received empty playbook."
+        assert no_plays.error == "Playbook contains no plays."
+        assert mixed.error is None
+        assert mixed.plays[0].play is not None
+        assert mixed.plays[1].error == "Play is not a mapping."
+
+    def test_limits(self):
+        limits = lib.Limits(max_input_bytes=10)
+
+        actual = parallel.canonicalize_file(PLAYBOOKS / "bugs.yml", limits=limits)
+
+        assert actual.error == "Playbook is larger than 10 bytes."
+
+    def test_bug(self):
+        """Errors not caused by the playbook are raised."""
+        with unittest.mock.patch.object(
+            lib, "canonicalize_play", side_effect=TypeError("bug")
+        ):
+            with pytest.raises(TypeError, match="bug"):
+                parallel.canonicalize_file(PLAYBOOKS / "bugs.yml")
+
+
+class TestCanonicalizeFiles:
+    def test_processes(self, paths: list[pathlib.Path]):
+        expected = [_comparable(parallel.canonicalize_file(path)) for path in paths]
+
+        actual = parallel.canonicalize_files(paths, processes=2, chunk_size=3)
+
+        assert [_comparable(result) for result in actual] == expected
+
+    def test_in_process(self, paths: list[pathlib.Path]):
+        actual = list(parallel.canonicalize_files(paths, processes=1))
+
+        assert [result.path for result in actual] == paths
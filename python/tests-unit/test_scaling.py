@@ -0,0 +1,197 @@
+"""Guard the stages of the library against super-linear growth.
+
+Every stage is timed over playbooks of growing size along several axes, and
+the exponent of its growth is fitted from the timings. A linear stage has an
+exponent close to 1, while a quadratic one approaches 2. Only the minimum of
+several repetitions is used, as noise on a busy machine only ever makes a
+run slower, and a stage is only reported after it grew too fast repeatedly.
+
+The timings depend on the machine, so these tests are only run on request,
+with `make scaling`.
+"""
+
+import gc
+import math
+import time
+import typing
+
+import pytest
+import yaml
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import lint
+from insights_ansible_playbook_lib.serialization import serialize_play
+
+
+# Multiples of the base size of each axis.
+SCALES: tuple[int, ...] = (1, 2, 4, 8)
+# Highest exponent accepted; fixed costs pull linear stages below 1.
+MAX_EXPONENT: float = 1.4
+# Repetitions of every timing, of which the fastest one is used.
+REPEAT: int = 5
+# Fits of a stage which must all grow too fast for the stage to fail.
+ATTEMPTS: int = 3
+
+LIMITS = lib.Limits(
+    max_input_bytes=1024 * 1024 * 1024,
+    max_depth=1024,
+    max_nodes=100_000_000,
+    max_scalar_length=1024 * 1024 * 1024,
+)
+
+
+def _play(index: int = 0, **fields: typing.Any) -> dict:
+    return {
+        "name": f"Play {index}",
+        "hosts": "localhost",
+        "vars": {
+            "insights_signature_exclude": "/hosts,/vars/insights_signature",
+            "insights_signature": "c2lnbmF0dXJl",
+        },
+        **fields,
+    }
+
+
+def _scalar(size: int) -> list[dict]:
+    line: str = "A 'line'\tof a\\configuration file.\n"
+    content: str = line * (size * 4096 // len(line))
+    return [_play(tasks=[{"name": "Write", "copy": {"content": content}}])]
+
+
+def _width(size: int) -> list[dict]:
+    return [
+        _play(tasks=[{"name": f"Task {i}", "ping": None} for i in range(50 * size)])
+    ]
+
+
+def _depth(size: int) -> list[dict]:
+    value: typing.Any = "leaf"
+    for level in range(16 * size):
+        value = {"level": level, "item": ["x" * 64], "next": value}
+    return [_play(tasks=[{"name": "Nested", "debug": value}])]
+
+
+def _plays(size: int) -> list[dict]:
+    return [
+        _play(index, tasks=[{"name": "Ping", "ping": None}])
+        for index in range(10 * size)
+    ]
+
+
+AXES: dict[str, typing.Callable[[int], list[dict]]] = {
+    "scalar": _scalar,
+    "width": _width,
+    "depth": _depth,
+    "plays": _plays,
+}
+
+
+def _serialize(plays: list[dict]) -> None:
+    for play in plays:
+        serialize_play(play, exclude=lib.get_excluded_fields(play), limits=LIMITS)
+
+
+def _canonicalize(plays: list[dict]) -> None:
+    for play in plays:
+        lib.canonicalize_play(play, limits=LIMITS)
+
+
+def _clean(plays: list[dict]) -> None:
+    for play in plays:
+        lib.clean_play(play)
+
+
+def _digest(plays: list[dict]) -> None:
+    for play in plays:
+        lib.create_play_digest(
+            lib.canonicalize_play(play, limits=LIMITS).serialized_play
+        )
+
+
+STAGES: dict[str, typing.Callable[[str, list[dict]], None]] = {
+    "parse": lambda raw, plays: lib.parse_playbook(raw, limits=LIMITS) and None,
+    "iter": lambda raw, plays: list(lib.iter_playbook(raw, limits=LIMITS)) and None,
+    "lint": lambda raw, plays: lint.check_playbook(raw),
+    "clean": lambda raw, plays: _clean(plays),
+    "serialize": lambda raw, plays: _serialize(plays),
+    "canonicalize": lambda raw, plays: _canonicalize(plays),
+    "digest": lambda raw, plays: _digest(plays),
+}
+
+
+def _fastest(function: typing.Callable[[], None]) -> float:
+    # Like timeit, keep collections of unrelated garbage out of the timings
+    timings: list[float] = []
+    enabled: bool = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(REPEAT):
+            start: float = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+    finally:
+        if enabled:
+            gc.enable()
+    return min(timings)
+
+
+def _exponent(sizes: typing.Sequence[int], timings: typing.Sequence[float]) -> float:
+    """Fit the slope of the timings on a log-log scale by least squares."""
+    xs: list[float] = [math.log(size) for size in sizes]
+    ys: list[float] = [math.log(max(timing, 1e-9)) for timing in timings]
+    mean_x: float = sum(xs) / len(xs)
+    mean_y: float = sum(ys) / len(ys)
+    covariance: float = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    variance: float = sum((x - mean_x) ** 2 for x in xs)
+    return covariance / variance
+
+
+class TestExponent:
+    def test_linear(self):
+        assert _exponent([1, 2, 4], [3.0, 6.0, 12.0]) == pytest.approx(1.0)
+
+    def test_quadratic(self):
+        assert _exponent([1, 2, 4], [1.0, 4.0, 16.0]) == pytest.approx(2.0)
+
+
+@pytest.fixture(scope="module")
+def inputs() -> dict[str, list[tuple[str, list[dict]]]]:
+    result: dict[str, list[tuple[str, list[dict]]]] = {}
+    for axis, generator in AXES.items():
+        result[axis] = []
+        for scale in SCALES:
+            plays: list[dict] = generator(scale)
+            # Block style indents every level, the raw playbook would grow
+            # quadratically with the depth
+            raw: str = yaml.safe_dump(
+                plays,
+                sort_keys=False,
+                default_flow_style=True if axis == "depth" else None,
+                width=math.inf,
+            )
+            result[axis].append((raw, plays))
+    return result
+
+
+@pytest.mark.scaling
+@pytest.mark.parametrize("axis", AXES)
+@pytest.mark.parametrize("stage", STAGES)
+def test_linear_growth(
+    stage: str, axis: str, inputs: dict[str, list[tuple[str, list[dict]]]]
+):
+    function: typing.Callable[[str, list[dict]], None] = STAGES[stage]
+
+    exponents: list[float] = []
+    for _ in range(ATTEMPTS):
+        timings: list[float] = [
+            _fastest(lambda raw=raw, plays=plays: function(raw, plays))
+            for raw, plays in inputs[axis]
+        ]
+        exponents.append(_exponent(SCALES, timings))
+        if exponents[-1] <= MAX_EXPONENT:
+            break
+
+    assert min(exponents) <= MAX_EXPONENT, (
+        f"Stage '{stage}' grows with exponent {min(exponents):.2f} along '{axis}'; "
+        f"timings {', '.join(f'{timing * 1000:.2f} ms' for timing in timings)}."
+    )
@@ -1,9 +1,17 @@
+import pathlib
+import typing
+import unittest.mock
+
 import pytest
 import yaml
 
+import insights_ansible_playbook_lib as lib
 from insights_ansible_playbook_lib import serialization
 
 
+PLAYBOOKS = pathlib.Path(__file__).parents[2].absolute() / "data" / "playbooks"
+
+
 class TestPlaybookSerializer:
     def test_list(self):
         source = ["a", "b"]
@@ -63,6 +71,9 @@ class TestPlaybookSerializer:
             ("\\backslash", "'\\\\backslash'"),
             ("new\nline", "'new\\nline'"),
             ("tab\tchar", "'tab\\tchar'"),
+            ("back\\\nslash", "'back\\\\\\nslash'"),
+            ("literal\\n", "'literal\\\\n'"),
+            ("quote\\'s\"", r"""'quote\\\'s"'"""),
         ],
     )
     def test_strings(self, source, expected):
@@ -83,6 +94,55 @@ class TestPlaybookSerializer:
         assert result == expected
 
 
+class TestAliasMemoization:
+    @staticmethod
+    def _aliased_playbook(levels: int) -> str:
+        """Create a playbook where each level references the previous one twice.
+
+        The expanded play contains 2^levels copies of the innermost list.
+        """
+        lines = [
+            "- name: aliased",
+            "  vars:",
+            "    level0: &level0 [a, b, c]",
+        ]
+        for i in range(1, levels + 1):
+            lines.append(f"    level{i}: &level{i} [*level{i - 1}, *level{i - 1}]")
+        lines.append(f"  tasks: [*level{levels}, *level{levels}]")
+        return "\n".join(lines)
+
+    def test_output_unchanged(self):
+        play: dict = lib.parse_playbook(self._aliased_playbook(levels=4))[0]
+
+        actual: str = serialization.serialize_play(play)
+        expected: str = serialization.Serializer._obj(play)
+
+        assert actual == expected
+
+    @pytest.mark.parametrize("levels", [4, 8, 16])
+    def test_work_proportional_to_unique_nodes(self, levels: int):
+        play: dict = lib.parse_playbook(self._aliased_playbook(levels=levels))[0]
+
+        with unittest.mock.patch.object(
+            serialization.Serializer,
+            "_str",
+            wraps=serialization.Serializer._str,
+        ) as mock_str:
+            serialization.serialize_play(play)
+
+        # 'name' value, 'a', 'b', 'c'
+        assert mock_str.call_count == 4
+
+    def test_memo_limit(self):
+        play: dict = lib.parse_playbook(self._aliased_playbook(levels=4))[0]
+
+        with unittest.mock.patch.object(serialization, "MEMO_LIMIT", 0):
+            actual: str = serialization.serialize_play(play)
+        expected: str = serialization.Serializer._obj(play)
+
+        assert actual == expected
+
+
 class TestYamlDumper:
     def test_represent_none(self):
         """Test that None is represented as an empty string in YAML."""
@@ -95,3 +155,63 @@ class TestYamlDumper:
         expected: str = "key:\n"
 
         assert actual == expected
+
+
+def _load(loader: type, raw: str, **kwargs: typing.Any) -> typing.Any:
+    instance = loader(raw, **kwargs)
+    try:
+        return instance.get_single_data()
+    finally:
+        instance.dispose()
+
+
+@pytest.mark.skipif(not yaml.__with_libyaml__, reason="libyaml is not available")
+class TestLoaders:
+    """Both parsers produce the same plays."""
+
+    @pytest.mark.parametrize(
+        "name", ("bugs", "document-from-hell", "insights_remove", "unicode")
+    )
+    def test_playbooks(self, name: str):
+        raw: str = (PLAYBOOKS / f"{name}.yml").read_text()
+
+        expected = _load(serialization.PythonLoader, raw)
+        actual = _load(serialization.CLoader, raw)
+
+        assert actual == expected
+        assert [lib.canonicalize_play(play).digest for play in actual] == [
+            lib.canonicalize_play(play).digest for play in expected
+        ]
+
+    @pytest.mark.parametrize(
+        "raw",
+        (
+            "- [true, True, TRUE, false, yes, no, on, off, y, n]",
+            "- [1, 007, 0b11, 0o17, 0x1F, -5, +3, 1.5, .inf, 1:20, 1e3]",
+            "- [~, null, '', \"\", 2001-12-14, !!str 12, !!binary aGVsbG8=]",
+            "- {=: equals, 'dou''ble': \"both\\\"'\", back: 'sl\\ash'}",
+            "- |\n  line\tone\n  line two\n- >\n  folded\n  text\n",
+            "- &list [a, b]\n- *list\n- {<<: {a: 1}, b: 2}\n- !!set {a, b}",
+            '- "\\x41\\u00e9\\U0001F389\\N\\_\\L\\P\\/"',
+            '- "plain\u0085next\u2028line"',
+        ),
+    )
+    def test_scalars(self, raw: str):
+        assert _load(serialization.CLoader, raw) == _load(
+            serialization.PythonLoader, raw
+        )
+
+    @pytest.mark.parametrize(
+        "raw", ("- [unclosed", "- a: b: c", "- *missing", "- a\n---\n- b")
+    )
+    def test_invalid(self, raw: str):
+        for loader in (serialization.PythonLoader, serialization.CLoader):
+            with pytest.raises(yaml.YAMLError):
+                _load(loader, raw)
+
+    def test_limits(self):
+        """The limits are enforced on the nodes libyaml parsed."""
+        limits = lib.Limits(max_nodes=10)
+
+        with pytest.raises(lib.LimitExceededError, match="more than 10 nodes"):
+            _load(serialization.CLoader, f"- {list(range(20))}", limits=limits)
@@ -0,0 +1,228 @@
+import concurrent.futures
+import os
+import pathlib
+import shutil
+import socket
+import threading
+import typing
+import unittest.mock
+
+import pytest
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import protocol
+from insights_ansible_playbook_verifier import server
+
+
+DATA = pathlib.Path(__file__).parents[2].absolute() / "data"
+PLAYBOOKS = DATA / "playbooks"
+
+
+@pytest.fixture
+def state(tmp_path: pathlib.Path) -> typing.Iterator[server.VerificationState]:
+    key_path = tmp_path / "public.gpg"
+    shutil.copy(DATA / "public.gpg", key_path)
+    revocation_path = tmp_path / "revoked_playbooks.yml"
+    shutil.copy(DATA / "revoked_playbooks.yml", revocation_path)
+
+    state = server.VerificationState([key_path], revocation_path, lib.DEFAULT_LIMITS)
+    yield state
+    state.close()
+
+
+@pytest.fixture
+def socket_path(
+    tmp_path: pathlib.Path, state: server.VerificationState
+) -> typing.Iterator[pathlib.Path]:
+    path = tmp_path / "verifier.sock"
+    with server.VerificationServer(path, state) as daemon:
+        thread = threading.Thread(target=daemon.serve_forever)
+        thread.start()
+        yield path
+        daemon.shutdown()
+        thread.join()
+
+
+def _fake_daemon(path: pathlib.Path, response: typing.Optional[bytes]) -> list[dict]:
+    """Verify a playbook with a daemon answering the response, or closing."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+        listener.bind(str(path))
+        listener.listen()
+
+        def answer() -> None:
+            connection, _ = listener.accept()
+            with connection:
+                if response is not None:
+                    protocol.receive_message(connection, max_size=1024)
+                    protocol.send_message(connection, response)
+
+        thread = threading.Thread(target=answer)
+        thread.start()
+        try:
+            return server.verify_remotely(path, "- name: play")
+        finally:
+            thread.join()
+
+
+class TestServer:
+    def test_ok(self, socket_path: pathlib.Path):
+        raw: str = (PLAYBOOKS / "insights_remove.yml").read_text()
+        digest: bytes = (PLAYBOOKS / "insights_remove.digest.bin").read_bytes()
+
+        actual = server.verify_remotely(socket_path, raw)
+
+        assert actual == [{"name": "Insights Disable", "digest": digest.hex()}]
+
+    def test_concurrent(self, socket_path: pathlib.Path):
+        raws: list[str] = [
+            (PLAYBOOKS / f"{file}.yml").read_text()
+            for file in ("insights_remove", "document-from-hell", "unicode") * 2
+        ]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(
+                executor.map(lambda raw: server.verify_remotely(socket_path, raw), raws)
+            )
+
+        assert [len(result) for result in results] == [1, 1, 1, 1, 1, 1]
+
+    def test_rejected(self, socket_path: pathlib.Path):
+        raw = "- name: play\n  vars: {insights_signature: data}\n"
+
+        with pytest.raises(RuntimeError, match="vars/insights_signature_exclude"):
+            server.verify_remotely(socket_path, raw)
+
+    def test_specification_violation(self, socket_path: pathlib.Path):
+        with pytest.raises(RuntimeError, match="Tags are not allowed"):
+            server.verify_remotely(socket_path, "- name: !!str play\n")
+
+    def test_message_too_large(
+        self, socket_path: pathlib.Path, state: server.VerificationState
+    ):
+        state.limits = lib.Limits(max_input_bytes=10)
+
+        with pytest.raises(RuntimeError, match="larger than 10 bytes"):
+            server.verify_remotely(socket_path, "- name: a long play\n")
+
+    def test_incomplete_message(self, socket_path: pathlib.Path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(socket_path))
+            sock.sendall(protocol.HEADER.pack(100) + b"- name")
+            sock.shutdown(socket.SHUT_WR)
+
+            response = protocol.receive_message(sock, max_size=1024)
+
+        assert b"Connection closed" in response
+
+    def test_unavailable(self, tmp_path: pathlib.Path):
+        with pytest.raises(server.DaemonUnavailableError):
+            server.verify_remotely(tmp_path / "missing.sock", "- name: play")
+
+    def test_no_answer(self, tmp_path: pathlib.Path):
+        """A daemon closing the connection is as good as a missing one."""
+        with pytest.raises(server.DaemonUnavailableError, match="did not answer"):
+            _fake_daemon(tmp_path / "verifier.sock", None)
+
+    @pytest.mark.parametrize(
+        "response",
+        (
+            b"[]",
+            b'{"plays": []}',
+            b'{"ok": false, "plays": []}',
+            b'{"ok": true, "plays": [{"name": "play"}]}',
+        ),
+    )
+    def test_invalid_answer(self, tmp_path: pathlib.Path, response: bytes):
+        with pytest.raises(server.DaemonUnavailableError, match="does not contain"):
+            _fake_daemon(tmp_path / "verifier.sock", response)
+
+    def test_untrusted_owner(self, socket_path: pathlib.Path):
+        with unittest.mock.patch.object(server, "_trusted_uids", return_value={-1}):
+            with pytest.raises(server.DaemonUnavailableError, match="untrusted user"):
+                server.verify_remotely(socket_path, "- name: play")
+
+    def test_socket_mode(self, socket_path: pathlib.Path):
+        assert socket_path.stat().st_mode & 0o777 == server.SOCKET_MODE
+
+    def test_already_running(self, socket_path: pathlib.Path):
+        with pytest.raises(RuntimeError, match="already listening"):
+            server.serve(
+                socket_path,
+                [DATA / "public.gpg"],
+                DATA / "revoked_playbooks.yml",
+                lib.DEFAULT_LIMITS,
+            )
+
+        assert socket_path.is_socket()
+
+
+class TestVerificationState:
+    def test_reused(self, state: server.VerificationState):
+        with state.acquire() as first:
+            pass
+        with state.acquire() as second:
+            pass
+
+        assert first is second
+        assert not first.verifier.closed
+
+    def test_reload(self, state: server.VerificationState):
+        with state.acquire() as first:
+            stat = state.revocation_path.stat()
+            os.utime(
+                state.revocation_path,
+                ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000),
+            )
+
+            with state.acquire() as second:
+                pass
+
+            # The previous verifier is kept while it is in use
+            assert first.retired
+            assert not first.verifier.closed
+
+        assert first is not second
+        assert first.verifier.closed
+        assert second.verifier.revoked == first.verifier.revoked
+
+    def test_reload_outside_lock(self, state: server.VerificationState):
+        """Requests finish while the files are being reloaded."""
+        loading = threading.Event()
+        loaded = threading.Event()
+        load = state._load
+
+        def slow_load(stamp: tuple) -> server._Snapshot:
+            loading.set()
+            loaded.wait(timeout=10)
+            return load(stamp)
+
+        with state.acquire() as first:
+            stat = state.revocation_path.stat()
+            os.utime(
+                state.revocation_path,
+                ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000),
+            )
+            state._load = slow_load  # type: ignore[method-assign]
+
+            def reload() -> None:
+                with state.acquire():
+                    pass
+
+            thread = threading.Thread(target=reload)
+            thread.start()
+            assert loading.wait(timeout=10)
+        # The first request released its snapshot during the reload
+        assert first.users == 0
+        loaded.set()
+        thread.join()
+
+        assert first.verifier.closed
+
+    def test_reload_failure(self, state: server.VerificationState):
+        with state.acquire():
+            pass
+        state.revocation_path.write_text("- name: revoked\n  vars: {}\n")
+
+        with pytest.raises(lib.PreconditionError, match="does not contain a signature"):
+            with state.acquire():
+                pass
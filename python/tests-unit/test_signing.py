@@ -0,0 +1,135 @@
+import argparse
+import pathlib
+import shutil
+import subprocess
+import tempfile
+import typing
+import unittest.mock
+
+import pytest
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import _keygen, crypto
+from insights_ansible_playbook_signer import app, backends
+
+from benchmarks import inputs, mock_server, signing
+
+
+@pytest.fixture
+def socket_path() -> typing.Iterator[pathlib.Path]:
+    # Unix socket paths do not fit into the long pytest directories
+    directory = tempfile.mkdtemp()
+    yield pathlib.Path(directory) / "socket"
+    shutil.rmtree(directory)
+
+
+def _verify(plays: list[dict], key_pair: _keygen.KeyPair) -> None:
+    with lib.Verifier(key_pair.public) as verifier:
+        verifier.verify_plays(plays).raise_for_error()
+
+
+class TestMockServer:
+    def test_sign(self, socket_path: pathlib.Path, key_pair: _keygen.KeyPair):
+        with mock_server.running(socket_path, key_pair) as mock:
+            with mock_server.MockServerBackend(socket_path) as backend:
+                plays = app.sign_playbook(inputs._many_plays(3), backend, jobs=2)
+
+        _verify(plays, key_pair)
+        assert mock.statistics.signed == 3
+        assert mock.statistics.failed == 0
+
+    def test_concurrency(self, socket_path: pathlib.Path, key_pair: _keygen.KeyPair):
+        """Requests over the limit wait for a free slot."""
+        settings = mock_server.MockSettings(latency=0.05, concurrency=2)
+
+        with mock_server.running(socket_path, key_pair, settings) as mock:
+            backend = mock_server.MockServerBackend(socket_path)
+            app.sign_digests([("play", b"digest")] * 6, backend, jobs=6)
+
+        assert mock.statistics.peak_concurrency == 2
+        assert mock.statistics.signed == 6
+
+    def test_failure(self, socket_path: pathlib.Path, key_pair: _keygen.KeyPair):
+        settings = mock_server.MockSettings(failure_rate=1.0)
+
+        with mock_server.running(socket_path, key_pair, settings) as mock:
+            backend = mock_server.MockServerBackend(socket_path)
+            with pytest.raises(RuntimeError, match="Simulated failure"):
+                backend.sign(b"digest")
+
+        assert mock.statistics.failed == 1
+
+    def test_unavailable(self, socket_path: pathlib.Path):
+        backend = mock_server.MockServerBackend(socket_path)
+
+        with pytest.raises(RuntimeError, match="Could not connect"):
+            backend.sign(b"digest")
+
+
+class TestLocalGPGBackend:
+    def test_sign(self, tmp_path: pathlib.Path, key_pair: _keygen.KeyPair):
+        """The key is imported once for all plays."""
+        key_pair.write(tmp_path)
+
+        with unittest.mock.patch.object(
+            crypto.GPGKeyring, "open", autospec=True, side_effect=crypto.GPGKeyring.open
+        ) as open_keyring:
+            with backends.LocalGPGBackend(tmp_path / "key.private.gpg") as backend:
+                plays = app.sign_playbook(inputs._many_plays(3), backend, jobs=3)
+
+        _verify(plays, key_pair)
+        assert open_keyring.call_count == 1
+
+    def test_missing_key(self, tmp_path: pathlib.Path):
+        backend = backends.LocalGPGBackend(tmp_path / "missing.gpg")
+
+        with pytest.raises(RuntimeError, match="does not exist"):
+            backend.sign(b"digest")
+
+
+class TestRPMSignBackend:
+    def test_sign(self):
+        def rpm_sign(command: list[str], **kwargs: typing.Any) -> None:
+            pathlib.Path(command[-1] + ".asc").write_bytes(b"signature")
+
+        with unittest.mock.patch.object(subprocess, "run", side_effect=rpm_sign) as run:
+            signature = backends.RPMSignBackend("production").sign(b"digest")
+
+        assert signature == b"signature"
+        assert run.call_args.args[0][:4] == [
+            "rpm-sign",
+            "--detachsign",
+            "--key",
+            "production",
+        ]
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError, match="abstract"):
+        backends.SigningBackend()  # type: ignore[abstract]
+
+
+@pytest.mark.parametrize(
+    "options,backend",
+    (
+        ({"key": pathlib.Path("key.gpg")}, backends.LocalGPGBackend),
+        ({"remote_key": "production"}, backends.RPMSignBackend),
+    ),
+)
+def test_create_backend(options: dict, backend: type):
+    args = argparse.Namespace(**{"key": None, "remote_key": None, **options})
+
+    assert isinstance(app.create_backend(args), backend)
+
+
+def test_throughput_benchmark(key_pair: _keygen.KeyPair):
+    settings = mock_server.MockSettings(latency=0.02, concurrency=2, seed=0)
+
+    results = signing.run(4, (1, 4), settings, key_pair)
+
+    assert [(result.jobs, result.error) for result in results] == [
+        (1, None),
+        (4, None),
+    ]
+    assert [result.peak_concurrency for result in results] == [1, 2]
+    assert "Plays/s" in signing.format_results(results, settings)
@@ -0,0 +1,108 @@
+import subprocess
+import sys
+
+import pytest
+
+
+# Modules the applications must not import on start-up
+FORBIDDEN_MODULES: set[str] = {
+    "email",
+    "importlib.metadata",
+    "insights_ansible_playbook_lib.cost",
+    "insights_ansible_playbook_lib.metrics",
+    "insights_ansible_playbook_lib.verifier",
+    "tracemalloc",
+}
+
+# Modules only some modes of the verifier need, e.g. not `--socket`
+VERIFIER_FORBIDDEN_MODULES: set[str] = FORBIDDEN_MODULES | {
+    "concurrent.futures",
+    "json",
+    "pkgutil",
+}
+
+# The signer shares its command line helpers with the verifier through the
+# library, without importing the verifier
+SIGNER_FORBIDDEN_MODULES: set[str] = FORBIDDEN_MODULES | {
+    "benchmarks",
+    "insights_ansible_playbook_verifier",
+}
+
+
+def _run(code: str) -> str:
+    """Run the code in a fresh interpreter, returning its standard output."""
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+        env={"PYTHONPATH": ":".join(sys.path)},
+    )
+    return result.stdout
+
+
+@pytest.mark.parametrize(
+    "module,forbidden",
+    (
+        ("insights_ansible_playbook_verifier.app", VERIFIER_FORBIDDEN_MODULES),
+        ("insights_ansible_playbook_signer.app", SIGNER_FORBIDDEN_MODULES),
+    ),
+)
+def test_no_forbidden_imports(module: str, forbidden: set[str]):
+    stdout = _run(f"import sys, {module}; print('\\n'.join(sys.modules))")
+
+    assert forbidden.intersection(stdout.split()) == set()
+
+
+def test_lazy_attributes():
+    stdout = _run(
+        "import insights_ansible_playbook_lib as lib\n"
+        "print(lib.Verifier.__module__, lib.explain_cost.__module__)\n"
+    )
+
+    assert stdout.split() == [
+        "insights_ansible_playbook_lib.verifier",
+        "insights_ansible_playbook_lib.cost",
+    ]
+
+
+def test_no_filesystem_probes_on_import():
+    stdout = _run(
+        "import os\n"
+        "def geteuid(): raise RuntimeError('probed on import')\n"
+        "os.geteuid = geteuid\n"
+        "import insights_ansible_playbook_verifier.app\n"
+        "print('ok')\n"
+    )
+
+    assert stdout == "ok\n"
+
+
+def test_version_is_lazy():
+    stdout = _run(
+        "import sys\n"
+        "import insights_ansible_playbook_verifier.app as app\n"
+        "sys.argv = ['verifier', '--version']\n"
+        "try:\n"
+        "    app.run()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print('importlib.metadata' in sys.modules)\n"
+    )
+
+    version, loaded = stdout.split()
+    assert version != ""
+    assert loaded == "True"
+
+
+def test_stash_directory():
+    import insights_ansible_playbook_lib as lib
+    from insights_ansible_playbook_lib import crypto
+
+    assert lib.TEMPORARY_STASH_DIRECTORY in ("/tmp/", crypto.STASH_DIRECTORY)
+    assert crypto.TEMPORARY_GPG_HOME_PARENT_DIRECTORY in (
+        "/tmp/",
+        crypto.STASH_DIRECTORY,
+    )
+    # The lazy attributes raise AttributeError for unknown names
+    assert not hasattr(lib, "MISSING_ATTRIBUTE")
@@ -0,0 +1,130 @@
+import json
+import pathlib
+import tracemalloc
+import typing
+
+import pytest
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import tracing
+
+
+@pytest.fixture
+def events() -> typing.Iterator[list[tracing.Event]]:
+    result: list[tracing.Event] = []
+    tracing.add_handler(result.append)
+    try:
+        yield result
+    finally:
+        tracing.remove_handler(result.append)
+
+
+class TestHooks:
+    def test_disabled(self):
+        """Without handlers, spans are shared no-ops."""
+        assert tracing.span("a") is tracing.span("b", size=1)
+        with tracing.span("a"):
+            tracing.count("c")
+
+    def test_span(self, events: list[tracing.Event]):
+        with tracing.span("outer", size=3):
+            with tracing.span("inner"):
+                pass
+
+        assert [event.name for event in events] == ["inner", "outer"]
+        inner, outer = events
+        assert isinstance(outer, tracing.SpanEvent)
+        assert isinstance(inner, tracing.SpanEvent)
+        assert outer.args == {"size": 3}
+        assert outer.start <= inner.start
+        assert inner.duration <= outer.duration
+        assert outer.memory_peak is None
+
+    def test_span_exception(self, events: list[tracing.Event]):
+        with pytest.raises(ValueError):
+            with tracing.span("failing"):
+                raise ValueError()
+
+        assert [event.name for event in events] == ["failing"]
+
+    def test_count(self, events: list[tracing.Event]):
+        tracing.count("subprocesses")
+        tracing.count("bytes_serialized", 10)
+
+        assert [(event.name, event.value) for event in events] == [  # type: ignore
+            ("subprocesses", 1),
+            ("bytes_serialized", 10),
+        ]
+
+    def test_remove_handler(self, events: list[tracing.Event]):
+        tracing.remove_handler(events.append)
+        tracing.count("subprocesses")
+
+        assert events == []
+
+    def test_memory_peak(self, events: list[tracing.Event]):
+        """The peak of a nested span is included in its parent."""
+        tracemalloc.start()
+        try:
+            with tracing.span("outer"):
+                with tracing.span("inner"):
+                    data = bytearray(1024 * 1024)
+                    del data
+        finally:
+            tracemalloc.stop()
+
+        inner, outer = events
+        assert inner.memory_peak >= 1024 * 1024  # type: ignore
+        assert outer.memory_peak >= inner.memory_peak  # type: ignore
+
+
+class TestChromeTrace:
+    def test_format(self, tmp_path: pathlib.Path):
+        with tracing.ChromeTrace() as trace:
+            with tracing.span("serialize_play", play="Test"):
+                tracing.count("subprocesses")
+                tracing.count("subprocesses", 2)
+        tracing.count("subprocesses")
+
+        trace.write(tmp_path / "trace.json")
+        document = json.loads((tmp_path / "trace.json").read_text())
+        events = document["traceEvents"]
+
+        assert [event["ph"] for event in events] == ["C", "C", "X"]
+        assert [event["args"] for event in events[:2]] == [
+            {"subprocesses": 1},
+            {"subprocesses": 3},
+        ]
+        span = events[2]
+        assert span["name"] == "serialize_play"
+        assert span["args"] == {"play": "Test"}
+        assert span["dur"] >= 0
+        assert trace.totals == {"subprocesses": 3}
+
+    def test_memory(self):
+        was_tracing: bool = tracemalloc.is_tracing()
+        with tracing.ChromeTrace(memory=True) as trace:
+            with tracing.span("span"):
+                pass
+        assert tracemalloc.is_tracing() == was_tracing
+
+        (span,) = trace.to_json()["traceEvents"]
+        assert "memory_peak" in span["args"]
+
+    def test_canonicalize_play(self):
+        """The library reports the serialization of plays."""
+        play = {
+            "name": "Test",
+            "hosts": "all",
+            "vars": {
+                "insights_signature_exclude": "/hosts,/vars/insights_signature",
+                "insights_signature": b"c2lnbmF0dXJl",
+            },
+            "tasks": [],
+        }
+        with tracing.ChromeTrace() as trace:
+            canonical = lib.canonicalize_play(play)
+
+        names = [event["name"] for event in trace.to_json()["traceEvents"]]
+        assert "serialize_play" in names
+        assert trace.totals["bytes_serialized"] == len(canonical.serialized_play)  # type: ignore
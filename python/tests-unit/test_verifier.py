@@ -1,24 +1,239 @@
 import argparse
+import contextlib
+import dataclasses
+import io
+import json
 import pathlib
+import typing
 import unittest.mock
 
+import pytest
+
+import insights_ansible_playbook_lib as lib
+from insights_ansible_playbook_lib import cli
 import insights_ansible_playbook_verifier.app as verifier
 
 
 PLAYBOOKS = pathlib.Path(__file__).parents[2].absolute() / "data" / "playbooks"
 
 
-class TestRun:
-    @unittest.mock.patch(
+def _args(**kwargs: typing.Any) -> argparse.Namespace:
+    """Create command line arguments, filling in the defaults."""
+    defaults: dict[str, typing.Any] = {
+        "key": None,
+        "stdin": None,
+        "playbook": [PLAYBOOKS / "document-from-hell.yml"],
+        "input_dir": None,
+        "serve": None,
+        "socket": None,
+        "revocation_list": None,
+        "processes": 1,
+        "chunk_size": 16,
+        "trace": None,
+        "trace_memory": False,
+        "metrics_file": None,
+        "artifacts_dir": None,
+        "explain_cost": None,
+        **{field.name: field.default for field in dataclasses.fields(lib.Limits)},
+    }
+    return argparse.Namespace(**{**defaults, **kwargs})
+
+
+def _parse_args(**kwargs: typing.Any) -> typing.Any:
+    return unittest.mock.patch(
         "insights_ansible_playbook_verifier.app.argparse.ArgumentParser.parse_args",
-        unittest.mock.MagicMock(
-            return_value=argparse.Namespace(
-                key=None,
-                stdin=None,
-                playbook=f"{PLAYBOOKS}/document-from-hell.yml",
-                revocation_list=None,
-            )
-        ),
+        return_value=_args(**kwargs),
     )
+
+
+class TestRun:
     def test_ok(self):
-        verifier.run()
+        with _parse_args():
+            verifier.run()
+
+    def test_limits(self):
+        with _parse_args(max_depth=4):
+            with pytest.raises(lib.LimitExceededError, match="deeper than 4 levels"):
+                verifier.run()
+
+    def test_specification_violation(self, tmp_path: pathlib.Path):
+        playbook = tmp_path / "playbook.yml"
+        playbook.write_text("- name: !!str play\n")
+
+        with (
+            _parse_args(playbook=[playbook]),
+            unittest.mock.patch.object(lib, "iter_playbook") as iter_playbook,
+        ):
+            with pytest.raises(lib.PreconditionError, match="Tags are not allowed"):
+                verifier.run()
+
+        # The playbook is rejected before it is parsed
+        iter_playbook.assert_not_called()
+
+    def test_revocation_list_error(self, tmp_path: pathlib.Path):
+        revocation_list = tmp_path / "revoked.yml"
+        revocation_list.write_text("- name: revoked\n  vars: {}\n")
+
+        with _parse_args(revocation_list=revocation_list):
+            with pytest.raises(
+                lib.PreconditionError,
+                match="The play 'revoked' does not contain a signature.",
+            ):
+                verifier.run()
+
+    def test_key_directory(self):
+        with _parse_args(key=[PLAYBOOKS.parent]):
+            verifier.run()
+
+    def test_trace(self, tmp_path: pathlib.Path):
+        trace = tmp_path / "trace.json"
+        with (
+            _parse_args(trace=trace),
+            unittest.mock.patch.object(cli.atexit, "register") as register,
+        ):
+            verifier.run()
+
+        # The trace is written on exit
+        (write,) = register.call_args.args
+        write()
+        events = json.loads(trace.read_text())["traceEvents"]
+        names = {event["name"] for event in events}
+        assert {"verify_playbook", "serialize_play", "subprocesses"} <= names
+
+    @pytest.mark.parametrize(
+        "kwargs,outcome",
+        (
+            ({}, "ok"),
+            (
+                {"playbook": [PLAYBOOKS.parent / "playbooks-unsigned" / "sample.yml"]},
+                "rejected",
+            ),
+            # The revocation list cannot be loaded either
+            ({"max_depth": 4}, "error"),
+            ({"key": []}, "ok"),
+        ),
+    )
+    def test_metrics(self, tmp_path: pathlib.Path, kwargs: dict, outcome: str):
+        path = tmp_path / "verifier.prom"
+        with (
+            _parse_args(metrics_file=path, **kwargs),
+            unittest.mock.patch.object(cli.atexit, "register") as register,
+        ):
+            with contextlib.suppress(lib.PreconditionError):
+                verifier.run()
+
+        (write,) = register.call_args.args
+        write()
+        text = path.read_text()
+        assert (
+            "insights_ansible_playbook_verifier_verifications_total"
+            f'{{outcome="{outcome}"}} 1'
+        ) in text
+        assert "insights_ansible_playbook_verifier_subprocesses_total" in text
+
+    def test_explain_cost(self, capsys: pytest.CaptureFixture):
+        with _parse_args(explain_cost="json"):
+            verifier.run()
+
+        (play,) = json.loads(capsys.readouterr().out)
+        assert play["name"] == "The Document From Hell"
+        assert play["total"]["children"][0]["path"] == "/vars"
+
+    def test_stdin_limit(self):
+        """The limit of stdin counts bytes, not characters."""
+        stdin = unittest.mock.MagicMock()
+        stdin.buffer = io.BytesIO("ř".encode("utf-8") * 600)
+        with (
+            _parse_args(stdin=True, playbook=None, max_input_bytes=1000),
+            unittest.mock.patch.object(verifier.sys, "stdin", stdin),
+        ):
+            with pytest.raises(lib.LimitExceededError, match="larger than 1000 bytes"):
+                verifier.run()
+
+        assert stdin.buffer.tell() == 1001
+
+    def test_explain_cost_bulk(self, tmp_path: pathlib.Path):
+        with _parse_args(explain_cost="text", playbook=None, input_dir=tmp_path):
+            with pytest.raises(SystemExit):
+                verifier.run()
+
+    def test_metrics_error(self, tmp_path: pathlib.Path):
+        path = tmp_path / "verifier.prom"
+        with (
+            _parse_args(metrics_file=path, playbook=[tmp_path / "missing.yml"]),
+            unittest.mock.patch.object(cli.atexit, "register") as register,
+        ):
+            with pytest.raises(FileNotFoundError):
+                verifier.run()
+
+        (write,) = register.call_args.args
+        write()
+        assert 'verifications_total{outcome="error"} 1' in path.read_text()
+
+    def test_key_directory_empty(self, tmp_path: pathlib.Path):
+        with _parse_args(key=[tmp_path]):
+            with pytest.raises(RuntimeError, match="No GPG keys were found"):
+                verifier.run()
+
+    def test_socket_missing(self, tmp_path: pathlib.Path, capsys):
+        """The playbook is verified locally when the daemon is not running."""
+        with _parse_args(socket=tmp_path / "missing.sock"):
+            verifier.run()
+
+        assert "The Document From Hell" in capsys.readouterr().out
+
+    def test_socket(self, tmp_path: pathlib.Path, capsys):
+        socket_path = tmp_path / "verifier.sock"
+        socket_path.touch()
+
+        with (
+            _parse_args(socket=socket_path),
+            unittest.mock.patch(
+                "insights_ansible_playbook_verifier.server.verify_remotely"
+            ) as verify_remotely,
+            unittest.mock.patch.object(lib, "iter_playbook") as iter_playbook,
+        ):
+            verifier.run()
+
+        verify_remotely.assert_called_once()
+        iter_playbook.assert_not_called()
+        assert "The Document From Hell" in capsys.readouterr().out
+
+    def test_socket_with_key(self, tmp_path: pathlib.Path):
+        """The daemon would ignore the key, it verifies with its own."""
+        with _parse_args(socket=tmp_path / "verifier.sock", key=[tmp_path]):
+            with pytest.raises(SystemExit):
+                verifier.run()
+
+    def test_socket_with_input_dir(self, tmp_path: pathlib.Path):
+        with _parse_args(
+            socket=tmp_path / "verifier.sock", playbook=None, input_dir=tmp_path
+        ):
+            with pytest.raises(SystemExit):
+                verifier.run()
+
+    def test_socket_with_playbooks(self, tmp_path: pathlib.Path):
+        """Only the first playbook would have been sent to the daemon."""
+        playbooks = [PLAYBOOKS / "bugs.yml", tmp_path / "bad.yml"]
+
+        with _parse_args(socket=tmp_path / "verifier.sock", playbook=playbooks):
+            with pytest.raises(SystemExit):
+                verifier.run()
+
+    def test_bulk(self, capsys):
+        playbooks = [PLAYBOOKS / "insights_remove.yml", PLAYBOOKS / "unicode.yml"]
+
+        with _parse_args(playbook=playbooks):
+            verifier.run()
+
+        lines = capsys.readouterr().out.splitlines()
+        assert [json.loads(line)["status"] for line in lines] == ["ok"] * 4
+
+    def test_bulk_failed(self, tmp_path: pathlib.Path):
+        (tmp_path / "empty.yml").write_text("")
+
+        with _parse_args(playbook=None, input_dir=tmp_path):
+            with pytest.raises(SystemExit) as exc:
+                verifier.run()
+
+        assert exc.value.code == 1